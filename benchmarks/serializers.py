@@ -0,0 +1,70 @@
+"""
+Throughput of the DRF serializers of the hot read endpoints against their compiled versions
+(rest_api.serializers.compile_serializer), on unsaved model instances, and a check that both
+render to the same JSON bytes.
+
+    python benchmarks/serializers.py [--rows N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import date, timedelta
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.auth", "django.contrib.contenttypes", "rest_framework", "rest_framework.authtoken",
+                    "rest_api"],
+    DATABASES={},
+    DEFAULT_AUTO_FIELD="django.db.models.AutoField",
+    TOKEN_EXPIRED_AFTER_SECONDS=24 * 60 * 60,
+)
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from rest_api.models import Ingredient, Meal, MealHistory  # noqa: E402
+from rest_api.serializers import (IngredientSerializer, MealHistorySerializer, MealSerializer,  # noqa: E402
+                                  serialize_ingredient, serialize_meal, serialize_meal_history)
+
+
+def build_rows(count):
+    meals = [Meal(id=i, name=f"Meal {i}", category="Fast Food", calories=250.5 + i, proteins=12.25, fat=9.0,
+                  carbs=30.125) for i in range(count)]
+    ingredients = [Ingredient(id=i, name=f"Ingredient {i}", calories=100 + i, proteins=1.5, fat=0.25, carbs=20.0)
+                   for i in range(count)]
+    food_logs = [MealHistory(id=i, day=date(2020, 5, 1) + timedelta(days=i % 30), type_of_meal="lunch",
+                             meal=meals[i], number_of_servings=1.5, calories=375.75, proteins=18.375, fat=13.5,
+                             carbs=45.1875) for i in range(count)]
+    return {"meals": (meals, MealSerializer, serialize_meal),
+            "ingredients": (ingredients, IngredientSerializer, serialize_ingredient),
+            "food logs": (food_logs, MealHistorySerializer, serialize_meal_history)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="instances serialized per run (default: 1000)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per serializer, the best is kept (default: 5)")
+    args = parser.parse_args()
+
+    renderer = JSONRenderer()
+
+    print(f"{'shape':<14}{'DRF rows/s':>14}{'compiled rows/s':>18}{'speedup':>10}{'same JSON':>12}")
+    for shape, (rows, serializer_class, serialize) in build_rows(args.rows).items():
+        expected = renderer.render([serializer_class(row).data for row in rows])
+        actual = renderer.render([serialize(row) for row in rows])
+
+        drf = min(timeit.repeat(lambda: [serializer_class(row).data for row in rows], number=1, repeat=args.repeat))
+        compiled = min(timeit.repeat(lambda: [serialize(row) for row in rows], number=1, repeat=args.repeat))
+
+        print(f"{shape:<14}{args.rows / drf:>14.0f}{args.rows / compiled:>18.0f}{drf / compiled:>9.1f}x"
+              f"{'yes' if actual == expected else 'NO':>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Import time and memory of rest_api/constants.py, compared with the module of another git revision.
+
+    python benchmarks/startup.py [--baseline REV] [--runs N]
+
+Without --baseline, the working tree is compared with HEAD when constants.py has uncommitted changes, and
+otherwise with the revision before the last commit that changed it.
+
+Every measure runs in a fresh interpreter on a copy of the module (and of its assets), so the first
+run also pays the bytecode compilation and the following ones load the cached bytecode.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import constants
+elapsed = time.perf_counter() - start
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "rss_kb": rss_after - rss_before}))
+"""
+
+
+def copy_revision(revision, target_dir):
+    if revision is None:
+        shutil.copy(os.path.join(REPO_DIR, "rest_api", "constants.py"), target_dir)
+        assets_dir = os.path.join(REPO_DIR, "rest_api", "assets")
+        if os.path.isdir(assets_dir):
+            shutil.copytree(assets_dir, os.path.join(target_dir, "assets"))
+        return
+
+    source = subprocess.run(["git", "show", f"{revision}:rest_api/constants.py"], cwd=REPO_DIR, check=True,
+                            capture_output=True).stdout
+    with open(os.path.join(target_dir, "constants.py"), "wb") as module_file:
+        module_file.write(source)
+
+
+def get_default_baseline():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_DIR, check=True, capture_output=True, text=True).stdout.strip()
+
+    if git("status", "--porcelain", "--", "rest_api/constants.py"):
+        return "HEAD"
+
+    last_change = git("rev-list", "-1", "HEAD", "--", "rest_api/constants.py")
+    return git("rev-parse", "--short", last_change + "^")
+
+
+def measure(revision, runs):
+    with tempfile.TemporaryDirectory() as target_dir:
+        copy_revision(revision, target_dir)
+        results = [json.loads(subprocess.run([sys.executable, "-c", MEASURE, target_dir], check=True,
+                                             capture_output=True, text=True).stdout) for _ in range(runs)]
+
+    warm = results[1:] or results
+    return {"cold_ms": results[0]["seconds"] * 1000,
+            "warm_ms": statistics.median(result["seconds"] for result in warm) * 1000,
+            "rss_kb": statistics.median(result["rss_kb"] for result in warm)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", help="git revision to compare with (default: before the last change)")
+    parser.add_argument("--runs", type=int, default=11, help="interpreters started per module (default: 11)")
+    args = parser.parse_args()
+    args.baseline = args.baseline or get_default_baseline()
+
+    rows = [(args.baseline, measure(args.baseline, args.runs)), ("working tree", measure(None, args.runs))]
+
+    print(f"{'constants.py':<16}{'cold import':>14}{'warm import':>14}{'max RSS growth':>18}")
+    for name, result in rows:
+        print(f"{name:<16}{result['cold_ms']:>11.1f} ms{result['warm_ms']:>11.1f} ms{result['rss_kb']:>15.0f} kB")
+
+
+if __name__ == "__main__":
+    main()
@@ -58,6 +58,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_api",
     "corsheaders"
 ]
@@ -135,4 +136,96 @@ CORS_ORIGIN_ALLOW_ALL = True
 
 TOKEN_EXPIRED_AFTER_SECONDS = 24 * 60 * 60
 
+# resolved principals (user, token, role and profile) cached by token key, per process and,
+# when SHARED_CACHE names an entry of CACHES (e.g. a Redis cache), across processes; revoked tokens only leave
+# the per-process tier of other processes when it expires, after SHARED_LOCAL_TTL seconds with a shared cache
+TOKEN_STORE = {
+    "LOCAL_SIZE": 10000,
+    "LOCAL_TTL": 5 * 60,
+    "SHARED_CACHE": None,
+    "SHARED_LOCAL_TTL": 1,
+}
+
+# fitbit calls run concurrently on a shared pool, each batch bounded by TIMEOUT seconds,
+# and authenticated sessions are reused per client for SESSION_TTL seconds
+FITBIT_GATEWAY = {
+    "MAX_WORKERS": 16,
+    "TIMEOUT": 5,
+    "SESSION_TTL": 15 * 60,
+}
+
+# per-day fitbit time-series values; today's are kept for TODAY_TTL seconds, the ones of the last RECENT_DAYS
+# closed days (which devices may still upload to) for RECENT_TTL seconds, and older days until evicted
+FITBIT_CACHE = {
+    "MAX_SIZE": 200000,
+    "TODAY_TTL": 5 * 60,
+    "RECENT_DAYS": 3,
+    "RECENT_TTL": 60 * 60,
+}
+
+# the sync_fitbit worker copies each client's fitbit activity into local tables every INTERVAL seconds,
+# six fitbit requests per sync keep every client far below fitbit's 150 requests per hour
+FITBIT_SYNC = {
+    "INTERVAL": 15 * 60,
+    "MAX_WORKERS": 4,
+    "HISTORY_DAYS": 90,
+}
+
+# user photos, stored once per content with their thumbnails (?size=small|medium)
+PHOTO_STORE = {
+    "ROOT": os.getenv("PHOTO_STORE_ROOT", os.path.join(BASE_DIR, "media", "photos")),
+    "THUMBNAIL_SIZES": {"small": 64, "medium": 256},
+}
+
+# list endpoints take ?limit=, ?cursor= and ?fields=; without a limit they are paginated only when
+# DEFAULT_LIMIT is set, and pages never hold more than MAX_LIMIT entries
+PAGINATION = {
+    "DEFAULT_LIMIT": None,
+    "MAX_LIMIT": 1000,
+}
+
+# ingredient and meal search; PostgreSQL matches through pg_trgm indexes (whose similarity_threshold
+# also applies), other databases through an in-process index rebuilt every INDEX_TTL seconds
+CATALOG_SEARCH = {
+    "DEFAULT_LIMIT": 20,
+    "MAX_LIMIT": 100,
+    "SIMILARITY_THRESHOLD": 0.3,
+    "INDEX_TTL": 5 * 60,
+}
+
+# a client's food logs of a day, grouped by type of meal, kept for TTL seconds and forgotten on every food log write;
+# the cache is per process and writes only reach the process that made them, so it is off when
+# TOKEN_STORE["SHARED_CACHE"] is set, i.e. when several processes serve requests
+FOOD_LOG_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": 10 * 60,
+}
+
+# a client's daily goals, kept per client and day for TTL seconds; profile changes (update_client and the profile
+# signals) forget them right away and again on commit, and goals computed meanwhile are not kept
+GOAL_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": 10 * 60,
+}
+
+# meals made with an edited ingredient are recomputed in batches of BATCH_SIZE, right away up to SYNC_LIMIT meals
+# and in the background beyond that when ASYNC is set; their food logs follow when PROPAGATE_TO_FOOD_LOGS is set
+MEAL_RECOMPUTE = {
+    "BATCH_SIZE": 500,
+    "SYNC_LIMIT": 1000,
+    "ASYNC": True,
+    "PROPAGATE_TO_FOOD_LOGS": False,
+}
+
+# Open Food Facts products scanned by barcode, kept in the product table for TTL seconds, or NOT_FOUND_TTL seconds
+# for unknown barcodes; API_URL takes the country (world, pt, ...) of the Open Food Facts server. With REMOTE off,
+# barcodes are only resolved from the products loaded with `manage.py import_products`
+PRODUCT_CACHE = {
+    "API_URL": "https://%s.openfoodfacts.org",
+    "TIMEOUT": 5,
+    "TTL": 7 * 24 * 60 * 60,
+    "NOT_FOUND_TTL": 24 * 60 * 60,
+    "REMOTE": True,
+}
+
 ML_URL = "http://darkflow:5000/predict"
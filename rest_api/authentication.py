@@ -1,11 +1,22 @@
+import threading
 from datetime import timedelta
 
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import AuthenticationFailed
 
+from rest_api.cache import LRUCache
+from rest_api.principal import Principal, principals, resolve_principal
+
+rotation_lock = threading.Lock()
+
+# old token key -> principal holding its replacement, for the requests that were already using the old key
+# when it was rotated
+recent_rotations = LRUCache(max_size=10000, ttl=60)
+
 
 def expires_in(token):
     time_elapsed = timezone.now() - token.created
@@ -25,22 +36,52 @@ def token_expire_handler(token):
     return is_expired, token
 
 
+def rotate_principal(principal):
+    """
+    Replaces the expired token of the principal, deleting it and creating the new one in one transaction.
+    Raises Token.DoesNotExist when the token is already gone, e.g. after a logout.
+    """
+    with rotation_lock:
+        rotated = recent_rotations.get(principal.key)
+        if rotated is not None and principals.get(rotated.key) is not None:
+            return rotated
+
+        with transaction.atomic():
+            deleted, _ = Token.objects.filter(key=principal.key).delete()
+            if not deleted:
+                raise Token.DoesNotExist
+
+            # a login may have replaced the token meanwhile, in which case its replacement is handed out
+            token, _ = Token.objects.get_or_create(user=principal.user)
+
+        rotated = Principal(principal.user, token, principal.role)
+        recent_rotations.set(principal.key, rotated)
+
+    principals.set(token.key, rotated)
+    return rotated
+
+
 class ExpiringTokenAuthentication(TokenAuthentication):
     """
     If token is expired then it will be removed
     and new one with different key will be created,
-    this new one will be given to the user only the 1st time
+    this new one will be given to the user only the 1st time.
+    Tokens are validated against the token store, so a warm token needs no queries.
     """
 
     def authenticate_credentials(self, key):
         try:
-            token = Token.objects.get(key=key)
+            principal = resolve_principal(key)
         except Token.DoesNotExist:
             raise AuthenticationFailed("Invalid token!")
 
-        if not token.user.is_active:
+        if not principal.user.is_active:
             raise AuthenticationFailed("Invalid credentials!")
 
-        is_expired, token = token_expire_handler(token)
+        if is_token_expired(principal.token):
+            try:
+                principal = rotate_principal(principal)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed("Invalid token!")
 
-        return token.user, token
+        return principal.user, principal
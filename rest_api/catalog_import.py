@@ -0,0 +1,267 @@
+import json
+import os
+import re
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+
+from rest_api.catalog_search import forget_catalog_index
+from rest_api.models import Ingredient, Meal, Quantity
+from rest_api.utils import NUTRIENTS, get_meal_nutrients, recompute_meal_nutrients
+
+BATCH_SIZE = 1000
+
+CHUNK_SIZE = 1 << 16
+
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+
+WHITESPACE = re.compile(r"\s*")
+
+DELIMITERS = ",] \t\r\n"
+
+
+def iter_json_array(json_file, chunk_size=CHUNK_SIZE):
+    """
+    Items of the top-level JSON array in a text file, decoded one at a time while the file is read in chunks,
+    so memory is bounded by the largest item instead of the whole file.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+    # "start" expects the opening bracket, "first" and "value" an item, "separator" a comma or the closing bracket
+    expecting = "start"
+
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+
+        if position == len(buffer):
+            if eof:
+                raise ValueError("The JSON array ends unexpectedly.")
+
+            chunk = json_file.read(chunk_size)
+            buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+            continue
+
+        if expecting == "start":
+            if buffer[position] != "[":
+                raise ValueError("The file does not hold a JSON array.")
+            position, expecting = position + 1, "first"
+
+        elif expecting in ("first", "separator") and buffer[position] == "]":
+            return
+
+        elif expecting == "separator":
+            if buffer[position] != ",":
+                raise ValueError("The JSON array items must be separated by commas.")
+            position, expecting = position + 1, "value"
+
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = len(buffer)
+
+            # the item may go on in the next chunk, like a number cut in half ("12." decodes as 12)
+            if not eof and (end == len(buffer) or buffer[end] not in DELIMITERS):
+                chunk = json_file.read(chunk_size)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+                continue
+
+            yield item
+            position, expecting = end, "separator"
+
+
+def iter_ndjson(json_file):
+    for line in json_file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_catalog_file(path):
+    with open(path, encoding="utf-8") as json_file:
+        if path.endswith(NDJSON_EXTENSIONS):
+            yield from iter_ndjson(json_file)
+        else:
+            yield from iter_json_array(json_file)
+
+
+def get_catalog_files(paths):
+    """
+    Ingredient and meal files among the given files and directories, recognized by their names like the
+    db_data ones. Ingredients come first, since meals refer to them.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)))
+        else:
+            files.append(path)
+
+    catalog_files = {"ingredients": [], "meals": []}
+    for path in files:
+        name = os.path.basename(path)
+        if not name.endswith((".json",) + NDJSON_EXTENSIONS) or "test" in name:
+            continue
+
+        for kind in catalog_files:
+            if kind in name:
+                catalog_files[kind].append(path)
+
+    return catalog_files
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def upsert_ingredients(batch):
+    """
+    Ingredients are matched by name: the existing ones get the new nutrient values, the others are created.
+    """
+    entries = {}
+    for entry in batch:
+        if entry.get("name"):
+            entries[entry["name"]] = {nutrient: float(entry.get(nutrient) or 0) for nutrient in NUTRIENTS}
+
+    # rewriting rows is the slow part of an import, so only the ones whose values changed are written
+    existing = list(Ingredient.objects.filter(name__in=entries))
+    changed = []
+    for ingredient in existing:
+        values = entries[ingredient.name]
+        if any(getattr(ingredient, nutrient) != value for nutrient, value in values.items()):
+            for nutrient, value in values.items():
+                setattr(ingredient, nutrient, value)
+            changed.append(ingredient)
+
+    existing_names = {ingredient.name for ingredient in existing}
+    Ingredient.objects.bulk_update(changed, NUTRIENTS)
+    Ingredient.objects.bulk_create([Ingredient(name=name, **values) for name, values in entries.items()
+                                    if name not in existing_names])
+
+    return {"created": len(entries) - len(existing_names), "updated": len(changed),
+            "unchanged": len(existing_names) - len(changed), "skipped": len(batch) - len(entries)}
+
+
+def upsert_meals(batch):
+    """
+    Catalog meals (the ones without a client) are matched by name: the existing ones get the new category,
+    quantities and nutrient values, the others are created. Meals with unknown ingredients are skipped.
+    """
+    ids = {int(item["id"]) for entry in batch for item in entry.get("ingredients", []) if "id" in item}
+    names = {item["name"] for entry in batch for item in entry.get("ingredients", [])
+             if "id" not in item and "name" in item}
+
+    # the first ingredient with a name wins, like a lookup by name would
+    by_id, by_name = {}, {}
+    for ingredient in Ingredient.objects.filter(Q(id__in=ids) | Q(name__in=names)).order_by("id"):
+        by_id[ingredient.id] = ingredient
+        by_name.setdefault(ingredient.name, ingredient)
+
+    entries = {}
+    for entry in batch:
+        resolved = [(by_id.get(int(item["id"])) if "id" in item else by_name.get(item.get("name")),
+                     float(item["quantity"])) for item in entry.get("ingredients", [])]
+        if entry.get("name") and resolved and all(ingredient is not None for ingredient, _ in resolved):
+            entries[entry["name"]] = (entry.get("category", ""), resolved)
+
+    existing = {meal.name: meal for meal in Meal.objects.filter(client=None, name__in=entries).order_by("-id")}
+    quantities = {}
+    for meal_id, ingredient_id, quantity in Quantity.objects.filter(meal__in=list(existing.values())) \
+            .values_list("meal_id", "ingredient_id", "quantity"):
+        quantities.setdefault(meal_id, []).append((ingredient_id, quantity))
+
+    new_meals, changed = [], []
+    for name, (category, resolved) in entries.items():
+        meal = existing.get(name) or Meal(name=name)
+        values = {"category": category, **get_meal_nutrients(resolved)}
+
+        if meal.pk is not None:
+            if all(getattr(meal, field) == value for field, value in values.items()) and \
+                    sorted(quantities.get(meal.pk, [])) == sorted((ingredient.id, q) for ingredient, q in resolved):
+                continue
+            changed.append(meal)
+        else:
+            new_meals.append(meal)
+
+        for field, value in values.items():
+            setattr(meal, field, value)
+
+    Meal.objects.bulk_update(changed, ["category"] + NUTRIENTS)
+    Quantity.objects.filter(meal__in=changed).delete()
+
+    Meal.objects.bulk_create(new_meals)
+    # backends that do not return the new primary keys get them back by name, as no catalog meal had those names
+    # before the insert; only a catalog meal of the same name created meanwhile could take the quantities instead
+    if new_meals and new_meals[0].pk is None:
+        new_ids = {}
+        for pk, name in Meal.objects.filter(client=None, name__in=[meal.name for meal in new_meals]) \
+                .order_by("pk").values_list("pk", "name"):
+            new_ids.setdefault(name, pk)
+        for meal in new_meals:
+            meal.pk = new_ids[meal.name]
+
+    Quantity.objects.bulk_create([Quantity(meal=meal, ingredient=ingredient, quantity=quantity)
+                                  for meal in changed + new_meals for ingredient, quantity in entries[meal.name][1]])
+
+    return {"created": len(new_meals), "updated": len(changed), "unchanged": len(existing) - len(changed),
+            "skipped": len(batch) - len(entries)}
+
+
+def import_entries(upsert, entries, batch_size=BATCH_SIZE, progress=None):
+    """
+    Upserts the entries in batches of batch_size, each batch in its own transaction, and calls
+    progress(report) after each one. The report counts the created, updated, unchanged and skipped entries.
+    """
+    report = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    for batch in batched(entries, batch_size):
+        with transaction.atomic():
+            for key, count in upsert(batch).items():
+                report[key] += count
+
+        if progress:
+            progress(report)
+
+    return report
+
+
+def import_ingredients(entries, batch_size=BATCH_SIZE, progress=None):
+    report = import_entries(upsert_ingredients, entries, batch_size, progress)
+    forget_catalog_index(Ingredient)
+
+    # the meals made with updated ingredients are summed again, all of them in one statement
+    if report["updated"]:
+        recompute_meal_nutrients()
+
+    return report
+
+
+def import_meals(entries, batch_size=BATCH_SIZE, progress=None):
+    report = import_entries(upsert_meals, entries, batch_size, progress)
+    forget_catalog_index(Meal)
+    return report
+
+
+def import_catalog(paths, batch_size=BATCH_SIZE, progress=None):
+    """
+    Streams every ingredient and meal file found in paths into the catalog, calling
+    progress(kind, path, report) after each batch.
+    """
+    importers = {"ingredients": import_ingredients, "meals": import_meals}
+
+    reports = {}
+    for kind, files in get_catalog_files(paths).items():
+        reports[kind] = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        for path in files:
+            on_batch = (lambda report, kind=kind, path=path: progress(kind, path, report)) if progress else None
+            report = importers[kind](iter_catalog_file(path), batch_size, on_batch)
+            for key, count in report.items():
+                reports[kind][key] += count
+
+    return reports
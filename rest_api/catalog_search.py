@@ -0,0 +1,215 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from rest_api.cache import LRUCache
+from rest_api.models import Ingredient, Meal
+from rest_api.pagination import decode_cursor, encode_cursor
+
+DEFAULT_CATALOG_SEARCH = {
+    "DEFAULT_LIMIT": 20,
+    "MAX_LIMIT": 100,
+    "SIMILARITY_THRESHOLD": 0.3,
+    "INDEX_TTL": 5 * 60,
+}
+
+# a result ranks by how its name matches the query, then by the trigram similarity of its name
+EXACT, PREFIX, WORD_PREFIX, SIMILAR = 3, 2, 1, 0
+
+WORD = re.compile(r"\w+")
+
+
+def get_catalog_search_settings():
+    return {**DEFAULT_CATALOG_SEARCH, **getattr(settings, "CATALOG_SEARCH", {})}
+
+
+def get_trigrams(text):
+    """
+    The trigrams of each word of text, padded like pg_trgm does, so both backends agree on similarities.
+    """
+    trigrams = set()
+    for word in WORD.findall(text.casefold()):
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return trigrams
+
+
+def get_similarity(query_trigrams, text_trigrams):
+    if not query_trigrams or not text_trigrams:
+        return 0.0
+
+    shared = len(query_trigrams & text_trigrams)
+    return shared / (len(query_trigrams) + len(text_trigrams) - shared)
+
+
+def get_rank(query, name, other=""):
+    query, name = query.casefold(), name.casefold()
+    if name == query:
+        return EXACT
+    if name.startswith(query):
+        return PREFIX
+    if any(re.search(r"(^|\W)" + re.escape(query), text.casefold()) for text in (name, other)):
+        return WORD_PREFIX
+    return SIMILAR
+
+
+def parse_search_key(key):
+    rank, similarity, name, pk = key
+    return int(rank), float(similarity), str(name), int(pk)
+
+
+def parse_search_params(params):
+    """
+    The query, limit, offset and decoded cursor of a search request. Raises ValueError for invalid values.
+    """
+    options = get_catalog_search_settings()
+
+    query = params.get("q", "").strip()
+    if not query:
+        raise ValueError("Missing search query.")
+
+    try:
+        limit = int(params.get("limit", options["DEFAULT_LIMIT"]))
+        offset = int(params.get("offset", 0))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid limit or offset.")
+    if limit < 1 or offset < 0:
+        raise ValueError("Invalid limit or offset.")
+
+    cursor = decode_cursor(params["cursor"], parse_search_key) if params.get("cursor") else None
+    return query, min(limit, options["MAX_LIMIT"]), offset, cursor
+
+
+class CatalogIndex:
+    """
+    In-process search index over the names of a catalog table, for the databases without trigram indexes.
+    Word prefixes are found by bisecting the sorted words of every entry, and similar names through
+    an inverted index from trigrams to entries.
+    """
+
+    def __init__(self, entries):
+        # entries are (pk, name, other searchable text, owner pk or None)
+        self.entries = {pk: (name, other, owner, get_trigrams(name)) for pk, name, other, owner in entries}
+
+        self.words = sorted({(word, pk) for pk, name, other, _ in entries
+                             for word in WORD.findall(f"{name} {other}".casefold())})
+
+        self.postings = {}
+        for pk, (_, _, _, trigrams) in self.entries.items():
+            for trigram in trigrams:
+                self.postings.setdefault(trigram, []).append(pk)
+
+    def search(self, query, threshold, owner=None):
+        """
+        (rank, similarity, name, pk) of the entries matching query, owned by nobody or by owner.
+        """
+        candidates = set()
+
+        first_word = WORD.findall(query.casefold())[:1]
+        if first_word:
+            start = bisect_left(self.words, (first_word[0],))
+            for word, pk in self.words[start:]:
+                if not word.startswith(first_word[0]):
+                    break
+                candidates.add(pk)
+
+        query_trigrams = get_trigrams(query)
+        shared = Counter(pk for trigram in query_trigrams for pk in self.postings.get(trigram, []))
+        for pk, count in shared.items():
+            if count / (len(query_trigrams) + len(self.entries[pk][3]) - count) >= threshold:
+                candidates.add(pk)
+
+        results = []
+        for pk in candidates:
+            name, other, entry_owner, trigrams = self.entries[pk]
+            if entry_owner is not None and entry_owner != owner:
+                continue
+
+            rank, similarity = get_rank(query, name, other), get_similarity(query_trigrams, trigrams)
+            if rank != SIMILAR or similarity >= threshold:
+                results.append((rank, similarity, name, pk))
+
+        return sorted(results, key=lambda result: (-result[0], -result[1], result[2], result[3]))
+
+
+# model label -> CatalogIndex, rebuilt after INDEX_TTL seconds or when the catalog changes
+catalog_indexes = LRUCache(max_size=8)
+
+CATALOG_ENTRIES = {
+    "ingredient": lambda: [(pk, name, "", None) for pk, name in Ingredient.objects.values_list("id", "name")],
+    "meal": lambda: Meal.objects.values_list("id", "name", "category", "client_id"),
+}
+
+
+def get_catalog_index(model):
+    label = model._meta.model_name
+    index = catalog_indexes.get(label)
+    if index is None:
+        index = CatalogIndex(list(CATALOG_ENTRIES[label]()))
+        catalog_indexes.set(label, index, ttl=get_catalog_search_settings()["INDEX_TTL"])
+
+    return index
+
+
+def forget_catalog_index(model=None):
+    if model is None:
+        catalog_indexes.clear()
+    else:
+        catalog_indexes.delete(model._meta.model_name)
+
+
+def search_with_trigrams(queryset, query, threshold, limit, offset, cursor, other_field=None):
+    word_prefix = r"(^|\W)" + re.escape(query)
+    word_match = Q(name__iregex=word_prefix)
+    if other_field:
+        word_match |= Q(**{f"{other_field}__iregex": word_prefix})
+
+    # trigram_similar (%) and ~* are served by the gin_trgm_ops indexes, the ranking only runs on matches
+    queryset = queryset.filter(word_match | Q(name__trigram_similar=query)).annotate(
+        rank=Case(When(name__iexact=query, then=Value(EXACT)), When(name__istartswith=query, then=Value(PREFIX)),
+                  When(word_match, then=Value(WORD_PREFIX)), default=Value(SIMILAR), output_field=IntegerField()),
+        similarity=TrigramSimilarity("name", query),
+    ).filter(Q(rank__gt=SIMILAR) | Q(similarity__gte=threshold)).order_by("-rank", "-similarity", "name", "id")
+
+    if cursor:
+        rank, similarity, name, pk = cursor
+        queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, similarity__lt=similarity) |
+                                   Q(rank=rank, similarity=similarity, name__gt=name) |
+                                   Q(rank=rank, similarity=similarity, name=name, id__gt=pk))
+
+    page = list(queryset[offset:offset + limit + 1])
+    keys = [(item.rank, float(item.similarity), item.name, item.pk) for item in page]
+    return page, keys
+
+
+def search_with_index(queryset, query, threshold, limit, offset, cursor, owner=None):
+    results = get_catalog_index(queryset.model).search(query, threshold, owner)
+    if cursor:
+        cursor_key = (-cursor[0], -cursor[1], cursor[2], cursor[3])
+        results = [result for result in results if (-result[0], -result[1], result[2], result[3]) > cursor_key]
+
+    keys = results[offset:offset + limit + 1]
+    objects = queryset.in_bulk([pk for _, _, _, pk in keys])
+    return [objects[pk] for _, _, _, pk in keys if pk in objects], keys
+
+
+def search_catalog(queryset, query, limit, offset=0, cursor=None, other_field=None, owner=None):
+    """
+    One page of the catalog entries of queryset matching query, best matches first, and the cursor
+    of the next page (None on the last one).
+    """
+    threshold = get_catalog_search_settings()["SIMILARITY_THRESHOLD"]
+
+    if connection.vendor == "postgresql":
+        page, keys = search_with_trigrams(queryset, query, threshold, limit, offset, cursor, other_field)
+    else:
+        page, keys = search_with_index(queryset, query, threshold, limit, offset, cursor, owner)
+
+    next_cursor = encode_cursor(keys[limit - 1]) if len(keys) > limit else None
+    return page[:limit], next_cursor
@@ -0,0 +1,87 @@
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+
+from rest_api.cache import LRUCache
+
+DEFAULT_FITBIT_CACHE = {
+    "MAX_SIZE": 200000,
+    "TODAY_TTL": 5 * 60,
+    "RECENT_DAYS": 3,
+    "RECENT_TTL": 60 * 60,
+}
+
+# days covered by each fitbit period, matching the week/month/3-months used by the nutrients history
+PERIOD_DAYS = {"1d": 1, "7d": 7, "1w": 7, "30d": 30, "1m": 30, "3m": 90}
+
+
+def get_fitbit_cache_settings():
+    return {**DEFAULT_FITBIT_CACHE, **getattr(settings, "FITBIT_CACHE", {})}
+
+
+class FitbitSeriesCache:
+    """
+    Per-day fitbit time-series values keyed by (client, resource, day). Today's value expires after a short
+    time-to-live, the ones of the last recent_days closed days after recent_ttl, as devices may upload them
+    hours late, and older days never change and are kept until evicted.
+    """
+
+    def __init__(self, max_size=200000, today_ttl=5 * 60, recent_days=3, recent_ttl=60 * 60):
+        self.days = LRUCache(max_size=max_size)
+        self.today_ttl = today_ttl
+        self.recent_days = recent_days
+        self.recent_ttl = recent_ttl
+
+    def time_series(self, api, client_id, resource, period, base_date=None):
+        """
+        Same answer as api.time_series(resource, base_date=base_date, period=period),
+        but only the days missing from the cache are asked to fitbit, in one ranged call.
+        """
+        end_date = base_date or date.today()
+        if isinstance(end_date, str):
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+
+        days = [end_date - timedelta(days=i) for i in range(PERIOD_DAYS[period] - 1, -1, -1)]
+        series_key = "activities-" + resource.split("/")[-1]
+
+        values = {day: self.days.get((client_id, resource, day)) for day in days}
+        missing = [day for day, value in values.items() if value is None]
+
+        if missing:
+            response = api.time_series(resource, base_date=str(missing[0]), end_date=str(missing[-1]))
+            for entry in response[series_key]:
+                day = datetime.strptime(entry["dateTime"], "%Y-%m-%d").date()
+                if day in values:
+                    values[day] = entry
+                    self.set(client_id, resource, day, entry)
+
+        return {series_key: [entry for entry in values.values() if entry is not None]}
+
+    def set(self, client_id, resource, day, entry):
+        today = date.today()
+        if day >= today:
+            ttl = self.today_ttl
+        elif day >= today - timedelta(days=self.recent_days):
+            ttl = self.recent_ttl
+        else:
+            ttl = None
+
+        self.days.set((client_id, resource, day), entry, ttl=ttl)
+
+    def purge(self, client_id):
+        return self.days.delete_where(lambda key, entry: key[0] == client_id)
+
+    def clear(self):
+        self.days.clear()
+
+    def stats(self):
+        return self.days.stats()
+
+
+def build_fitbit_series_cache():
+    options = get_fitbit_cache_settings()
+    return FitbitSeriesCache(max_size=options["MAX_SIZE"], today_ttl=options["TODAY_TTL"],
+                             recent_days=options["RECENT_DAYS"], recent_ttl=options["RECENT_TTL"])
+
+
+fitbit_series = build_fitbit_series_cache()
@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import fitbit
+from django.conf import settings
+from fitbit.exceptions import Timeout
+
+from rest_api.cache import LRUCache
+from rest_api.fitbit_cache import fitbit_series
+from rest_api.constants import CLIENT_FITBIT_ID, CLIENT_FITBIT_SECRET
+
+DEFAULT_FITBIT_GATEWAY = {
+    "MAX_WORKERS": 16,
+    "TIMEOUT": 5,
+    "SESSION_TTL": 15 * 60,
+}
+
+# a refresh this recent was done by a concurrent call, so the others reuse it
+REFRESH_GRACE_SECONDS = 30
+
+
+def get_fitbit_gateway_settings():
+    return {**DEFAULT_FITBIT_GATEWAY, **getattr(settings, "FITBIT_GATEWAY", {})}
+
+
+fitbit_executor = ThreadPoolExecutor(max_workers=get_fitbit_gateway_settings()["MAX_WORKERS"],
+                                     thread_name_prefix="fitbit")
+
+
+class FitbitGateway:
+    """
+    One authenticated Fitbit session per client. Independent calls are issued concurrently on a
+    shared thread pool, so a batch takes as long as its slowest call and never longer than the timeout.
+    """
+
+    def __init__(self, client, timeout=None, api=None):
+        self.client_id = client.pk
+        self.opened_with = client.fitbit_refresh_token
+        self.timeout = timeout if timeout is not None else get_fitbit_gateway_settings()["TIMEOUT"]
+        self.api = api or fitbit.Fitbit(CLIENT_FITBIT_ID, CLIENT_FITBIT_SECRET, system="en_UK", oauth2=True,
+                                        access_token=client.fitbit_access_token,
+                                        refresh_token=client.fitbit_refresh_token, refresh_cb=client.refresh_cb,
+                                        timeout=self.timeout)
+
+        self.refresh_lock = threading.Lock()
+        self.refreshed_at = None
+        self.guard_refresh()
+
+    def guard_refresh(self):
+        # refresh tokens are single use, so concurrent calls hitting an expired token must refresh only once
+        oauth_client = getattr(self.api, "client", None)
+        if oauth_client is None or not hasattr(oauth_client, "refresh_token"):
+            return
+
+        refresh_token = oauth_client.refresh_token
+
+        def locked_refresh():
+            with self.refresh_lock:
+                if self.refreshed_at is not None and time.monotonic() - self.refreshed_at < REFRESH_GRACE_SECONDS:
+                    return oauth_client.session.token
+
+                token = refresh_token()
+                self.refreshed_at = time.monotonic()
+                return token
+
+        oauth_client.refresh_token = locked_refresh
+
+    @property
+    def refresh_token(self):
+        # follows refreshes done by the session itself
+        session = getattr(getattr(self.api, "client", None), "session", None)
+        return session.token.get("refresh_token") if session is not None else self.opened_with
+
+    def series(self, resource, period, base_date=None):
+        """
+        A call for gather() reading the time series through the per-day cache.
+        """
+        return lambda api: fitbit_series.time_series(api, self.client_id, resource, period, base_date)
+
+    def call(self, function):
+        return self.gather(result=function)["result"]
+
+    def gather(self, **calls):
+        """
+        Runs every `name=function(api)` call at the same time and returns their results by name.
+        Raises the first error, or fitbit.exceptions.Timeout when a call does not finish in time.
+        """
+        futures = {name: fitbit_executor.submit(function, self.api) for name, function in calls.items()}
+        done, pending = wait(futures.values(), timeout=self.timeout)
+
+        if pending:
+            for future in pending:
+                future.cancel()
+            raise Timeout(f"Fitbit did not answer within {self.timeout} seconds.")
+
+        return {name: future.result() for name, future in futures.items()}
+
+
+sessions = LRUCache(max_size=10000, ttl=get_fitbit_gateway_settings()["SESSION_TTL"])
+
+
+def get_fitbit_gateway(client):
+    gateway = sessions.get(client.pk)
+
+    # tokens changed since the session was opened (new device or tokens dropped after an error)
+    if gateway is None or gateway.refresh_token != client.fitbit_refresh_token:
+        gateway = FitbitGateway(client)
+        sessions.set(client.pk, gateway)
+
+    return gateway
+
+
+def forget_fitbit_gateway(client_id):
+    sessions.delete(client_id)
@@ -0,0 +1,174 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from fitbit.exceptions import HTTPTooManyRequests, HTTPUnauthorized
+
+from rest_api.fitbit_gateway import get_fitbit_gateway
+from rest_api.models import Client, FitbitActivity, FitbitSync
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FITBIT_SYNC = {
+    "INTERVAL": 15 * 60,
+    "MAX_WORKERS": 4,
+    "HISTORY_DAYS": 90,
+}
+
+ACTIVITY_RESOURCES = {
+    "steps": "activities/steps",
+    "distance": "activities/distance",
+    "calories": "activities/calories",
+    "floors": "activities/floors",
+    "resting_heart_rate": "activities/heart",
+}
+
+GOAL_FIELDS = {"steps_goal": "steps", "distance_goal": "distance", "calories_goal": "caloriesOut",
+               "floors_goal": "floors"}
+
+
+def get_fitbit_sync_settings():
+    return {**DEFAULT_FITBIT_SYNC, **getattr(settings, "FITBIT_SYNC", {})}
+
+
+def get_sync_window(client):
+    today = date.today()
+    try:
+        sync = client.fitbitsync
+    except FitbitSync.DoesNotExist:
+        sync = None
+
+    if sync is None or sync.synced_at is None:
+        return today - timedelta(days=get_fitbit_sync_settings()["HISTORY_DAYS"] - 1), today
+
+    # the last synced day is read again, its totals were still growing
+    return min(timezone.localdate(sync.synced_at), today), today
+
+
+def fetch_activity(api, start_date, end_date):
+    """
+    Asks fitbit for every synced series between both days (one ranged call per series) and the daily goals.
+    Only talks to fitbit, so it can run away from the request/worker thread.
+    """
+    series = {}
+    for field, resource in ACTIVITY_RESOURCES.items():
+        response = api.time_series(resource, base_date=str(start_date), end_date=str(end_date))
+        series[field] = response["activities-" + resource.split("/")[-1]]
+
+    return series, api.activities_daily_goal()["goals"]
+
+
+def parse_activity_value(field, value):
+    if field == "resting_heart_rate":
+        return value.get("restingHeartRate")
+    if field == "distance":
+        return float(value)
+    return int(float(value))
+
+
+def store_activity(client_id, start_date, end_date, series, goals):
+    days = {}
+    for field, entries in series.items():
+        for entry in entries:
+            day = days.setdefault(entry["dateTime"], {})
+            day[field] = parse_activity_value(field, entry["value"])
+
+    with transaction.atomic():
+        FitbitActivity.objects.filter(client_id=client_id, day__range=(start_date, end_date)).delete()
+        FitbitActivity.objects.bulk_create(
+            [FitbitActivity(client_id=client_id, day=day, **values) for day, values in days.items()], batch_size=1000)
+
+        FitbitSync.objects.update_or_create(
+            client_id=client_id,
+            defaults={"synced_at": timezone.now(), "retry_after": None,
+                      **{field: goals.get(goal, 0) for field, goal in GOAL_FIELDS.items()}})
+
+    return len(days)
+
+
+def sync_client(client):
+    start_date, end_date = get_sync_window(client)
+    series, goals = fetch_activity(get_fitbit_gateway(client).api, start_date, end_date)
+    return store_activity(client.pk, start_date, end_date, series, goals)
+
+
+def defer_sync(client_id, error):
+    retry_after = timezone.now() + timedelta(seconds=error.retry_after_secs)
+    FitbitSync.objects.update_or_create(client_id=client_id, defaults={"retry_after": retry_after})
+
+
+def ensure_synced(client):
+    # clients the worker has not reached yet (e.g. a device integrated a moment ago) are synced on the spot,
+    # unless fitbit asked to wait, in which case their local activity (if any) is served as it is
+    waiting = Q(synced_at__isnull=False) | Q(retry_after__gt=timezone.now())
+    if FitbitSync.objects.filter(waiting, client=client).exists():
+        return
+
+    try:
+        sync_client(client)
+    except HTTPTooManyRequests as e:
+        defer_sync(client.pk, e)
+        raise
+
+
+def get_clients_to_sync(clients=None, force=False):
+    clients = Client.objects.all() if clients is None else clients
+    clients = clients.filter(fitbit_access_token__isnull=False, fitbit_refresh_token__isnull=False)
+    if force:
+        return clients
+
+    now = timezone.now()
+    synced_before = now - timedelta(seconds=get_fitbit_sync_settings()["INTERVAL"])
+    return clients.filter(Q(fitbitsync__isnull=True) | Q(fitbitsync__synced_at__isnull=True) |
+                          Q(fitbitsync__synced_at__lte=synced_before),
+                          Q(fitbitsync__retry_after__isnull=True) | Q(fitbitsync__retry_after__lte=now))
+
+
+def sync_clients(clients=None, force=False, max_workers=None):
+    """
+    Syncs every due client with fitbit tokens into the local activity tables. Fitbit is called from a
+    bounded pool, one client per worker, while the database is only touched from the calling thread.
+    Clients over their rate limit are skipped until fitbit allows them again.
+    """
+    max_workers = max_workers or get_fitbit_sync_settings()["MAX_WORKERS"]
+    report = {"synced": 0, "rate_limited": 0, "disconnected": 0, "failed": 0}
+
+    jobs = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fitbit-sync") as pool:
+        for client in get_clients_to_sync(clients, force).select_related("fitbitsync"):
+            start_date, end_date = get_sync_window(client)
+            future = pool.submit(fetch_activity, get_fitbit_gateway(client).api, start_date, end_date)
+            jobs[future] = (client, start_date, end_date)
+
+        for future in as_completed(jobs):
+            client, start_date, end_date = jobs[future]
+            try:
+                series, goals = future.result()
+                store_activity(client.pk, start_date, end_date, series, goals)
+                report["synced"] += 1
+
+            except HTTPTooManyRequests as e:
+                defer_sync(client.pk, e)
+                report["rate_limited"] += 1
+
+            except HTTPUnauthorized:
+                # same as the request handlers, a revoked device has to be integrated again
+                client.fitbit_access_token = None
+                client.fitbit_refresh_token = None
+                client.save()
+                report["disconnected"] += 1
+
+            except Exception:
+                logger.exception("Error while syncing fitbit data of client %s", client.pk)
+                report["failed"] += 1
+
+    return report
+
+
+def forget_fitbit_activity(client_id):
+    FitbitActivity.objects.filter(client_id=client_id).delete()
+    FitbitSync.objects.filter(client_id=client_id).delete()
@@ -0,0 +1,46 @@
+from datetime import date, datetime
+
+from django.conf import settings
+
+from rest_api.cache import LRUCache
+from rest_api.token_store import get_token_store_settings
+
+DEFAULT_FOOD_LOG_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": 10 * 60,
+}
+
+
+def get_food_log_cache_settings():
+    return {**DEFAULT_FOOD_LOG_CACHE, **getattr(settings, "FOOD_LOG_CACHE", {})}
+
+
+def build_food_log_cache():
+    options = get_food_log_cache_settings()
+
+    # writes only forget the days cached by the process that made them, so the cache is off (nothing is kept)
+    # when several processes serve requests, which is when the token store has a shared tier
+    if get_token_store_settings()["SHARED_CACHE"]:
+        return LRUCache(max_size=0)
+
+    return LRUCache(max_size=options["MAX_SIZE"], ttl=options["TTL"])
+
+
+# (client pk, day) -> the day's food logs grouped by type of meal, forgotten on every food log write
+food_log_days = build_food_log_cache()
+
+
+def get_food_log_key(client_id, day):
+    # days come as dates from the database and as text from requests, which may leave out leading zeros
+    if not isinstance(day, date):
+        day = datetime.strptime(day, "%Y-%m-%d").date()
+
+    return client_id, day
+
+
+def forget_food_log_day(client_id, day):
+    food_log_days.delete(get_food_log_key(client_id, day))
+
+
+def purge_food_log_days(client_id):
+    return food_log_days.delete_where(lambda key, value: key[0] == client_id)
@@ -0,0 +1,56 @@
+import threading
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+
+from rest_api.cache import LRUCache
+
+DEFAULT_GOAL_CACHE = {
+    "MAX_SIZE": 10000,
+    "TTL": 10 * 60,
+}
+
+
+def get_goal_cache_settings():
+    return {**DEFAULT_GOAL_CACHE, **getattr(settings, "GOAL_CACHE", {})}
+
+
+def build_goal_cache():
+    options = get_goal_cache_settings()
+    return LRUCache(max_size=options["MAX_SIZE"], ttl=options["TTL"])
+
+
+# (client pk, day) -> the client's daily goals, which also depend on its age, or the claim of the request
+# computing them
+daily_goals = build_goal_cache()
+goal_lock = threading.Lock()
+
+
+def get_goal_key(client_id):
+    return client_id, date.today()
+
+
+def claim_daily_goals(client_id):
+    claim = object()
+    daily_goals.set(get_goal_key(client_id), claim)
+    return claim
+
+
+def store_daily_goals(client_id, claim, goals):
+    # goals are only kept if the profile did not change since they were claimed, else they may be stale
+    with goal_lock:
+        key = get_goal_key(client_id)
+        if daily_goals.get(key) is claim:
+            daily_goals.set(key, goals)
+
+
+def delete_daily_goals(client_id):
+    with goal_lock:
+        daily_goals.delete(get_goal_key(client_id))
+
+
+def forget_daily_goals(client_id):
+    # again once the change is committed, for the goals claimed while it was not visible yet
+    delete_daily_goals(client_id)
+    transaction.on_commit(lambda: delete_daily_goals(client_id))
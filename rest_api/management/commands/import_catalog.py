@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_api.catalog_import import BATCH_SIZE, get_catalog_files, import_catalog
+
+
+class Command(BaseCommand):
+    help = ("Stream ingredient and meal files (JSON arrays or NDJSON) into the catalog, updating the entries "
+            "that already exist by name")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", metavar="PATH",
+                            help="Files or directories whose file names contain 'ingredients' or 'meals'")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help=f"Entries upserted per transaction (default: {BATCH_SIZE})")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("The batch size must be positive.")
+
+        if not any(get_catalog_files(options["paths"]).values()):
+            raise CommandError("No ingredient or meal files were found.")
+
+        def progress(kind, path, report):
+            self.stdout.write("{path}: {processed} {kind} ({created} created, {updated} updated, "
+                              "{unchanged} unchanged, {skipped} skipped)"
+                              .format(path=path, kind=kind, processed=sum(report.values()), **report))
+
+        reports = import_catalog(options["paths"], options["batch_size"], progress)
+        self.stdout.write(self.style.SUCCESS(
+            "Imported {ingredients[created]} new and {ingredients[updated]} updated ingredients, "
+            "{meals[created]} new and {meals[updated]} updated meals.".format(**reports)))
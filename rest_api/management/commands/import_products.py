@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_api.product_import import BATCH_SIZE, get_product_files, import_products
+
+
+class Command(BaseCommand):
+    help = ("Stream Open Food Facts dumps or delta files (JSONL or the tab separated CSV export, optionally gzipped) "
+            "into the product table, so barcodes are resolved without asking Open Food Facts")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", metavar="PATH",
+                            help="Files or directories of .jsonl, .ndjson, .csv or .tsv files, applied in name order")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help=f"Products upserted per transaction (default: {BATCH_SIZE})")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("The batch size must be positive.")
+
+        if not get_product_files(options["paths"]):
+            raise CommandError("No Open Food Facts files were found.")
+
+        def progress(path, report):
+            self.stdout.write("{path}: {processed} products ({created} created, {updated} updated, "
+                              "{unchanged} unchanged, {skipped} skipped)"
+                              .format(path=path, processed=sum(report.values()), **report))
+
+        report = import_products(options["paths"], options["batch_size"], progress)
+        self.stdout.write(self.style.SUCCESS("Imported {created} new and {updated} updated products.".format(**report)))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_api.models import Client
+from rest_api.utils import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-client daily nutrition rollup from the food logs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--client", action="append", dest="clients", metavar="EMAIL",
+                            help="Only rebuild the rollup of this client (can be repeated)")
+
+    def handle(self, *args, **options):
+        clients = None
+        if options["clients"]:
+            clients = Client.objects.filter(user__auth_user__username__in=options["clients"])
+            if clients.count() != len(set(options["clients"])):
+                raise CommandError("Some of the given clients do not exist.")
+
+        created = rebuild_daily_summaries(clients)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} daily nutrition summaries."))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_api.seeding import SYNTHETIC_PASSWORD, generate_fixtures, load_fixtures, merge_fixtures, seed_database
+
+
+class Command(BaseCommand):
+    help = "Wipe the users and the food catalog and seed them again from db_data, in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=int, default=0, metavar="N",
+                            help="Also generate N synthetic clients, ingredients and meals for load testing")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data generator")
+
+    def handle(self, *args, **options):
+        if options["scale"] < 0:
+            raise CommandError("The scale can not be negative.")
+
+        fixtures = load_fixtures()
+        if options["scale"]:
+            fixtures = merge_fixtures(fixtures, generate_fixtures(options["scale"], options["seed"]))
+
+        start = time.perf_counter()
+        report = seed_database(fixtures)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded {users} users, {ingredients} ingredients and {meals} meals ({skipped_meals} meals skipped) "
+            "in {elapsed:.1f}s.".format(elapsed=elapsed, **report)))
+        if options["scale"]:
+            self.stdout.write(f"Synthetic users log in with the password '{SYNTHETIC_PASSWORD}'.")
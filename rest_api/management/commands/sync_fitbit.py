@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from rest_api.fitbit_sync import get_fitbit_sync_settings, sync_clients
+from rest_api.models import Client
+
+
+class Command(BaseCommand):
+    help = "Copy the fitbit activity of every client with an integrated device into the local tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--client", action="append", dest="clients", metavar="EMAIL",
+                            help="Only sync this client (can be repeated)")
+        parser.add_argument("--force", action="store_true",
+                            help="Sync clients even if they were synced less than an interval ago")
+        parser.add_argument("--forever", action="store_true", help="Keep syncing, once every interval")
+        parser.add_argument("--interval", type=int, metavar="SECONDS",
+                            help="Seconds between runs with --forever (defaults to FITBIT_SYNC['INTERVAL'])")
+
+    def handle(self, *args, **options):
+        clients = None
+        if options["clients"]:
+            clients = Client.objects.filter(user__auth_user__username__in=options["clients"])
+            if clients.count() != len(set(options["clients"])):
+                raise CommandError("Some of the given clients do not exist.")
+
+        interval = options["interval"] or get_fitbit_sync_settings()["INTERVAL"]
+
+        while True:
+            report = sync_clients(clients, force=options["force"])
+            self.stdout.write(self.style.SUCCESS(
+                "Synced {synced} clients ({rate_limited} rate limited, {disconnected} disconnected, "
+                "{failed} failed).".format(**report)))
+
+            if not options["forever"]:
+                break
+
+            close_old_connections()
+            time.sleep(interval)
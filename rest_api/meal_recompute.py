@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from rest_api.models import MealHistory, Quantity
+from rest_api.utils import rebuild_daily_summaries, recompute_food_log_nutrients, recompute_meal_nutrients
+
+DEFAULT_MEAL_RECOMPUTE = {
+    "BATCH_SIZE": 500,
+    "SYNC_LIMIT": 1000,
+    "ASYNC": True,
+    "PROPAGATE_TO_FOOD_LOGS": False,
+}
+
+recompute_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="meal-recompute")
+
+
+def get_meal_recompute_settings():
+    return {**DEFAULT_MEAL_RECOMPUTE, **getattr(settings, "MEAL_RECOMPUTE", {})}
+
+
+def recompute_meals(meal_ids, batch_size=None, propagate=None, close_connection=False):
+    """
+    Recomputes the nutrient values of the meals from their quantities, batch_size meals per transaction,
+    and, when propagate is set, the ones of their food logs and the daily rollups of the clients who logged them.
+    Returns the number of meals and food logs written.
+    """
+    options = get_meal_recompute_settings()
+    batch_size = batch_size or options["BATCH_SIZE"]
+    propagate = options["PROPAGATE_TO_FOOD_LOGS"] if propagate is None else propagate
+
+    try:
+        meals = food_logs = 0
+        for start in range(0, len(meal_ids), batch_size):
+            batch = meal_ids[start:start + batch_size]
+            with transaction.atomic():
+                meals += recompute_meal_nutrients(batch)
+                if propagate:
+                    food_logs += recompute_food_log_nutrients(batch)
+
+        if food_logs:
+            clients = set(MealHistory.objects.filter(meal_id__in=meal_ids).values_list("client_id", flat=True))
+            rebuild_daily_summaries(clients)
+
+        return meals, food_logs
+
+    finally:
+        # background threads own their connection
+        if close_connection:
+            connection.close()
+
+
+def recompute_ingredient_meals(ingredient_id, propagate=None):
+    """
+    Recomputes the meals made with the ingredient after its nutrient values changed. Up to SYNC_LIMIT meals are
+    recomputed right away, more are left to a background pass once the current transaction commits.
+    """
+    options = get_meal_recompute_settings()
+    meal_ids = list(Quantity.objects.filter(ingredient_id=ingredient_id).order_by("meal_id")
+                    .values_list("meal_id", flat=True).distinct())
+
+    if len(meal_ids) > options["SYNC_LIMIT"] and options["ASYNC"]:
+        transaction.on_commit(lambda: recompute_executor.submit(recompute_meals, meal_ids, propagate=propagate,
+                                                                close_connection=True))
+        return None
+
+    return recompute_meals(meal_ids, propagate=propagate)
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Q, Sum
+
+
+def build_summaries(apps, schema_editor):
+    MealHistory = apps.get_model("rest_api", "MealHistory")
+    DailyNutritionSummary = apps.get_model("rest_api", "DailyNutritionSummary")
+
+    fields = ["calories", "carbs", "fat", "proteins"]
+    aggregates = {f"total_{nutrient}": Sum(nutrient) for nutrient in fields}
+    for type_of_meal in ["breakfast", "lunch", "dinner", "snack"]:
+        fields.append(f"{type_of_meal}_calories")
+        aggregates[f"total_{type_of_meal}_calories"] = Sum("calories", filter=Q(type_of_meal__iexact=type_of_meal))
+
+    history_per_day = MealHistory.objects.values("client_id", "day").annotate(**aggregates).order_by()
+    DailyNutritionSummary.objects.bulk_create(
+        [DailyNutritionSummary(client_id=entry["client_id"], day=entry["day"],
+                               **{field: entry[f"total_{field}"] or 0 for field in fields})
+         for entry in history_per_day.iterator()],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0010_auto_20200513_1109'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNutritionSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('calories', models.FloatField(default=0)),
+                ('proteins', models.FloatField(default=0)),
+                ('fat', models.FloatField(default=0)),
+                ('carbs', models.FloatField(default=0)),
+                ('breakfast_calories', models.FloatField(default=0)),
+                ('lunch_calories', models.FloatField(default=0)),
+                ('dinner_calories', models.FloatField(default=0)),
+                ('snack_calories', models.FloatField(default=0)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rest_api.client')),
+            ],
+            options={
+                'unique_together': {('client', 'day')},
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0011_dailynutritionsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FitbitSync',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='rest_api.client')),
+                ('synced_at', models.DateTimeField(null=True)),
+                ('retry_after', models.DateTimeField(null=True)),
+                ('steps_goal', models.IntegerField(default=0)),
+                ('distance_goal', models.FloatField(default=0)),
+                ('calories_goal', models.IntegerField(default=0)),
+                ('floors_goal', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FitbitActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('steps', models.IntegerField(default=0)),
+                ('distance', models.FloatField(default=0)),
+                ('calories', models.IntegerField(default=0)),
+                ('floors', models.IntegerField(default=0)),
+                ('resting_heart_rate', models.IntegerField(null=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rest_api.client')),
+            ],
+            options={
+                'unique_together': {('client', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:52
+
+import base64
+import binascii
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import migrations, models
+from PIL import Image
+
+# the photo store as it was when this migration was written, frozen so later changes to rest_api.photo_store
+# can not change what it does
+PHOTO_ROOT = os.path.join(settings.BASE_DIR, "media", "photos")
+
+THUMBNAIL_SIZES = {"small": 64, "medium": 256}
+
+
+def get_photo_root():
+    return getattr(settings, "PHOTO_STORE", {}).get("ROOT", PHOTO_ROOT)
+
+
+def get_photo_path(root, photo_hash, size=None):
+    name = photo_hash if size is None else f"{photo_hash}.{size}"
+    return os.path.join(root, photo_hash[:2], name)
+
+
+def write_photo(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(descriptor, "wb") as photo_file:
+        photo_file.write(data)
+    os.replace(temporary_path, path)
+
+
+def decode_photo(photo):
+    try:
+        return base64.b64decode(photo, validate=True)
+    except (binascii.Error, ValueError):
+        # kept as it is, the row is the only copy of it
+        return photo.encode()
+
+
+def put_photo(root, data):
+    photo_hash = hashlib.sha256(data).hexdigest()
+    if os.path.exists(get_photo_path(root, photo_hash)):
+        return photo_hash
+
+    # photos Pillow can not decode are stored as they are, without thumbnails
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+
+        thumbnails = {}
+        for size, pixels in THUMBNAIL_SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((pixels, pixels))
+            thumbnail_data = io.BytesIO()
+            thumbnail.save(thumbnail_data, format=image.format or "PNG")
+            thumbnails[size] = thumbnail_data.getvalue()
+
+    except Exception:
+        thumbnails = {}
+
+    for size, thumbnail_data in thumbnails.items():
+        write_photo(get_photo_path(root, photo_hash, size), thumbnail_data)
+
+    write_photo(get_photo_path(root, photo_hash), data)
+    return photo_hash
+
+
+def move_photos_to_store(apps, schema_editor):
+    CustomUser = apps.get_model("rest_api", "CustomUser")
+    root = get_photo_root()
+
+    for user in CustomUser.objects.exclude(photo__isnull=True).exclude(photo="").iterator():
+        user.photo_hash = put_photo(root, decode_photo(user.photo))
+        user.save(update_fields=["photo_hash"])
+
+
+def move_photos_to_rows(apps, schema_editor):
+    CustomUser = apps.get_model("rest_api", "CustomUser")
+    root = get_photo_root()
+
+    for user in CustomUser.objects.exclude(photo_hash__isnull=True).iterator():
+        with open(get_photo_path(root, user.photo_hash), "rb") as photo_file:
+            user.photo = base64.b64encode(photo_file.read()).decode()
+        user.save(update_fields=["photo"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0012_fitbit_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='photo_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(move_photos_to_store, move_photos_to_rows),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='photo',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0013_customuser_photo_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredient',
+            name='name',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='meal',
+            name='name',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    ("rest_api_ingredient_name_trgm", "rest_api_ingredient", "name"),
+    ("rest_api_meal_name_trgm", "rest_api_meal", "name"),
+    ("rest_api_meal_category_trgm", "rest_api_meal", "category"),
+]
+
+
+# only PostgreSQL has pg_trgm, other databases search through the in-process index of catalog_search
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0014_catalog_name_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
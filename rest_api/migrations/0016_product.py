@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0015_catalog_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('barcode', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('found', models.BooleanField(default=True)),
+                ('name', models.TextField(null=True)),
+                ('nutriments', models.JSONField(default=dict)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0016_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='imported',
+            field=models.BooleanField(default=False),
+        ),
+    ]
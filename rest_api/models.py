@@ -14,7 +14,8 @@ class CustomUser(models.Model):
         User, on_delete=models.CASCADE, unique=True, primary_key=True
     )
     phone_number = models.CharField(max_length=20, null=True, blank=True)
-    photo = models.TextField(null=True, blank=True)
+    # sha256 of the photo in the photo store
+    photo_hash = models.CharField(max_length=64, null=True, blank=True)
     birth_date = models.DateField()
 
 
@@ -42,7 +43,10 @@ class Client(models.Model):
     def refresh_cb(self, token):
         self.fitbit_access_token = token["access_token"]
         self.fitbit_refresh_token = token["refresh_token"]
-        self.save()
+
+        # only the tokens are written, a shared fitbit session may outlive this instance
+        Client.objects.filter(pk=self.pk).update(fitbit_access_token=self.fitbit_access_token,
+                                                 fitbit_refresh_token=self.fitbit_refresh_token)
 
 
 class Ingredient(models.Model):
@@ -50,11 +54,11 @@ class Ingredient(models.Model):
     proteins = models.FloatField(default=0)
     fat = models.FloatField(default=0)
     carbs = models.FloatField(default=0)
-    name = models.CharField(max_length=50)
+    name = models.CharField(max_length=50, db_index=True)
 
 
 class Meal(models.Model):
-    name = models.CharField(max_length=50)
+    name = models.CharField(max_length=50, db_index=True)
     category = models.CharField(max_length=30)
     # https://docs.djangoproject.com/en/3.0/topics/db/models/#extra-fields-on-many-to-many-relationships
     ingredients = models.ManyToManyField(Ingredient, through="Quantity")
@@ -86,3 +90,53 @@ class MealHistory(models.Model):
 class ExpoToken(models.Model):
     token = models.TextField()
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
+
+
+class DailyNutritionSummary(models.Model):
+    client = models.ForeignKey(Client, on_delete=models.CASCADE)
+    day = models.DateField()
+    calories = models.FloatField(default=0)
+    proteins = models.FloatField(default=0)
+    fat = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    breakfast_calories = models.FloatField(default=0)
+    lunch_calories = models.FloatField(default=0)
+    dinner_calories = models.FloatField(default=0)
+    snack_calories = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ("client", "day")
+
+
+class FitbitActivity(models.Model):
+    client = models.ForeignKey(Client, on_delete=models.CASCADE)
+    day = models.DateField()
+    steps = models.IntegerField(default=0)
+    distance = models.FloatField(default=0)
+    calories = models.IntegerField(default=0)
+    floors = models.IntegerField(default=0)
+    resting_heart_rate = models.IntegerField(null=True)
+
+    class Meta:
+        unique_together = ("client", "day")
+
+
+class FitbitSync(models.Model):
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True)
+    synced_at = models.DateTimeField(null=True)
+    retry_after = models.DateTimeField(null=True)
+    steps_goal = models.IntegerField(default=0)
+    distance_goal = models.FloatField(default=0)
+    calories_goal = models.IntegerField(default=0)
+    floors_goal = models.IntegerField(default=0)
+
+
+# Open Food Facts products by barcode, cached with the fields classify_barcode reads; unknown barcodes are kept
+# too, with found unset, so they are not asked again before their time-to-live
+class Product(models.Model):
+    barcode = models.CharField(max_length=32, primary_key=True)
+    found = models.BooleanField(default=True)
+    name = models.TextField(null=True)
+    nutriments = models.JSONField(default=dict)
+    fetched_at = models.DateTimeField()
+    imported = models.BooleanField(default=False)
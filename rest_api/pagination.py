@@ -0,0 +1,95 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+
+DEFAULT_PAGINATION = {
+    "DEFAULT_LIMIT": None,
+    "MAX_LIMIT": 1000,
+}
+
+
+def get_pagination_settings():
+    return {**DEFAULT_PAGINATION, **getattr(settings, "PAGINATION", {})}
+
+
+# cursors are opaque to clients, the JSON of the position a page ended at, like the last primary key
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor, parse):
+    """
+    The position held by cursor, as returned by parse(position). Raises ValueError for cursors that were not
+    encoded by encode_cursor or whose position parse rejects.
+    """
+    try:
+        return parse(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except (binascii.Error, KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor.")
+
+
+def parse_page_key(position):
+    return int(position["after"])
+
+
+def parse_page_params(params):
+    """
+    The limit, the primary key after which the page starts and the projected fields of a list request.
+    The limit is None when the list is not paginated. Raises ValueError for invalid values.
+    """
+    options = get_pagination_settings()
+
+    after = decode_cursor(params["cursor"], parse_page_key) if params.get("cursor") else None
+
+    limit = params.get("limit") or options["DEFAULT_LIMIT"]
+    if limit is None and after is not None:
+        limit = options["MAX_LIMIT"]
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid limit.")
+        if limit < 1:
+            raise ValueError("Invalid limit.")
+        limit = min(limit, options["MAX_LIMIT"])
+
+    fields = [field.strip() for field in params["fields"].split(",") if field.strip()] if params.get("fields") \
+        else None
+    return limit, after, fields
+
+
+def list_page(queryset, params, serialize, projection=None):
+    """
+    A page of queryset, keyed on its primary key. Items come from serialize(object), or only hold the
+    ?fields= asked for, read with .values() through projection (field -> (paths, value from the row)).
+    Paginated lists are {"results": [...], "next": cursor or None}, the others plain lists.
+    """
+    limit, after, fields = parse_page_params(params)
+
+    if fields is not None:
+        unknown = [field for field in fields if field not in (projection or {})]
+        if unknown:
+            raise ValueError("Unknown fields: " + ", ".join(unknown) + ".")
+
+    queryset = queryset.order_by("pk")
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+
+    stop = limit + 1 if limit is not None else None
+    if fields is not None:
+        paths = {path for field in fields for path in projection[field][0]}
+        rows = list(queryset.values("pk", *paths)[:stop])
+        items = [{field: projection[field][1](row) for field in fields} for row in rows]
+        keys = [row["pk"] for row in rows]
+    else:
+        rows = list(queryset[:stop])
+        items = [serialize(row) for row in rows]
+        keys = [row.pk for row in rows]
+
+    if limit is None:
+        return items
+
+    next_cursor = encode_cursor({"after": keys[limit - 1]}) if len(items) > limit else None
+    return {"results": items[:limit], "next": next_cursor}
@@ -0,0 +1,107 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from PIL import Image
+
+from rest_api.constants import IMAGE_ASSETS, get_asset
+
+DEFAULT_PHOTO_STORE = {
+    "ROOT": os.path.join(settings.BASE_DIR, "media", "photos"),
+    "THUMBNAIL_SIZES": {"small": 64, "medium": 256},
+}
+
+CONTENT_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "GIF": "image/gif", "WEBP": "image/webp"}
+
+
+def get_photo_store_settings():
+    return {**DEFAULT_PHOTO_STORE, **getattr(settings, "PHOTO_STORE", {})}
+
+
+class PhotoStore:
+    """
+    Content-addressed photo store on the filesystem. Each photo is kept once under the sha256 of its bytes,
+    next to its thumbnails, which are generated when the photo is added.
+    """
+
+    def __init__(self, root, thumbnail_sizes=None):
+        self.root = root
+        self.thumbnail_sizes = thumbnail_sizes or {}
+
+    def path(self, photo_hash, size=None):
+        name = photo_hash if size is None else f"{photo_hash}.{size}"
+        return os.path.join(self.root, photo_hash[:2], name)
+
+    def exists(self, photo_hash, size=None):
+        return os.path.exists(self.path(photo_hash, size))
+
+    def put(self, data):
+        photo_hash = hashlib.sha256(data).hexdigest()
+        if self.exists(photo_hash):
+            return photo_hash
+
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            raise ValueError("The photo is not a valid image.")
+
+        for size, pixels in self.thumbnail_sizes.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((pixels, pixels))
+            thumbnail_data = io.BytesIO()
+            thumbnail.save(thumbnail_data, format=image.format or "PNG")
+            self.write(self.path(photo_hash, size), thumbnail_data.getvalue())
+
+        # the original goes last, so a stored photo always has its thumbnails
+        self.write(self.path(photo_hash), data)
+        return photo_hash
+
+    def put_base64(self, encoded):
+        try:
+            data = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, TypeError):
+            raise ValueError("The photo is not valid base64.")
+
+        return self.put(data)
+
+    def read(self, photo_hash, size=None):
+        with open(self.path(photo_hash, size), "rb") as photo_file:
+            return photo_file.read()
+
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # written aside and renamed, readers never see half a photo
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as photo_file:
+            photo_file.write(data)
+        os.replace(temporary_path, path)
+
+
+def get_photo_store():
+    options = get_photo_store_settings()
+    return PhotoStore(options["ROOT"], options["THUMBNAIL_SIZES"])
+
+
+# store root -> hash of the default photo, which is stored once and shared by every user without a photo
+default_photo_hashes = {}
+
+
+def get_default_photo_hash():
+    store = get_photo_store()
+    if store.root not in default_photo_hashes or not store.exists(default_photo_hashes[store.root]):
+        default_photo_hashes[store.root] = store.put(get_asset(IMAGE_ASSETS["DEFAULT_USER_IMAGE"]))
+
+    return default_photo_hashes[store.root]
+
+
+def get_content_type(data):
+    try:
+        return CONTENT_TYPES.get(Image.open(io.BytesIO(data)).format, "application/octet-stream")
+    except (OSError, Image.DecompressionBombError):
+        return "application/octet-stream"
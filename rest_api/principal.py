@@ -0,0 +1,65 @@
+from rest_framework.authtoken.models import Token
+
+from rest_api.token_store import build_token_store
+
+ROLE_GROUPS = {"admins_group": "admin", "clients_group": "client", "doctors_group": "doctor"}
+
+principals = build_token_store()
+
+
+class Principal:
+    """
+    Everything a view needs to know about who is calling: the auth user, its token and its role.
+    """
+
+    def __init__(self, user, token, role):
+        self.user = user
+        self.token = token
+        self.role = role
+
+    @property
+    def key(self):
+        return self.token.key
+
+    @property
+    def username(self):
+        return self.user.username
+
+
+def get_user_role(user):
+    if user.is_superuser:
+        return "django-admin"
+
+    group_name = user.groups.values_list("name", flat=True).first()
+    return ROLE_GROUPS.get(group_name)
+
+
+def build_principal(token):
+    return Principal(token.user, token, get_user_role(token.user))
+
+
+def resolve_principal(key):
+    principal = principals.get(key)
+    if principal is None:
+        token = Token.objects.select_related("user").get(key=key)
+        principal = build_principal(token)
+        principals.set(key, principal)
+
+    return principal
+
+
+def get_principal(request):
+    if isinstance(request.auth, Principal):
+        return request.auth
+
+    return build_principal(Token.objects.select_related("user").get(user=request.user))
+
+
+def forget_token(key):
+    principals.delete(key)
+
+
+def forget_user_id(user_id):
+    # the shared tier is keyed by token only, so the keys of the user come from the database
+    keys = list(Token.objects.filter(user_id=user_id).values_list("key", flat=True)) if principals.shared else []
+    return principals.delete_user(user_id, keys)
@@ -0,0 +1,123 @@
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from requests import RequestException
+
+from rest_api.models import Product
+from rest_api.utils import API_URL, get_product
+
+DEFAULT_PRODUCT_CACHE = {
+    "API_URL": API_URL,
+    "TIMEOUT": 5,
+    "TTL": 7 * 24 * 60 * 60,
+    "NOT_FOUND_TTL": 24 * 60 * 60,
+    "REMOTE": True,
+}
+
+MAX_BARCODE_LENGTH = Product._meta.get_field("barcode").max_length
+
+# the only nutriments kept of the hundreds Open Food Facts may have for a product
+PRODUCT_NUTRIMENTS = ("energy-kcal_100g", "proteins_100g", "fat_100g", "carbohydrates_100g")
+
+# barcode -> future of the Open Food Facts answer being fetched for it
+pending_products = {}
+pending_lock = threading.Lock()
+
+
+def get_product_cache_settings():
+    return {**DEFAULT_PRODUCT_CACHE, **getattr(settings, "PRODUCT_CACHE", {})}
+
+
+def is_valid_barcode(barcode):
+    return barcode.isdigit() and len(barcode) <= MAX_BARCODE_LENGTH
+
+
+def compact_nutriments(nutriments):
+    compact = {}
+    for key in PRODUCT_NUTRIMENTS:
+        try:
+            compact[key] = float(nutriments[key])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    return compact
+
+
+def fetch_product(barcode):
+    """
+    The Open Food Facts answer for barcode, and whether this call asked for it: concurrent calls for the same
+    barcode wait for the answer of the call already asking, instead of asking again.
+    """
+    with pending_lock:
+        future = pending_products.get(barcode)
+        asking = future is None
+        if asking:
+            future = pending_products[barcode] = Future()
+
+    if not asking:
+        return future.result(), False
+
+    options = get_product_cache_settings()
+    try:
+        response = get_product(barcode, api_url=options["API_URL"], timeout=options["TIMEOUT"])
+        future.set_result(response)
+        return response, True
+
+    except Exception as e:
+        future.set_exception(e)
+        raise
+
+    finally:
+        with pending_lock:
+            pending_products.pop(barcode, None)
+
+
+def is_fresh(product):
+    # products imported from a dump are kept up to date by importing its deltas
+    if product.imported:
+        return True
+
+    options = get_product_cache_settings()
+    ttl = options["TTL"] if product.found else options["NOT_FOUND_TTL"]
+    return product.fetched_at + timedelta(seconds=ttl) > timezone.now()
+
+
+def get_cached_product(barcode):
+    """
+    The product of barcode, from the product table while it is fresh, else from Open Food Facts. Unknown barcodes
+    are cached as products not found. When Open Food Facts can not be reached, a stale product is still served,
+    and requests.RequestException or ValueError (an answer that is not JSON) raised when there is none.
+    With REMOTE off, the product table (filled by import_products) is the only source, whatever the age of a row.
+    """
+    # barcodes are digits, anything else is not asked for
+    if not is_valid_barcode(barcode):
+        return Product(barcode=barcode, found=False, fetched_at=timezone.now())
+
+    product = Product.objects.filter(barcode=barcode).first()
+    if not get_product_cache_settings()["REMOTE"]:
+        return product or Product(barcode=barcode, found=False, fetched_at=timezone.now())
+
+    if product is not None and is_fresh(product):
+        return product
+
+    try:
+        response, asked = fetch_product(barcode)
+
+    except (RequestException, ValueError):
+        if product is not None:
+            return product
+        raise
+
+    found = response.get("status") == 1
+    details = (response.get("product") or {}) if found else {}
+    product = Product(barcode=barcode, found=found, name=details.get("product_name"),
+                      nutriments=compact_nutriments(details.get("nutriments") or {}), fetched_at=timezone.now())
+
+    # the calls that waited for the answer leave saving it to the one that asked
+    if asked:
+        product.save()
+
+    return product
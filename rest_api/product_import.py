@@ -0,0 +1,92 @@
+import csv
+import gzip
+import os
+import sys
+
+from django.utils import timezone
+
+from rest_api.catalog_import import NDJSON_EXTENSIONS, import_entries, iter_ndjson
+from rest_api.models import Product
+from rest_api.product_cache import PRODUCT_NUTRIMENTS, compact_nutriments, is_valid_barcode
+
+BATCH_SIZE = 1000
+
+CSV_EXTENSIONS = (".csv", ".tsv")
+
+
+def get_product_files(paths):
+    """
+    Open Food Facts dumps and delta files (JSONL or the tab separated CSV export, optionally gzipped) among the
+    given files and directories, in name order, so later deltas are applied after earlier ones.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)))
+        else:
+            files.append(path)
+
+    return [path for path in files if path.removesuffix(".gz").endswith(NDJSON_EXTENSIONS + CSV_EXTENSIONS)]
+
+
+def iter_csv_products(csv_file):
+    # the export is tab separated, with fields (ingredients, categories, ...) longer than the default limit
+    csv.field_size_limit(sys.maxsize)
+    for row in csv.DictReader(csv_file, delimiter="\t", quoting=csv.QUOTE_NONE):
+        yield {"code": row.get("code"), "product_name": row.get("product_name"),
+               "nutriments": {key: row.get(key) for key in PRODUCT_NUTRIMENTS}}
+
+
+def iter_product_file(path):
+    name = path.removesuffix(".gz")
+    with (gzip.open if path.endswith(".gz") else open)(path, "rt", encoding="utf-8", newline="") as product_file:
+        if name.endswith(CSV_EXTENSIONS):
+            yield from iter_csv_products(product_file)
+        else:
+            yield from iter_ndjson(product_file)
+
+
+def upsert_products(batch):
+    """
+    Products are matched by barcode: the existing ones get the new name and nutriments, the others are created.
+    Entries without a valid barcode are skipped, and the last entry of a barcode wins. Imported products never
+    expire, so scans of them do not go to Open Food Facts.
+    """
+    fetched_at = timezone.now()
+
+    products = {}
+    for entry in batch:
+        barcode = str(entry.get("code") or "").strip()
+        if is_valid_barcode(barcode):
+            products[barcode] = Product(barcode=barcode, found=True, name=entry.get("product_name") or None,
+                                        nutriments=compact_nutriments(entry.get("nutriments") or {}),
+                                        fetched_at=fetched_at, imported=True)
+
+    existing = Product.objects.filter(barcode__in=products).in_bulk()
+    changed = [product for barcode, product in products.items() if barcode in existing and
+               (existing[barcode].found, existing[barcode].name, existing[barcode].nutriments,
+                existing[barcode].imported) != (product.found, product.name, product.nutriments, product.imported)]
+
+    Product.objects.bulk_update(changed, ["found", "name", "nutriments", "fetched_at", "imported"])
+
+    # a barcode scanned meanwhile keeps what Open Food Facts answered until the next import
+    Product.objects.bulk_create([product for barcode, product in products.items() if barcode not in existing],
+                                ignore_conflicts=True)
+
+    return {"created": len(products) - len(existing), "updated": len(changed),
+            "unchanged": len(existing) - len(changed), "skipped": len(batch) - len(products)}
+
+
+def import_products(paths, batch_size=BATCH_SIZE, progress=None):
+    """
+    Streams the Open Food Facts files found in paths into the product table, batch_size products per transaction,
+    calling progress(path, report) after each batch. Memory is bounded by a batch, whatever the size of a dump.
+    """
+    reports = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    for path in get_product_files(paths):
+        on_batch = (lambda report, path=path: progress(path, report)) if progress else None
+        report = import_entries(upsert_products, iter_product_file(path), batch_size, on_batch)
+        for key, count in report.items():
+            reports[key] += count
+
+    return reports
@@ -1,15 +1,31 @@
-import fitbit
+import logging
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import Group
-from django.db import Error
+from django.db import Error, transaction
 from django.db.models import Q
-from requests import get
+from fitbit.exceptions import HTTPTooManyRequests, HTTPUnauthorized, Timeout
+from requests import RequestException, get
 
 from my_life_rest_api.settings import ML_URL
-from .constants import *
+from .catalog_search import forget_catalog_index, parse_search_params, search_catalog
+from .fitbit_cache import fitbit_series
+from .fitbit_gateway import get_fitbit_gateway
+from .fitbit_sync import ensure_synced, forget_fitbit_activity
+from .food_log_cache import food_log_days, get_food_log_key
+from .goal_cache import forget_daily_goals
+from .meal_recompute import recompute_ingredient_meals
 from .models import *
+from .photo_store import get_default_photo_hash, get_photo_store
+from .pagination import list_page
+from .principal import forget_user_id
+from .product_cache import get_cached_product
+from .seeding import load_fixtures, seed_database
 from .serializers import *
 from .utils import *
 
+logger = logging.getLogger(__name__)
+
 
 def add_user(data, is_admin=False):
     email = data.get("email")
@@ -22,12 +38,18 @@ def add_user(data, is_admin=False):
 
         # treat nullable fields
         phone_number = data.get("phone_number") if "phone_number" in data else None
-        photo = data.get("photo") if "photo" in data else DEFAULT_USER_IMAGE
+        photo = data.get("photo") if "photo" in data else None
 
     if User.objects.filter(username=email).exists():
         error_message = "Email already taken. User was not added to the db."
         return False, error_message
 
+    if not is_admin:
+        try:
+            photo_hash = get_photo_store().put_base64(photo) if photo else get_default_photo_hash()
+        except ValueError as e:
+            return False, str(e)
+
     try:
         if is_admin:
             # create a user
@@ -40,7 +62,7 @@ def add_user(data, is_admin=False):
                                                  last_name=last_name, password=password)
 
             # create custom user
-            user = CustomUser.objects.create(auth_user=auth_user, phone_number=phone_number, photo=photo,
+            user = CustomUser.objects.create(auth_user=auth_user, phone_number=phone_number, photo_hash=photo_hash,
                                              birth_date=birth_date)
 
     except Error:
@@ -51,35 +73,22 @@ def add_user(data, is_admin=False):
 
 
 def update_user(data, auth_user, user=None):
+    values = {}
     if "email" in data:
-        email = data.get("email")
-        auth_user.update(email=email)
-        auth_user.update(username=email)
-
-    if "first_name" in data:
-        first_name = data.get("first_name")
-        auth_user.update(first_name=first_name)
-
-    if "last_name" in data:
-        last_name = data.get("last_name")
-        auth_user.update(last_name=last_name)
+        values["username"] = get_field_values(User, data, ["email"])["email"]
 
     if "password" in data:
-        pwd_user = User.objects.get(username=auth_user[0].username)
-        pwd_user.set_password(data.get("password"))
-        pwd_user.save()
+        values["password"] = make_password(data.get("password"))
 
-    if "phone_number" in data and user is not None:
-        phone_number = data.get("phone_number")
-        user.update(phone_number=phone_number)
+    update_fields(auth_user, data, ["email", "first_name", "last_name"], **values)
 
-    if "photo" in data and user is not None:
-        photo = data.get("photo")
-        user.update(photo=photo)
+    if user is not None:
+        values = {}
+        if "photo" in data:
+            photo = data.get("photo")
+            values["photo_hash"] = get_photo_store().put_base64(photo) if photo else get_default_photo_hash()
 
-    if "birth_date" in data and user is not None:
-        birth_date = data.get("birth_date")
-        user.update(birth_date=birth_date)
+        update_fields(user, data, ["phone_number", "birth_date"], **values)
 
 
 def delete_user(user):
@@ -134,24 +143,27 @@ def update_admin(request, username):
         state, message = False, "User does not exist or user is not a admin!"
         return state, message
 
-    try:
-        auth_user = User.objects.filter(username=username)
+    # read before the update, which may change the username
+    admin_id = admin[0].pk
 
-        update_user(data, auth_user)
+    try:
+        with transaction.atomic():
+            update_user(data, User.objects.filter(pk=admin_id))
 
     except Exception:
         state, message = False, "Error while updating admin!"
 
+    forget_user_id(admin_id)
     return state, message
 
 
 def get_admin(username):
-    admin = HospitalAdmin.objects.filter(auth_user__username=username)
-    if not admin.exists():
+    admin = HospitalAdmin.objects.select_related("auth_user").filter(auth_user__username=username).first()
+    if admin is None:
         state, message = False, "User does not exist or user is not a admin!"
         return state, message
 
-    state, message = True, AdminSerializer(admin[0]).data
+    state, message = True, AdminSerializer(admin).data
     return state, message
 
 
@@ -207,46 +219,27 @@ def update_client(request, email):
         state, message = False, "User does not exist or user is not a client!"
         return state, message
 
-    try:
-        auth_user = User.objects.filter(username=email)
-        user = CustomUser.objects.filter(auth_user=auth_user[0])
-
-        update_user(data, auth_user, user)
+    # read before the update, which may change the username
+    client_id = client[0].pk
 
-        if "height" in data:
-            height = data.get("height")
-            client.update(height=height)
-
-        if "current_weight" in data:
-            current_weight = data.get("current_weight")
-            client.update(current_weight=current_weight)
-
-        if "weight_goal" in data:
-            weight_goal = data.get("weight_goal")
-            client.update(weight_goal=weight_goal)
-
-        if "sex" in data:
-            sex = data.get("sex")
-            client.update(sex=sex)
-
-        if "is_diabetic" in data:
-            is_diabetic = data.get("is_diabetic")
-            client.update(is_diabetic=is_diabetic)
-
-        if "has_high_colesterol" in data:
-            has_high_colesterol = data.get("has_high_colesterol")
-            client.update(has_high_colesterol=has_high_colesterol)
+    try:
+        with transaction.atomic():
+            update_user(data, User.objects.filter(pk=client_id), CustomUser.objects.filter(pk=client_id))
+            update_fields(Client.objects.filter(pk=client_id), data,
+                          ["height", "current_weight", "weight_goal", "sex", "is_diabetic", "has_high_colesterol"])
 
     except Exception as e:
         print(e)
         state, message = False, "Error while updating client!"
 
+    forget_user_id(client_id)
+    forget_daily_goals(client_id)
     return state, message
 
 
 def get_client(email):
     try:
-        client = Client.objects.get(user__auth_user__username=email)
+        client = Client.objects.select_related("user__auth_user").get(user__auth_user__username=email)
 
     except Client.DoesNotExist:
         state = False
@@ -263,27 +256,36 @@ def get_client(email):
         fitbit_refresh_token = client.fitbit_refresh_token
 
         if fitbit_access_token is not None and fitbit_refresh_token is not None:
-            fitbit_api = fitbit.Fitbit(CLIENT_FITBIT_ID, CLIENT_FITBIT_SECRET, system="en_UK", oauth2=True,
-                                       access_token=fitbit_access_token, refresh_token=fitbit_refresh_token,
-                                       refresh_cb=client.refresh_cb)
+            gateway = get_fitbit_gateway(client)
+            fitbit_data = gateway.gather(steps=gateway.series("activities/steps", "1d"),
+                                         distance=gateway.series("activities/distance", "1d"),
+                                         heart=gateway.series("activities/heart", "1m"))
 
-            message["steps"] = fitbit_api.time_series("activities/steps", period="1d")["activities-steps"][0]["value"]
-            message["distance"] = fitbit_api.time_series("activities/distance", period="1d")["activities-distance"][0][
-                "value"]
+            message["steps"] = fitbit_data["steps"]["activities-steps"][0]["value"]
+            message["distance"] = fitbit_data["distance"]["activities-distance"][0]["value"]
 
-            data = fitbit_api.time_series("activities/heart", period="1m")["activities-heart"]
+            data = fitbit_data["heart"]["activities-heart"]
             heart_rates = sorted(filter(lambda e: "restingHeartRate" in e["value"], data), key=lambda e: e["dateTime"],
                                  reverse=True)
             message["heart_rate"] = heart_rates[0]["value"]["restingHeartRate"]
         state = True
 
-    except Exception:
+    except (Timeout, HTTPTooManyRequests):
+        # a slow or rate limited fitbit leaves the activity fields empty but still returns the profile
+        state = True
+
+    except HTTPUnauthorized:
         client.fitbit_access_token = None
         client.fitbit_refresh_token = None
         client.save()
         state = False
         message = "Error while trying to fetch client information"
 
+    except Exception:
+        logger.exception("Error while fetching fitbit information of client %s", client.pk)
+        state = False
+        message = "Error while trying to fetch client information"
+
     return state, message
 
 
@@ -291,7 +293,7 @@ def get_client_photo(email):
     try:
         client = Client.objects.get(user__auth_user__username=email)
         state = True
-        message = {"photo": client.user.photo}
+        message = client.user.photo_hash
 
     except Client.DoesNotExist:
         state = False
@@ -343,25 +345,27 @@ def update_doctor(request, email):
         state, message = False, "User does not exist or user is not a doctor!"
         return state, message
 
-    try:
-        auth_user = User.objects.filter(username=email)
-        user = CustomUser.objects.filter(auth_user=auth_user[0])
+    # read before the update, which may change the username
+    doctor_id = doctor[0].pk
 
-        update_user(data, auth_user, user)
+    try:
+        with transaction.atomic():
+            update_user(data, User.objects.filter(pk=doctor_id), CustomUser.objects.filter(pk=doctor_id))
 
     except Exception:
         state, message = False, "Error while updating client!"
 
+    forget_user_id(doctor_id)
     return state, message
 
 
 def get_doctor(email):
-    doctor = Doctor.objects.filter(user__auth_user__username=email)
-    if not doctor.exists():
+    doctor = Doctor.objects.select_related("user__auth_user").filter(user__auth_user__username=email).first()
+    if doctor is None:
         state, message = False, "User does not exist or user is not a doctor!"
         return state, message
 
-    state, message = True, DoctorSerializer(doctor[0]).data
+    state, message = True, DoctorSerializer(doctor).data
     return state, message
 
 
@@ -397,9 +401,11 @@ def add_food_log(data, email):
         carbs = number_of_servings * current_meal.carbs
         fat = number_of_servings * current_meal.fat
 
-        inserted_item = MealHistory.objects.create(day=day, type_of_meal=type_of_meal, client=current_client,
-                                                   meal=current_meal, number_of_servings=number_of_servings,
-                                                   calories=calories, proteins=proteins, carbs=carbs, fat=fat)
+        with transaction.atomic():
+            inserted_item = MealHistory.objects.create(day=day, type_of_meal=type_of_meal, client=current_client,
+                                                       meal=current_meal, number_of_servings=number_of_servings,
+                                                       calories=calories, proteins=proteins, carbs=carbs, fat=fat)
+            refresh_daily_summary(current_client.pk, day)
 
         alerts = process_meal_history_insert(current_client, inserted_item)
 
@@ -413,7 +419,9 @@ def add_food_log(data, email):
 
 def delete_food_log(meal_history):
     try:
-        meal_history.delete()
+        with transaction.atomic():
+            meal_history.delete()
+            refresh_daily_summary(meal_history.client_id, meal_history.day)
         state, message = True, "Food log successfully deleted"
 
     except Error:
@@ -423,11 +431,19 @@ def delete_food_log(meal_history):
 
 
 def get_food_log(email, day):
-    current_client = Client.objects.get(user__auth_user__username=email)
+    current_client = Client.objects.select_related("user").get(user__auth_user__username=email)
 
-    meal_history = MealHistory.objects.filter(day=day, client=current_client)
+    key = get_food_log_key(current_client.pk, day)
+    food_log = food_log_days.get(key)
+    if food_log is None:
+        food_log = group_meals(MealHistory.objects.filter(day=day, client=current_client).select_related("meal")
+                               .order_by("id"))
+        food_log_days.set(key, food_log)
 
-    data = group_meals(meal_history, current_client)
+    # the goal follows the client's profile, so it is not part of the cached day
+    calories_goal = get_calories_daily_goal(current_client)
+    data = {"total_calories": food_log["total_calories"], "calories_goal": calories_goal,
+            "calories_left": food_log["total_calories"] - calories_goal, **food_log}
 
     state, message = True, data
 
@@ -439,34 +455,32 @@ def update_food_log(request, meal_history):
     state = True
     message = "Food log successfully updated!"
 
-    try:
-        if "day" in data:
-            day = data.get("day")
-            meal_history.update(day=day)
+    # the rollup of the days the food log moves from and to must be refreshed
+    affected_days = set(meal_history.values_list("client_id", "day"))
 
-        if "type_of_meal" in data:
-            type_of_meal = data.get("type_of_meal")
-            meal_history.update(type_of_meal=type_of_meal)
+    try:
+        values = get_field_values(MealHistory, data, ["number_of_servings"])
 
         if "meal" in data:
             meal_id = data.get("meal")
 
-            meal = Meal.objects.filter(id=meal_id)
+            current_meal = Meal.objects.filter(id=meal_id).first()
 
-            if not meal.exists():
+            if current_meal is None:
                 state, message = False, "Meal does not exist."
                 return state, message
 
-            current_meal = Meal.objects.get(id=meal_id)
+            values["meal"] = current_meal
 
-            populate_nutrient_values_meal_history(meal_history, meal=current_meal)
+        if values:
+            values.update(get_food_log_nutrients(values.get("meal"), values.get("number_of_servings")))
 
-            meal_history.update(meal=current_meal)
+        with transaction.atomic():
+            update_fields(meal_history, data, ["day", "type_of_meal"], **values)
 
-        if "number_of_servings" in data:
-            number_of_servings = float(data.get("number_of_servings"))
-            meal_history.update(number_of_servings=number_of_servings)
-            populate_nutrient_values_meal_history(meal_history, number_of_servings=number_of_servings)
+            affected_days.update(meal_history.values_list("client_id", "day"))
+            for client_id, day in affected_days:
+                refresh_daily_summary(client_id, day)
 
     except Exception:
         state, message = False, "Error while updating Food log!"
@@ -502,25 +516,15 @@ def update_ingredient(data, ingredient_id):
         return state, message
 
     try:
-        if "calories" in data:
-            calories = data.get("calories")
-            ingredient.update(calories=calories)
+        with transaction.atomic():
+            values = update_fields(ingredient, data, NUTRIENTS + ["name"])
 
-        if "proteins" in data:
-            proteins = data.get("proteins")
-            ingredient.update(proteins=proteins)
+            if "name" in values:
+                forget_catalog_index(Ingredient)
 
-        if "fat" in data:
-            fat = data.get("fat")
-            ingredient.update(fat=fat)
-
-        if "carbs" in data:
-            carbs = data.get("carbs")
-            ingredient.update(carbs=carbs)
-
-        if "name" in data:
-            name = data.get("name")
-            ingredient.update(name=name)
+            # the meals made with it keep their nutrient values until recomputed
+            if any(nutrient in values for nutrient in NUTRIENTS):
+                recompute_ingredient_meals(ingredient_id)
 
     except Exception:
         state, message = False, "Error while updating ingredient!"
@@ -542,8 +546,22 @@ def delete_ingredient(ingredient_id):
     return state, message
 
 
-def get_ingredients():
-    return True, [IngredientSerializer(ingredient).data for ingredient in Ingredient.objects.all()]
+def get_ingredients(params):
+    try:
+        return True, list_page(Ingredient.objects.all(), params, serialize_ingredient, INGREDIENT_PROJECTION)
+    except ValueError as e:
+        return False, str(e)
+
+
+def search_ingredients(params):
+    try:
+        query, limit, offset, cursor = parse_search_params(params)
+    except ValueError as e:
+        return False, str(e)
+
+    ingredients, next_cursor = search_catalog(Ingredient.objects.all(), query, limit, offset, cursor)
+    return True, {"results": [serialize_ingredient(ingredient) for ingredient in ingredients],
+                  "next": next_cursor}
 
 
 def get_ingredient(ingredient_id):
@@ -570,30 +588,17 @@ def add_new_meal(data, username, role="admin"):
         return False, error_message
 
     try:
-        # create new meal
-        meal = Meal.objects.create(name=name, category=category, client=client)
-
-    except Exception:
-        error_message = "Error while creating new meal!"
-        return False, error_message
-
-    try:
-        # add ingredients quantities and nutrient values
-        for ingredient_json in ingredients:
-            if 'id' in ingredient_json:
-                ingredient = Ingredient.objects.get(id=ingredient_json["id"])
-            elif 'name' in ingredient_json:
-                ingredient = Ingredient.objects.get(name=ingredient_json["name"])
-            quantity = ingredient_json["quantity"]
-            Quantity.objects.create(meal=meal, ingredient=ingredient, quantity=quantity)
-            populate_nutrient_values(Meal.objects.filter(id=meal.id), Ingredient.objects.get(id=ingredient.id),
-                                     quantity)
+        # one query resolves every ingredient, the meal and its quantities are then written at once
+        create_meal(name, category, client, ingredients)
 
     except Ingredient.DoesNotExist:
-        meal.delete()
         error_message = "Ingredient does not exist!"
         return False, error_message
 
+    except Exception:
+        error_message = "Error while creating new meal!"
+        return False, error_message
+
     state_message = "Meal created successfully!"
     return True, state_message
 
@@ -617,9 +622,26 @@ def add_new_ingredient(data):
     state_message = "Ingredient created successfully!"
     return True, state_message
 
-def get_meals(username):
+def get_meals(username, params):
+    client = Client.objects.get(user__auth_user__username=username)
+
+    try:
+        return True, list_page(Meal.objects.filter(Q(client__isnull=True) | Q(client=client)), params,
+                               serialize_meal, MEAL_PROJECTION)
+    except ValueError as e:
+        return False, str(e)
+
+
+def search_meals(params, username):
+    try:
+        query, limit, offset, cursor = parse_search_params(params)
+    except ValueError as e:
+        return False, str(e)
+
     client = Client.objects.get(user__auth_user__username=username)
-    return True, [MealSerializer(meal).data for meal in Meal.objects.filter(Q(client__isnull=True) | Q(client=client))]
+    meals, next_cursor = search_catalog(Meal.objects.filter(Q(client__isnull=True) | Q(client=client)), query, limit,
+                                        offset, cursor, other_field="category", owner=client.pk)
+    return True, {"results": [serialize_meal(meal) for meal in meals], "next": next_cursor}
 
 
 def add_doctor_patient_association(data, email):
@@ -637,6 +659,7 @@ def add_doctor_patient_association(data, email):
 
     if current_client.doctor is None:
         client.update(doctor=current_doctor)
+        forget_user_id(current_client.pk)
     else:
         error_message = "The patient already has a doctor associated."
         return False, error_message
@@ -649,6 +672,8 @@ def delete_doctor_patient_association(email):
     try:
         client = Client.objects.filter(user__auth_user__username=email)
         client.update(doctor=None)
+        for client_id in client.values_list("pk", flat=True):
+            forget_user_id(client_id)
         state, message = True, "Doctor patient association successfully deleted"
 
     except Exception:
@@ -657,17 +682,22 @@ def delete_doctor_patient_association(email):
     return state, message
 
 
-def doctor_get_all_patients(username):
+def doctor_get_all_patients(username, params):
     try:
         doctor = Doctor.objects.get(user__auth_user__username=username)
 
         state = True
-        message = [ClientSerializer(client).data for client in Client.objects.filter(doctor=doctor)]
+        message = list_page(Client.objects.select_related("user__auth_user").filter(doctor=doctor), params,
+                            lambda client: ClientSerializer(client).data, CLIENT_PROJECTION)
 
     except Doctor.DoesNotExist:
         state = False
         message = "Operation not allowed: you are not a doctor!"
 
+    except ValueError as e:
+        state = False
+        message = str(e)
+
     except Exception:
         state = False
         message = "Error while fetching doctor clients' data!"
@@ -675,12 +705,45 @@ def doctor_get_all_patients(username):
     return state, message
 
 
-def get_hospital_doctors(email):
+def doctor_get_patients_my_life_stats(username, params):
+    try:
+        doctor = Doctor.objects.get(user__auth_user__username=username)
+
+        # the page is made of the clients themselves, whose stats are then computed together
+        page = list_page(Client.objects.select_related("user__auth_user").filter(doctor=doctor), params,
+                         lambda client: client)
+        clients = page if isinstance(page, list) else page["results"]
+        stats = [{"email": client.user.auth_user.email, **client_stats}
+                 for client, client_stats in zip(clients, get_patients_my_life_stats(clients))]
+
+        state = True
+        message = stats if isinstance(page, list) else {"results": stats, "next": page["next"]}
+
+    except Doctor.DoesNotExist:
+        state = False
+        message = "Operation not allowed: you are not a doctor!"
+
+    except ValueError as e:
+        state = False
+        message = str(e)
+
+    except Exception:
+        state = False
+        message = "Error while computing the clients' My Life stats!"
+
+    return state, message
+
+
+def get_hospital_doctors(email, params):
     admin_hospital = HospitalAdmin.objects.get(auth_user__username=email).hospital
 
-    doctors = Doctor.objects.filter(hospital=admin_hospital)
+    doctors = Doctor.objects.select_related("user__auth_user").filter(hospital=admin_hospital)
 
-    state, message = True, [DoctorSerializer(r).data for r in doctors]
+    try:
+        state, message = True, list_page(doctors, params, lambda doctor: DoctorSerializer(doctor).data,
+                                         DOCTOR_PROJECTION)
+    except ValueError as e:
+        state, message = False, str(e)
 
     return state, message
 
@@ -693,6 +756,11 @@ def add_fitbit_token(data, email):
 
     try:
         client.update(fitbit_access_token=fitbit_access_token, fitbit_refresh_token=fitbit_refresh_token)
+        for client_id in client.values_list("pk", flat=True):
+            forget_user_id(client_id)
+            # a new device may report other values for the same days
+            fitbit_series.purge(client_id)
+            forget_fitbit_activity(client_id)
         state, message = True, "The fitbit token was added with success"
 
     except Exception:
@@ -736,13 +804,18 @@ def classify_barcode(username, barcode):
         message = "Missing parameter: 'barcode'"
 
     else:
-        response = get_product(barcode)
+        try:
+            product = get_cached_product(barcode)
+
+        except (RequestException, ValueError):
+            state, message = False, "Open Food Facts is not answering, please try again later."
+            return state, message
 
         state = False
         message = "Product not found."
 
-        if response.get("status") == 1:
-            product_name = response.get("product").get("product_name")
+        if product.found:
+            product_name = product.name
 
             message = "Error while trying to classify product"
 
@@ -762,7 +835,7 @@ def classify_barcode(username, barcode):
 
 
 def get_client_doctor(username):
-    client = Client.objects.get(user__auth_user__username=username)
+    client = Client.objects.select_related("doctor__user__auth_user").get(user__auth_user__username=username)
 
     try:
         doctor = client.doctor
@@ -777,15 +850,13 @@ def get_client_doctor(username):
 def get_nutrients_ratio(username, day):
     client = Client.objects.get(user__auth_user__username=username)
 
-    meal_history = MealHistory.objects.filter(day=day, client=client)
+    initial_info = get_total_nutrients(client, day)
 
-    if not meal_history.exists():
+    if initial_info is None:
         state = False
         message = "The specified day has no history yet."
 
     else:
-        initial_info = get_total_nutrients(meal_history)
-
         message = get_nutrients_info(client, initial_info)
         state = True
 
@@ -795,15 +866,13 @@ def get_nutrients_ratio(username, day):
 def get_nutrients_total(username, day):
     client = Client.objects.get(user__auth_user__username=username)
 
-    meal_history = MealHistory.objects.filter(day=day, client=client)
+    initial_info = get_total_nutrients(client, day)
 
-    if not meal_history.exists():
+    if initial_info is None:
         state = False
         message = "The specified day has no history yet."
 
     else:
-        initial_info = get_total_nutrients(meal_history)
-
         message = get_nutrients_left_values(client, initial_info)
         state = True
 
@@ -812,7 +881,10 @@ def get_nutrients_total(username, day):
 
 def get_nutrients_history(username, params):
     metric = params["metric"]
-    if metric not in ["calories", "fat", "carbs", "proteins"]:
+
+    # "all" or a comma separated list of metrics answers with the history of each one
+    metrics = NUTRIENTS if metric == "all" else metric.split(",")
+    if not all(entry in ["calories", "fat", "carbs", "proteins"] for entry in metrics):
         state = False
         message = "Invalid metric!"
         return state, message
@@ -825,7 +897,10 @@ def get_nutrients_history(username, params):
 
     client = Client.objects.get(user__auth_user__username=username)
 
-    return True, get_nutrient_history(client, metric, period)
+    if metric in NUTRIENTS:
+        return True, get_nutrient_history(client, metric, period)
+
+    return True, get_nutrients_history_values(client, metrics, period)
 
 
 def get_body_history(username, params):
@@ -852,19 +927,27 @@ def get_body_history(username, params):
         return state, message
 
     try:
-        fitbit_api = fitbit.Fitbit(CLIENT_FITBIT_ID, CLIENT_FITBIT_SECRET, system="en_UK", oauth2=True,
-                                   access_token=fitbit_access_token, refresh_token=fitbit_refresh_token,
-                                   refresh_cb=client.refresh_cb)
-
-        message = get_body_history_values(fitbit_api, metric, period)
+        ensure_synced(client)
+        message = get_body_history_values(client, metric, period)
         state = True
 
-    except Exception:
+    except Timeout:
+        state, message = False, "Fitbit is taking too long to answer, please try again later."
+
+    except HTTPTooManyRequests:
+        state, message = False, "Fitbit is busy, please try again later."
+
+    except HTTPUnauthorized:
+        # only a revoked device has to be integrated again
         client.fitbit_access_token = None
         client.fitbit_refresh_token = None
         client.save()
         state, message = False, "Error while accessing fitbit information."
 
+    except Exception:
+        logger.exception("Error while accessing fitbit information of client %s", client.pk)
+        state, message = False, "Error while accessing fitbit information."
+
     return state, message
 
 
@@ -880,19 +963,27 @@ def get_body_avg_heart_rate(username):
         return state, message
 
     try:
-        fitbit_api = fitbit.Fitbit(CLIENT_FITBIT_ID, CLIENT_FITBIT_SECRET, system="en_UK", oauth2=True,
-                                   access_token=fitbit_access_token, refresh_token=fitbit_refresh_token,
-                                   refresh_cb=client.refresh_cb)
-
-        message = get_client_heart_rate_chart(client, fitbit_api)
+        ensure_synced(client)
+        message = get_client_heart_rate_chart(client)
         state = True
 
-    except Exception:
+    except Timeout:
+        state, message = False, "Fitbit is taking too long to answer, please try again later."
+
+    except HTTPTooManyRequests:
+        state, message = False, "Fitbit is busy, please try again later."
+
+    except HTTPUnauthorized:
+        # only a revoked device has to be integrated again
         client.fitbit_access_token = None
         client.fitbit_refresh_token = None
         client.save()
         state, message = False, "Error while accessing fitbit information."
 
+    except Exception:
+        logger.exception("Error while accessing fitbit information of client %s", client.pk)
+        state, message = False, "Error while accessing fitbit information."
+
     return state, message
 
 
@@ -908,19 +999,27 @@ def get_my_life_stat(username):
 
     else:
         try:
-            fitbit_api = fitbit.Fitbit(CLIENT_FITBIT_ID, CLIENT_FITBIT_SECRET, system="en_UK", oauth2=True,
-                                       access_token=fitbit_access_token, refresh_token=fitbit_refresh_token,
-                                       refresh_cb=client.refresh_cb)
-
-            message = get_my_life_stats(client, fitbit_api)
+            ensure_synced(client)
+            message = get_my_life_stats(client, with_fitbit=True)
             state = True
 
-        except Exception:
+        except Timeout:
+            state, message = False, "Fitbit is taking too long to answer, please try again later."
+
+        except HTTPTooManyRequests:
+            state, message = False, "Fitbit is busy, please try again later."
+
+        except HTTPUnauthorized:
+            # only a revoked device has to be integrated again
             client.fitbit_access_token = None
             client.fitbit_refresh_token = None
             client.save()
             state, message = False, "Error while accessing fitbit information."
 
+        except Exception:
+            logger.exception("Error while accessing fitbit information of client %s", client.pk)
+            state, message = False, "Error while accessing fitbit information."
+
     return state, message
 
 
@@ -933,10 +1032,14 @@ def new_expo_token(data, username):
     return True, "Expo Token registered successfully"
 
 
-def get_client_expo_tokens(username):
+def get_client_expo_tokens(username, params):
     client = Client.objects.get(user__auth_user__username=username)
 
-    return True, [token.token for token in ExpoToken.objects.filter(client=client)]
+    try:
+        return True, list_page(ExpoToken.objects.filter(client=client).only("id", "token"), params,
+                               lambda token: token.token)
+    except ValueError as e:
+        return False, str(e)
 
 
 def delete_client_expo_tokens(data, username):
@@ -955,458 +1058,9 @@ def delete_client_expo_tokens(data, username):
 
 def reload_database():
     try:
-        #######################################
-        #            WIPE DATABASE            #
-        #######################################
-        User.objects.all().delete()
-        Ingredient.objects.all().delete()
-        Meal.objects.all().delete()
-
-        #######################################
-        #          CREATE DJANGO ADMIN      #
-        #######################################
-        User.objects.create_superuser("admin", "admin@ua.pt", "admin")
-
-        #######################################
-        #          CREATE USERS - ADMINS      #
-        #######################################
-        success, state = add_admin({
-            "hospital": "Hospital São João",
-            "email": "antonio.martins@saojoao.pt",
-            "first_name": "António",
-            "last_name": "Martins",
-            "password": "letmein",
-            "birth_date": "1970-10-01",
-            "phone_number": "910845367"
-        })
-        cur_success = success
-        success, state = add_admin({
-            "hospital": "Hospital Santo António",
-            "email": "rui.almeida@santoantonio.pt",
-            "first_name": "Rui",
-            "last_name": "Almeida",
-            "password": "qwerty",
-            "birth_date": "1971-03-04",
-            "phone_number": "910547367"
-        })
-        cur_success = cur_success and success
-        success, state = add_admin({
-            "hospital": "Hospital da Luz",
-            "email": "pedro.silva@luz.pt",
-            "first_name": "Pedro",
-            "last_name": "Silva",
-            "password": "ola",
-            "birth_date": "1980-12-03",
-            "phone_number": "910443377"
-        })
-        cur_success = cur_success and success
-
-        #######################################
-        #          CREATE USERS - CLIENTS     #
-        #######################################
-        success, state = add_client({
-            "height": 180,
-            "weight_goal": 75,
-            "current_weight": 90,
-            "sex": "M",
-            "email": "vasco.almeida@gmail.com",
-            "first_name": "Vasco",
-            "last_name": "Almeida",
-            "password": "olaola",
-            "birth_date": "1975-11-05",
-            "phone_number": "936545567"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 170,
-            "weight_goal": 70,
-            "current_weight": 85,
-            "sex": "F",
-            "email": "ana.almeida@gmail.com",
-            "first_name": "Ana",
-            "last_name": "Almeida",
-            "password": "olaolaola",
-            "birth_date": "1977-09-03",
-            "phone_number": "936735367"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 190,
-            "weight_goal": 80,
-            "current_weight": 100,
-            "sex": "M",
-            "email": "miguel.silva@gmail.com",
-            "first_name": "Miguel",
-            "last_name": "Silva",
-            "password": "12345ola",
-            "birth_date": "1990-10-04",
-            "phone_number": "966735367"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 184,
-            "weight_goal": 80,
-            "current_weight": 90,
-            "sex": "M",
-            "email": "miguel.oliveira@gmail.com",
-            "first_name": "Miguel",
-            "last_name": "Oliveira",
-            "password": "qwerty98765",
-            "birth_date": "1990-12-07",
-            "phone_number": "966434367"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 165,
-            "weight_goal": 70,
-            "current_weight": 90,
-            "sex": "M",
-            "email": "antonio.silva@gmail.com",
-            "first_name": "António",
-            "last_name": "Silva",
-            "password": "12345olaola",
-            "birth_date": "1991-10-04",
-            "phone_number": "965735367"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 168,
-            "weight_goal": 80,
-            "current_weight": 90,
-            "sex": "M",
-            "email": "miguel.pedroseiro@gmail.com",
-            "first_name": "Miguel",
-            "last_name": "Pedroseiro",
-            "password": "pedrosorules",
-            "birth_date": "1980-10-04",
-            "phone_number": "936735367"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 170,
-            "weight_goal": 60,
-            "current_weight": 75,
-            "sex": "F",
-            "email": "fatima.silva@gmail.com",
-            "first_name": "Fátima",
-            "last_name": "Silva",
-            "password": "qwertyola",
-            "birth_date": "1990-05-04",
-            "phone_number": "964755367"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 180,
-            "weight_goal": 70,
-            "current_weight": 75,
-            "sex": "F",
-            "email": "laura.silva@gmail.com",
-            "first_name": "Laura",
-            "last_name": "Silva",
-            "password": "12345ola",
-            "birth_date": "1998-10-04",
-            "phone_number": "916735367"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 195,
-            "weight_goal": 90,
-            "current_weight": 110,
-            "sex": "M",
-            "email": "pedro.pereira@gmail.com",
-            "first_name": "Pedro",
-            "last_name": "Pereira",
-            "password": "pedropedro",
-            "birth_date": "1980-11-04",
-            "phone_number": "966725567"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 160,
-            "weight_goal": 70,
-            "current_weight": 100,
-            "sex": "M",
-            "email": "miguel.pereira@gmail.com",
-            "first_name": "Miguel",
-            "last_name": "Pereira",
-            "password": "12345ola",
-            "birth_date": "1990-10-10",
-            "phone_number": "916735360"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 180,
-            "weight_goal": 70,
-            "current_weight": 100,
-            "sex": "F",
-            "email": "manuela.silva@gmail.com",
-            "first_name": "Manuela",
-            "last_name": "Silva",
-            "password": "12345ola",
-            "birth_date": "1990-10-10",
-            "phone_number": "912684259"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 172,
-            "weight_goal": 80,
-            "current_weight": 98,
-            "sex": "M",
-            "email": "antonio.almeida@gmail.com",
-            "first_name": "António",
-            "last_name": "Almeida",
-            "password": "12345ola",
-            "birth_date": "1990-10-11",
-            "phone_number": "968124520"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 174,
-            "weight_goal": 75,
-            "current_weight": 99,
-            "sex": "M",
-            "email": "paulo.silva@gmail.com",
-            "first_name": "Paulo",
-            "last_name": "Silva",
-            "password": "12345ola",
-            "birth_date": "1990-10-20",
-            "phone_number": "930407895"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 170,
-            "weight_goal": 80,
-            "current_weight": 110,
-            "sex": "M",
-            "email": "andre.silva@gmail.com",
-            "first_name": "André",
-            "last_name": "Silva",
-            "password": "12345ola",
-            "birth_date": "1990-06-04",
-            "phone_number": "910348305"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 165,
-            "weight_goal": 70,
-            "current_weight": 100,
-            "sex": "M",
-            "email": "miguel.matos@gmail.com",
-            "first_name": "Miguel",
-            "last_name": "Matos",
-            "password": "12345ola",
-            "birth_date": "1980-10-04",
-            "phone_number": "930438012"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 165,
-            "weight_goal": 70,
-            "current_weight": 100,
-            "sex": "M",
-            "email": "miguel.pedroso@gmail.com",
-            "first_name": "Miguel",
-            "last_name": "Pedroso",
-            "password": "12345ola",
-            "birth_date": "1980-06-04",
-            "phone_number": "915005009"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 165,
-            "weight_goal": 70,
-            "current_weight": 100,
-            "sex": "M",
-            "email": "alberto.matos@gmail.com",
-            "first_name": "Alberto",
-            "last_name": "Matos",
-            "password": "12345ola",
-            "birth_date": "1988-10-04",
-            "phone_number": "910002068"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 165,
-            "weight_goal": 70,
-            "current_weight": 100,
-            "sex": "M",
-            "email": "alberto.marques@gmail.com",
-            "first_name": "Alberto",
-            "last_name": "Marques",
-            "password": "12345ola",
-            "birth_date": "1980-10-06",
-            "phone_number": "930002789"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 165,
-            "weight_goal": 70,
-            "current_weight": 100,
-            "sex": "M",
-            "email": "agostinho.matos@gmail.com",
-            "first_name": "Agostinho",
-            "last_name": "Matos",
-            "password": "12345ola",
-            "birth_date": "1980-12-12",
-            "phone_number": "913000555"
-        })
-        cur_success = cur_success and success
-        success, state = add_client({
-            "height": 165,
-            "weight_goal": 70,
-            "current_weight": 100,
-            "sex": "F",
-            "email": "albertina.matos@gmail.com",
-            "first_name": "Albertina",
-            "last_name": "Matos",
-            "password": "12345ola",
-            "birth_date": "1978-10-04",
-            "phone_number": "908000458"
-        })
-        cur_success = cur_success and success
-
-        #######################################
-        #          CREATE USERS - DOCTORS     #
-        #######################################
-        success, state = add_doctor({
-            "email": "andre.almeida@gmail.com",
-            "first_name": "André",
-            "last_name": "Almeida",
-            "password": "qwerty12345",
-            "birth_date": "1980-05-10",
-            "phone_number": "966565565"
-        },
-            hospital='Hospital São João')
-        cur_success = cur_success and success
-        success, state = add_doctor({
-            "email": "rui.pereira@gmail.com",
-            "first_name": "Rui",
-            "last_name": "Pereira",
-            "password": "asdfgh",
-            "birth_date": "1985-05-04",
-            "phone_number": "964275097"
-        },
-            hospital='Hospital Santo António')
-        cur_success = cur_success and success
-        success, state = add_doctor({
-            "email": "joao.pereira@gmail.com",
-            "first_name": "João",
-            "last_name": "Pereira",
-            "password": "987654",
-            "birth_date": "1985-09-16",
-            "phone_number": "914608627"
-        },
-            hospital='Hospital da Luz')
-        cur_success = cur_success and success
-
-        #######################################
-        #    CREATE USERS - DOCTOR-PATIENT    #
-        #######################################
-        success, state = add_doctor_patient_association({"client": "vasco.almeida@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "albertina.matos@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "agostinho.matos@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "alberto.marques@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "alberto.matos@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "miguel.pedroso@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "miguel.matos@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "andre.silva@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "paulo.silva@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "antonio.almeida@gmail.com"},
-                                                        email="andre.almeida@gmail.com")
-        cur_success = cur_success and success
-
-        success, state = add_doctor_patient_association({"client": "ana.almeida@gmail.com"},
-                                                        email="rui.pereira@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "manuela.silva@gmail.com"},
-                                                        email="rui.pereira@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "miguel.pereira@gmail.com"},
-                                                        email="rui.pereira@gmail.com")
-        cur_success = cur_success and success
-        success, state = add_doctor_patient_association({"client": "pedro.pereira@gmail.com"},
-                                                        email="rui.pereira@gmail.com")
-        cur_success = cur_success and success
-
-        success, state = add_doctor_patient_association({"client": "miguel.silva@gmail.com"},
-                                                        email="joao.pereira@gmail.com")
-        cur_success = cur_success and success
-
-        #######################################
-        #          CREATE INGREDIENTS         #
-        #######################################
-        flour = Ingredient.objects.create(name="Flour", calories=364, carbs=76.3, fat=1, proteins=10.3)
-        water = Ingredient.objects.create(name="Water", calories=0, carbs=0, fat=0, proteins=0)
-        sugar = Ingredient.objects.create(name="Sugar", calories=389, carbs=99.8, fat=0, proteins=0)
-        salt = Ingredient.objects.create(name="Salt", calories=0, carbs=0, fat=0, proteins=0)
-        oil = Ingredient.objects.create(name="Oil", calories=884, carbs=0, fat=100, proteins=0)
-        tomato_sauce = Ingredient.objects.create(name="Tomato Sauce", calories=82, carbs=18.9, fat=0.5, proteins=4.3)
-        pepper = Ingredient.objects.create(name="Pepper", calories=251, carbs=64, fat=3.3, proteins=10.4)
-        mozzarella_cheese = Ingredient.objects.create(name="Mozzarella Cheese", calories=300, carbs=2.2, fat=22.4,
-                                                      proteins=22.2)
-        pork = Ingredient.objects.create(name="Pork", calories=275, carbs=0.8, fat=10, proteins=19)
-        egg = Ingredient.objects.create(name="Egg", calories=143, carbs=0.7, fat=9.5, proteins=12.6)
-        garlic = Ingredient.objects.create(name="Garlic", calories=149, carbs=33.1, fat=0.5, proteins=6.4)
-        onion = Ingredient.objects.create(name="Onion", calories=32, carbs=7.5, fat=0.1, proteins=0.8)
-        cheese = Ingredient.objects.create(name="Cheese", calories=264, carbs=0, fat=21.1, proteins=18.5)
-
-        #######################################
-        #            CREATE MEALS             #
-        #######################################
-        meal = {"name": "Pizza", "category": "Fast Food",
-                "ingredients": [{"id": water.id, "quantity": 42}, {"id": flour.id, "quantity": 39.4},
-                                {"id": sugar.id, "quantity": 0.8}, {"id": salt.id, "quantity": 1.25},
-                                {"id": oil.id, "quantity": 1.25}, {"id": tomato_sauce.id, "quantity": 15.63},
-                                {"id": pepper.id, "quantity": 1.88}, {"id": mozzarella_cheese.id, "quantity": 15.7}]}
-        success, state = add_new_meal(meal, None)
-        cur_success = cur_success and success
-
-        meal = {"name": "Hamburger", "category": "Fast Food",
-                "ingredients": [{"id": pork.id, "quantity": 85}, {"id": salt.id, "quantity": 10},
-                                {"id": pepper.id, "quantity": 10}, {"id": egg.id, "quantity": 50},
-                                {"id": garlic.id, "quantity": 5}, {"id": onion.id, "quantity": 15},
-                                {"id": cheese.id, "quantity": 28}]}
-        success, state = add_new_meal(meal, None)
-        cur_success = cur_success and success
-
-        try:
-            meals_json, ingredients_json = load_from_files('../db_data/')
-            # print(meals_json)
-            # print(ingredients_json)
-        except Exception as e:
-            print(e)
-
-        for ingredient in ingredients_json:
-            success, state = add_new_ingredient(ingredient)
-            if not success:
-                print(ingredient)
-            cur_success = cur_success and success
-
-        for meal in meals_json:
-            success, state = add_new_meal(meal, None)
-            if not success:
-                print(meal)
-            cur_success = cur_success and success
-
-        return cur_success
+        report = seed_database(load_fixtures())
 
     except Exception:
         return False
+
+    return report["skipped_meals"] == 0
@@ -0,0 +1,163 @@
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+
+from rest_api.catalog_import import get_catalog_files, import_ingredients, import_meals, iter_catalog_file
+from rest_api.food_log_cache import food_log_days
+from rest_api.models import Client, CustomUser, Doctor, HospitalAdmin, Ingredient, Meal
+from rest_api.photo_store import get_default_photo_hash
+
+DATA_DIR = os.path.join(settings.BASE_DIR, "db_data")
+
+BATCH_SIZE = 1000
+
+HASH_WORKERS = os.cpu_count() or 1
+
+SYNTHETIC_PASSWORD = "loadtest"
+
+USER_KINDS = ["admins", "clients", "doctors"]
+
+CATALOG_KINDS = ["ingredients", "meals"]
+
+MEAL_CATEGORIES = ["Fast Food", "Oriental", "Traditional", "Drinks", "Snacks", "Breakfast"]
+
+
+def load_fixtures(data_dir=DATA_DIR):
+    """
+    The users of users.json, and the ingredients and meals of the catalog files, which are streamed
+    from disk while they are seeded.
+    """
+    with open(os.path.join(data_dir, "users.json"), encoding="utf-8") as users_file:
+        fixtures = json.load(users_file)
+
+    for kind, files in get_catalog_files([data_dir]).items():
+        fixtures[kind] = chain.from_iterable(iter_catalog_file(path) for path in files)
+
+    return fixtures
+
+
+def generate_fixtures(scale, seed=0):
+    """
+    Synthetic users and catalog for load testing: `scale` clients, ingredients and meals,
+    a doctor per 20 clients and an admin per 10 doctors. Every synthetic user shares SYNTHETIC_PASSWORD.
+    """
+    generator = random.Random(seed)
+
+    admins = [{"email": f"admin{i}@load.test", "first_name": "Admin", "last_name": str(i),
+               "password": SYNTHETIC_PASSWORD, "hospital": f"Load Test Hospital {i}"}
+              for i in range(max(scale // 200, 1))]
+
+    doctors = [{"email": f"doctor{i}@load.test", "first_name": "Doctor", "last_name": str(i),
+                "password": SYNTHETIC_PASSWORD, "birth_date": "1980-01-01", "phone_number": None,
+                "hospital": admins[i % len(admins)]["hospital"], "patients": []}
+               for i in range(max(scale // 20, 1))]
+
+    clients = []
+    for i in range(scale):
+        email = f"client{i}@load.test"
+        current_weight = generator.randint(50, 120)
+        clients.append({"email": email, "first_name": "Client", "last_name": str(i), "password": SYNTHETIC_PASSWORD,
+                        "birth_date": str(date(1950, 1, 1) + timedelta(days=generator.randint(0, 18000))),
+                        "phone_number": None, "sex": generator.choice(["M", "F"]),
+                        "height": generator.randint(150, 200), "current_weight": current_weight,
+                        "weight_goal": current_weight + generator.randint(-20, 10)})
+        doctors[i % len(doctors)]["patients"].append(email)
+
+    ingredients = [{"name": f"Load Test Ingredient {i}", "calories": generator.randint(0, 900),
+                    "fat": round(generator.uniform(0, 100), 1), "carbs": round(generator.uniform(0, 100), 1),
+                    "proteins": round(generator.uniform(0, 100), 1)}
+                   for i in range(scale)]
+
+    meals = [{"name": f"Load Test Meal {i}", "category": generator.choice(MEAL_CATEGORIES),
+              "ingredients": [{"name": ingredient["name"], "quantity": generator.randint(5, 200)}
+                              for ingredient in generator.sample(ingredients, min(len(ingredients),
+                                                                                  generator.randint(1, 8)))]}
+             for i in range(scale if ingredients else 0)]
+
+    return {"admins": admins, "clients": clients, "doctors": doctors, "ingredients": ingredients, "meals": meals}
+
+
+def merge_fixtures(*all_fixtures):
+    merged = {kind: [entry for fixtures in all_fixtures for entry in fixtures[kind]] for kind in USER_KINDS}
+    for kind in CATALOG_KINDS:
+        merged[kind] = chain.from_iterable(fixtures[kind] for fixtures in all_fixtures)
+
+    return merged
+
+
+def seed_users(admins, clients, doctors):
+    # hashing a password costs a full PBKDF2 run, so each distinct password is hashed once,
+    # in threads since hashlib releases the GIL while hashing
+    passwords = list({entry["password"] for entry in admins + clients + doctors})
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        password_hashes = dict(zip(passwords, executor.map(make_password, passwords)))
+
+    User.objects.bulk_create([User(username=entry["email"], email=entry["email"], first_name=entry["first_name"],
+                                   last_name=entry["last_name"], password=password_hashes[entry["password"]])
+                              for entry in admins + clients + doctors], batch_size=BATCH_SIZE)
+    user_ids = dict(User.objects.values_list("username", "id"))
+
+    groups = {name: Group.objects.get_or_create(name=name)[0].id
+              for name in ["admins_group", "clients_group", "doctors_group"]}
+    memberships = [(admins, "admins_group"), (clients, "clients_group"), (doctors, "doctors_group")]
+    User.groups.through.objects.bulk_create(
+        [User.groups.through(user_id=user_ids[entry["email"]], group_id=groups[group])
+         for entries, group in memberships for entry in entries], batch_size=BATCH_SIZE)
+
+    HospitalAdmin.objects.bulk_create([HospitalAdmin(auth_user_id=user_ids[entry["email"]], hospital=entry["hospital"])
+                                       for entry in admins], batch_size=BATCH_SIZE)
+
+    photo_hash = get_default_photo_hash()
+    CustomUser.objects.bulk_create(
+        [CustomUser(auth_user_id=user_ids[entry["email"]], phone_number=entry.get("phone_number"),
+                    photo_hash=photo_hash, birth_date=entry["birth_date"]) for entry in clients + doctors],
+        batch_size=BATCH_SIZE)
+
+    Doctor.objects.bulk_create([Doctor(user_id=user_ids[entry["email"]], hospital=entry["hospital"])
+                                for entry in doctors], batch_size=BATCH_SIZE)
+
+    client_doctors = {patient: user_ids[entry["email"]] for entry in doctors for patient in entry.get("patients", [])}
+    Client.objects.bulk_create(
+        [Client(user_id=user_ids[entry["email"]], height=entry["height"], current_weight=entry["current_weight"],
+                weight_goal=entry["weight_goal"], sex=entry["sex"], doctor_id=client_doctors.get(entry["email"]),
+                is_diabetic=entry.get("is_diabetic", False),
+                has_high_colesterol=entry.get("has_high_colesterol", False)) for entry in clients],
+        batch_size=BATCH_SIZE)
+
+    return len(admins) + len(clients) + len(doctors)
+
+
+def seed_catalog(ingredients, meals):
+    # the tables were just wiped, so the catalog upserts only create rows
+    ingredients_report = import_ingredients(ingredients, BATCH_SIZE)
+    meals_report = import_meals(meals, BATCH_SIZE)
+
+    return ingredients_report["created"], meals_report["created"], meals_report["skipped"]
+
+
+def seed_database(fixtures):
+    """
+    Wipes users, ingredients and meals, then loads the fixtures with bulk inserts in a single transaction.
+    """
+    with transaction.atomic():
+        User.objects.all().delete()
+        Ingredient.objects.all().delete()
+        Meal.objects.all().delete()
+
+        User.objects.create_superuser("admin", "admin@ua.pt", "admin")
+
+        users = seed_users(fixtures["admins"], fixtures["clients"], fixtures["doctors"])
+        ingredients, meals, skipped_meals = seed_catalog(fixtures["ingredients"], fixtures["meals"])
+
+    # the clients are bulk created, without the signals that forget the food logs cached under their keys
+    food_log_days.clear()
+
+    return {"users": users, "ingredients": ingredients, "meals": meals, "skipped_meals": skipped_meals}
@@ -1,4 +1,11 @@
+from django.urls import reverse
 from rest_framework import serializers
+from rest_framework.fields import get_attribute
+
+
+# photos are served from the photo store, listings only carry their url
+def get_photo_url(photo_hash):
+    return reverse("photo", kwargs={"photo_hash": photo_hash}) if photo_hash else None
 
 
 class UserSerializer(serializers.Serializer):
@@ -13,104 +20,45 @@ class UserLoginSerializer(serializers.Serializer):
     password = serializers.CharField(required=True)
 
 
-class ClientSerializer(serializers.Serializer):
-    id = serializers.SerializerMethodField()
-    email = serializers.SerializerMethodField()
-    name = serializers.SerializerMethodField()
-    phone_number = serializers.SerializerMethodField()
-    photo = serializers.SerializerMethodField()
-    height = serializers.FloatField()
-    current_weight = serializers.FloatField()
-    weight_goal = serializers.FloatField()
-    sex = serializers.CharField()
-    fitbit_access_token = serializers.CharField()
-    fitbit_refresh_token = serializers.CharField()
-    is_diabetic = serializers.BooleanField();
-    has_high_colesterol = serializers.BooleanField();
-
-    def get_id(self, obj):
-        return obj.user.auth_user.id
-
-    def get_email(self, obj):
-        return obj.user.auth_user.email
-
-    def get_name(self, obj):
-        return obj.user.auth_user.get_full_name()
-
-    def get_phone_number(self, obj):
-        return obj.user.phone_number
-
-    def get_photo(self, obj):
-        return obj.user.photo
-
-
-class DoctorSerializer(serializers.Serializer):
-    id = serializers.SerializerMethodField()
-    email = serializers.SerializerMethodField()
-    name = serializers.SerializerMethodField()
-    phone_number = serializers.SerializerMethodField()
-    photo = serializers.SerializerMethodField()
-    hospital = serializers.SerializerMethodField()
-
-    def get_id(self, obj):
-        return obj.user.auth_user.id
-
-    def get_email(self, obj):
-        return obj.user.auth_user.email
-
-    def get_name(self, obj):
-        return obj.user.auth_user.get_full_name()
+class PhotoUrlField(serializers.Field):
+    def __init__(self, **kwargs):
+        super().__init__(read_only=True, **kwargs)
 
-    def get_phone_number(self, obj):
-        return obj.user.phone_number
+    def to_representation(self, photo_hash):
+        return get_photo_url(photo_hash)
 
-    def get_photo(self, obj):
-        return obj.user.photo
 
-    def get_hospital(self, obj):
-        return obj.hospital
+# the user fields are read through user/auth_user, so the querysets listing these profiles must
+# select_related("user__auth_user") (or "auth_user" for admins) to avoid a query per row
+class ClientSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source="user.auth_user.id", read_only=True)
+    email = serializers.CharField(source="user.auth_user.email", read_only=True)
+    name = serializers.CharField(source="user.auth_user.get_full_name", read_only=True)
+    phone_number = serializers.CharField(source="user.phone_number", read_only=True)
+    photo = PhotoUrlField(source="user.photo_hash")
+    height = serializers.FloatField(read_only=True)
+    current_weight = serializers.FloatField(read_only=True)
+    weight_goal = serializers.FloatField(read_only=True)
+    sex = serializers.CharField(read_only=True)
+    fitbit_access_token = serializers.CharField(read_only=True)
+    fitbit_refresh_token = serializers.CharField(read_only=True)
+    is_diabetic = serializers.BooleanField(read_only=True)
+    has_high_colesterol = serializers.BooleanField(read_only=True)
 
 
 class DoctorSerializer(serializers.Serializer):
-    email = serializers.SerializerMethodField()
-    name = serializers.SerializerMethodField()
-    photo = serializers.SerializerMethodField()
-    hospital = serializers.SerializerMethodField()
-
-    def get_email(self, obj):
-        return obj.user.auth_user.email
-
-    def get_name(self, obj):
-        return obj.user.auth_user.get_full_name()
-
-    def get_photo(self, obj):
-        return obj.user.photo
-
-    def get_hospital(self, obj):
-        return obj.hospital
+    email = serializers.CharField(source="user.auth_user.email", read_only=True)
+    name = serializers.CharField(source="user.auth_user.get_full_name", read_only=True)
+    photo = PhotoUrlField(source="user.photo_hash")
+    hospital = serializers.CharField(read_only=True)
 
 
 class AdminSerializer(serializers.Serializer):
-    id = serializers.SerializerMethodField()
-    email = serializers.SerializerMethodField()
-    first_name = serializers.SerializerMethodField()
-    last_name = serializers.SerializerMethodField()
-    hospital = serializers.SerializerMethodField()
-
-    def get_id(self, obj):
-        return obj.auth_user.id
-
-    def get_email(self, obj):
-        return obj.auth_user.email
-
-    def get_first_name(self, obj):
-        return obj.auth_user.first_name
-
-    def get_last_name(self, obj):
-        return obj.auth_user.last_name
-
-    def get_hospital(self, obj):
-        return obj.hospital
+    id = serializers.IntegerField(source="auth_user.id", read_only=True)
+    email = serializers.CharField(source="auth_user.email", read_only=True)
+    first_name = serializers.CharField(source="auth_user.first_name", read_only=True)
+    last_name = serializers.CharField(source="auth_user.last_name", read_only=True)
+    hospital = serializers.CharField(read_only=True)
 
 
 class MealSerializer(serializers.Serializer):
@@ -181,3 +129,78 @@ class ExpoTokenSerializer(serializers.Serializer):
 
     def get_client_username(self, obj):
         return obj.client.user.auth_user.email
+
+
+# list projections for ?fields=: output field -> (queryset paths it reads, its value from a .values() row)
+def project_field(path):
+    return [path], lambda row: row[path]
+
+
+def project_full_name(prefix):
+    first_name, last_name = f"{prefix}__first_name", f"{prefix}__last_name"
+    return [first_name, last_name], lambda row: f"{row[first_name]} {row[last_name]}".strip()
+
+
+def project_photo_url(path):
+    return [path], lambda row: get_photo_url(row[path])
+
+
+CLIENT_PROJECTION = {
+    "id": project_field("user__auth_user__id"),
+    "email": project_field("user__auth_user__email"),
+    "name": project_full_name("user__auth_user"),
+    "phone_number": project_field("user__phone_number"),
+    "photo": project_photo_url("user__photo_hash"),
+    **{field: project_field(field) for field in ["height", "current_weight", "weight_goal", "sex",
+                                                "fitbit_access_token", "fitbit_refresh_token", "is_diabetic",
+                                                "has_high_colesterol"]},
+}
+
+DOCTOR_PROJECTION = {
+    "email": project_field("user__auth_user__email"),
+    "name": project_full_name("user__auth_user"),
+    "photo": project_photo_url("user__photo_hash"),
+    "hospital": project_field("hospital"),
+}
+
+MEAL_PROJECTION = {field: project_field(field)
+                   for field in ["id", "name", "category", "calories", "proteins", "fat", "carbs"]}
+
+INGREDIENT_PROJECTION = {field: project_field(field)
+                         for field in ["id", "calories", "proteins", "fat", "carbs", "name"]}
+
+
+def compile_serializer(serializer_class):
+    """
+    A function giving the same dict as serializer_class(instance).data, for the read-only shapes of hot
+    endpoints. The fields are bound once and their getters resolved up front, instead of building a
+    serializer and walking its fields for every instance.
+    """
+    serializer = serializer_class()
+    readers = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+
+        if isinstance(field, serializers.SerializerMethodField):
+            readers.append((name, getattr(serializer, field.method_name), None))
+        else:
+            source_attrs = field.source_attrs
+            readers.append((name, lambda instance, source_attrs=source_attrs: get_attribute(instance, source_attrs),
+                            field.to_representation))
+
+    def serialize(instance):
+        data = {}
+        for name, read, represent in readers:
+            value = read(instance)
+            data[name] = value if represent is None or value is None else represent(value)
+        return data
+
+    return serialize
+
+
+serialize_meal = compile_serializer(MealSerializer)
+
+serialize_meal_history = compile_serializer(MealHistorySerializer)
+
+serialize_ingredient = compile_serializer(IngredientSerializer)
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from rest_api.catalog_search import forget_catalog_index
+from rest_api.fitbit_cache import fitbit_series
+from rest_api.food_log_cache import purge_food_log_days
+from rest_api.goal_cache import forget_daily_goals
+from rest_api.models import Client, CustomUser, Ingredient, Meal
+from rest_api.principal import forget_token, forget_user_id, principals
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_changed_user(sender, instance, **kwargs):
+    forget_user_id(instance.pk)
+
+
+# the goals read the client and its custom user, which both use the auth user id as their primary key
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=Client)
+def forget_changed_profile(sender, instance, **kwargs):
+    forget_daily_goals(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_changed_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        forget_user_id(instance.pk)
+    elif pk_set is None:
+        principals.clear()
+    else:
+        for user_id in pk_set:
+            forget_user_id(user_id)
+
+
+@receiver(post_delete, sender=Client)
+def purge_fitbit_series(sender, instance, **kwargs):
+    fitbit_series.purge(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Meal)
+def forget_changed_catalog(sender, instance, **kwargs):
+    forget_catalog_index(sender)
+
+
+# primary keys of deleted clients may be given again, which must not find the food logs of the old ones
+@receiver(post_save, sender=Client)
+def purge_new_client_food_log_days(sender, instance, created, **kwargs):
+    if created:
+        purge_food_log_days(instance.pk)
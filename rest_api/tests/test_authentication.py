@@ -1,10 +1,22 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import User, Group
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 from rest_framework.status import (
     HTTP_401_UNAUTHORIZED,
     HTTP_200_OK,
 )
 from rest_framework.test import APITestCase
 
+from rest_api.authentication import rotate_principal
+from rest_api.principal import Principal, principals, resolve_principal
+from rest_api.token_store import TokenStore, build_token_store
+
 
 class AuthenticationTest(APITestCase):
     def setUp(self):
@@ -55,3 +67,138 @@ class AuthenticationTest(APITestCase):
         # second logout
         self.logout(token)
         self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+
+class PrincipalCacheTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("vasco", "vr@ua.pt", "pwd")
+        clients_group = Group.objects.get_or_create(name="clients_group")[0]
+        clients_group.user_set.add(self.user)
+
+        response = self.client.post("/login", {"username": "vasco", "password": "pwd"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+    def test_warm_token_needs_no_queries(self):
+        response = self.client.get("/check-token")
+        self.assertEqual(response.data["role"], "client")
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/check-token")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_cold_token_needs_the_token_and_the_role(self):
+        key = self.client.get("/check-token").data["token"]
+        principals.delete(key)
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/check-token")
+        self.assertEqual(response.data["role"], "client")
+
+    def test_group_change_refreshes_role(self):
+        response = self.client.get("/check-token")
+        self.assertEqual(response.data["role"], "client")
+
+        self.user.groups.clear()
+        doctors_group = Group.objects.get_or_create(name="doctors_group")[0]
+        doctors_group.user_set.add(self.user)
+
+        response = self.client.get("/check-token")
+        self.assertEqual(response.data["role"], "doctor")
+
+    def test_logout_forgets_token(self):
+        self.client.get("/check-token")
+        self.client.get("/logout")
+
+        response = self.client.get("/check-token")
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_is_rotated(self):
+        old_key = self.client.get("/check-token").data["token"]
+
+        # age the token both in the database and in the store
+        token = Token.objects.get(key=old_key)
+        expired = token.created - timedelta(seconds=settings.TOKEN_EXPIRED_AFTER_SECONDS + 1)
+        Token.objects.filter(key=old_key).update(created=expired)
+        principals.delete(old_key)
+
+        response = self.client.get("/check-token")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        new_key = response.data["token"]
+        self.assertNotEqual(new_key, old_key)
+        self.assertFalse(Token.objects.filter(key=old_key).exists())
+        self.assertTrue(Token.objects.filter(key=new_key, user=self.user).exists())
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {new_key}")
+        with self.assertNumQueries(0):
+            response = self.client.get("/check-token")
+        self.assertEqual(response.data["token"], new_key)
+
+    def expire_token(self):
+        key = self.client.get("/check-token").data["token"]
+        expired = timezone.now() - timedelta(seconds=settings.TOKEN_EXPIRED_AFTER_SECONDS + 1)
+        Token.objects.filter(key=key).update(created=expired)
+        principals.delete(key)
+        return resolve_principal(key)
+
+    def test_requests_in_flight_share_the_rotation(self):
+        principal = self.expire_token()
+
+        rotated = rotate_principal(principal)
+        self.assertEqual(rotate_principal(principal).key, rotated.key)
+        self.assertEqual(list(Token.objects.values_list("key", flat=True)), [rotated.key])
+
+    def test_logout_during_rotation(self):
+        principal = self.expire_token()
+
+        # the logout (from another process) lands after the request resolved the expired token,
+        # but before it is rotated
+        Token.objects.filter(key=principal.key).delete()
+        with self.assertRaises(Token.DoesNotExist):
+            rotate_principal(principal)
+        self.assertFalse(Token.objects.exists())
+
+        response = self.client.get("/check-token")
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_logout_with_expired_token_drops_its_replacement(self):
+        self.expire_token()
+
+        self.assertEqual(self.client.get("/logout").status_code, HTTP_200_OK)
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(self.client.get("/check-token").status_code, HTTP_401_UNAUTHORIZED)
+
+
+class TokenStoreTest(SimpleTestCase):
+    def setUp(self):
+        self.shared = caches["default"]
+        self.shared.clear()
+        self.user = User(id=7, username="vasco")
+
+    def test_shared_tier_fills_local_tier(self):
+        principal = Principal(self.user, Token(key="a" * 40, user=self.user), "client")
+        TokenStore(shared=self.shared).set(principal.key, principal)
+
+        other_process = TokenStore(shared=self.shared)
+        self.assertEqual(other_process.get(principal.key).role, "client")
+        self.assertIn(principal.key, other_process.local)
+
+    def test_delete_user_drops_every_tier(self):
+        store = TokenStore(shared=self.shared)
+        for key in ("a" * 40, "b" * 40):
+            store.set(key, Principal(self.user, Token(key=key, user=self.user), "client"))
+
+        self.assertEqual(store.delete_user(self.user.pk, ["a" * 40, "b" * 40]), 4)
+        self.assertIsNone(store.get("a" * 40))
+        self.assertIsNone(TokenStore(shared=self.shared).get("b" * 40))
+
+    @override_settings(TOKEN_STORE={"SHARED_CACHE": "default"})
+    def test_shared_tier_keeps_local_tier_short_lived(self):
+        other_process = build_token_store()
+        principal = Principal(self.user, Token(key="a" * 40, user=self.user), "client")
+        other_process.set(principal.key, principal)
+
+        # a logout in this process can not reach the local tier of the other one, which soon asks the shared tier
+        build_token_store().delete(principal.key)
+        self.assertEqual(other_process.local.ttl, 1)
+        time.sleep(1.1)
+        self.assertIsNone(other_process.get(principal.key))
@@ -0,0 +1,180 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST
+from rest_framework.test import APITestCase
+
+from rest_api.models import Meal, Product
+from rest_api.product_cache import fetch_product, get_cached_product
+from rest_api.product_import import import_products
+from rest_api.tests.utils import OpenFoodFactsStub, login
+
+PRODUCTS = {"5601312135012": {"product_name": "Pizza", "nutriments": {"energy-kcal_100g": 250}}}
+
+
+class ProductCacheTest(APITestCase):
+    def setUp(self):
+        self.stub = OpenFoodFactsStub(PRODUCTS)
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__)
+
+        settings_override = override_settings(PRODUCT_CACHE={"API_URL": self.stub.api_url})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        response = self.client.post("/clients", {"email": "vr@ua.pt", "password": "pwd", "first_name": "Vasco",
+                                                 "last_name": "Ramos", "height": 180, "weight_goal": 75,
+                                                 "current_weight": 90, "sex": "M", "birth_date": "1990-03-04"})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        login(self.client, "vr@ua.pt", "pwd")
+
+        Meal.objects.create(name="Pizza", category="Fast Food", calories=300, proteins=12, fat=10, carbs=40)
+
+    def classify(self, barcode):
+        return self.client.get("/barcode-classification", {"barcode": barcode})
+
+    def test_products_are_fetched_once(self):
+        for _ in range(3):
+            response = self.classify("5601312135012")
+            self.assertEqual(response.status_code, HTTP_200_OK)
+            self.assertEqual(response.data["message"]["name"], "Pizza")
+
+        self.assertEqual(self.stub.requests, ["5601312135012"])
+        self.assertEqual(Product.objects.get().nutriments, {"energy-kcal_100g": 250})
+
+    def test_unknown_barcodes_are_cached(self):
+        for _ in range(3):
+            response = self.classify("1234")
+            self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["message"], "Product not found.")
+
+        self.assertEqual(self.stub.requests, ["1234"])
+        self.assertFalse(Product.objects.get().found)
+
+    def test_invalid_barcodes_are_not_asked(self):
+        response = self.classify("../../admin")
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.stub.requests, [])
+
+    def test_expired_products_are_fetched_again(self):
+        self.classify("5601312135012")
+        self.classify("1234")
+
+        with override_settings(PRODUCT_CACHE={"API_URL": self.stub.api_url, "TTL": 60 * 60}):
+            Product.objects.update(fetched_at=Product.objects.get(pk="1234").fetched_at - timedelta(days=2))
+            self.classify("5601312135012")
+            self.classify("1234")
+
+        self.assertEqual(self.stub.requests, ["5601312135012", "1234", "5601312135012", "1234"])
+
+    def test_stale_products_are_served_when_open_food_facts_is_down(self):
+        self.classify("5601312135012")
+        Product.objects.update(fetched_at=Product.objects.get().fetched_at - timedelta(days=30))
+        self.stub.__exit__()
+
+        self.assertEqual(self.classify("5601312135012").status_code, HTTP_200_OK)
+
+        response = self.classify("4006381333931")
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["message"], "Open Food Facts is not answering, please try again later.")
+
+    def test_concurrent_misses_are_fetched_once(self):
+        self.stub.delay = 0.3
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            answers = list(pool.map(fetch_product, ["5601312135012"] * 5))
+
+        self.assertEqual(self.stub.requests, ["5601312135012"])
+        self.assertEqual([asked for _, asked in answers].count(True), 1)
+        self.assertEqual({answer["product"]["product_name"] for answer, _ in answers}, {"Pizza"})
+
+
+class ProductImportTest(APITestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.data_dir, name)
+        with (gzip.open if name.endswith(".gz") else open)(path, "wt", encoding="utf-8") as product_file:
+            product_file.write(text)
+
+    def test_dump_and_deltas(self):
+        self.write("0-dump.jsonl.gz", "".join(json.dumps(product) + "\n" for product in [
+            {"code": "5601312135012", "product_name": "Pizza",
+             "nutriments": {"energy-kcal_100g": 250, "salt_100g": 1.2, "fat_100g": "10.5"}},
+            {"code": "4006381333931", "product_name": "Pencil", "nutriments": {}},
+            {"code": "not a barcode", "product_name": "Nothing"},
+            {"product_name": "No barcode"}]))
+        self.write("1-delta.csv", "code\tproduct_name\tenergy-kcal_100g\tproteins_100g\tfat_100g\tcarbohydrates_100g\n"
+                                  "5601312135012\tPizza Margherita\t240\t11\t\t30\n"
+                                  "4006381333931\tPencil\t\t\t\t\n"
+                                  "20000000\tApple\t52\t0.3\t0.2\t14\n")
+        self.write("notes.txt", "not a dump")
+
+        progress = []
+        report = import_products([self.data_dir], batch_size=2,
+                                 progress=lambda path, report: progress.append(os.path.basename(path)))
+
+        self.assertEqual(report, {"created": 3, "updated": 1, "unchanged": 1, "skipped": 2})
+        self.assertEqual(progress, ["0-dump.jsonl.gz", "0-dump.jsonl.gz", "1-delta.csv", "1-delta.csv"])
+        self.assertEqual(Product.objects.get(pk="5601312135012").name, "Pizza Margherita")
+        self.assertEqual(Product.objects.get(pk="5601312135012").nutriments,
+                         {"energy-kcal_100g": 240, "proteins_100g": 11, "carbohydrates_100g": 30})
+        self.assertEqual(Product.objects.get(pk="20000000").name, "Apple")
+
+    def test_barcodes_are_resolved_locally(self):
+        self.write("products.jsonl", json.dumps({"code": "5601312135012", "product_name": "Pizza"}))
+        call_command("import_products", self.data_dir, stdout=io.StringIO())
+
+        self.client.post("/clients", {"email": "vr@ua.pt", "password": "pwd", "first_name": "Vasco",
+                                      "last_name": "Ramos", "height": 180, "weight_goal": 75, "current_weight": 90,
+                                      "sex": "M", "birth_date": "1990-03-04"})
+        login(self.client, "vr@ua.pt", "pwd")
+        Meal.objects.create(name="Pizza", category="Fast Food", calories=300, proteins=12, fat=10, carbs=40)
+
+        with OpenFoodFactsStub(PRODUCTS) as stub, \
+                override_settings(PRODUCT_CACHE={"API_URL": stub.api_url, "REMOTE": False}):
+            # imported products are served however old they are
+            Product.objects.update(fetched_at=timezone.now() - timedelta(days=365))
+            response = self.client.get("/barcode-classification", {"barcode": "5601312135012"})
+            self.assertEqual(response.status_code, HTTP_200_OK)
+            self.assertEqual(response.data["message"]["name"], "Pizza")
+
+            response = self.client.get("/barcode-classification", {"barcode": "4006381333931"})
+            self.assertEqual(response.data["message"], "Product not found.")
+
+            self.assertEqual(stub.requests, [])
+            self.assertFalse(Product.objects.filter(pk="4006381333931").exists())
+
+    def test_imported_products_do_not_expire(self):
+        self.write("products.jsonl", json.dumps({"code": "5601312135012", "product_name": "Pizza Margherita"}))
+        import_products([self.data_dir])
+        Product.objects.update(fetched_at=timezone.now() - timedelta(days=365))
+
+        with OpenFoodFactsStub(PRODUCTS) as stub, override_settings(PRODUCT_CACHE={"API_URL": stub.api_url}):
+            self.assertEqual(get_cached_product("5601312135012").name, "Pizza Margherita")
+            self.assertEqual(stub.requests, [])
+
+    def test_barcodes_scanned_during_an_import(self):
+        Product.objects.create(barcode="5601312135012", name="Pizza", fetched_at=timezone.now())
+        self.write("products.jsonl", json.dumps({"code": "5601312135012", "product_name": "Pizza Margherita"}))
+
+        # the scan lands between the lookup of the existing products and the insert of the new ones
+        with patch.object(QuerySet, "in_bulk", return_value={}):
+            import_products([self.data_dir])
+        self.assertEqual(Product.objects.get().name, "Pizza")
+
+        import_products([self.data_dir])
+        self.assertEqual(Product.objects.get().name, "Pizza Margherita")
@@ -0,0 +1,115 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from rest_api.catalog_import import import_catalog, iter_json_array
+from rest_api.models import Ingredient, Meal
+
+
+class StreamingJsonTest(TestCase):
+    def test_items_across_chunks(self):
+        items = [{"name": "Bread", "calories": 265, "tags": ["a", "[b]"]}, 12.5, "x, y", [], {}, None, 1234567]
+        text = json.dumps(items, indent=2)
+
+        for chunk_size in [1, 3, 7, 64, len(text)]:
+            self.assertEqual(list(iter_json_array(io.StringIO(text), chunk_size)), items)
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array(io.StringIO(" [ ] "))), [])
+
+    def test_invalid_files(self):
+        for text in ['{"name": "Bread"}', '[{"name": "Bread"}', '[1 2]', '[1,]']:
+            with self.assertRaises(ValueError):
+                list(iter_json_array(io.StringIO(text), 4))
+
+
+class CatalogImportTest(TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def write(self, name, text):
+        with open(os.path.join(self.data_dir, name), "w", encoding="utf-8") as catalog_file:
+            catalog_file.write(text)
+
+    def test_import_in_batches(self):
+        self.write("ingredients.json", json.dumps([{"name": f"Ingredient {i}", "calories": i} for i in range(25)]))
+        self.write("more_ingredients.ndjson", '{"name": "Pão", "calories": 265, "carbs": 49}\n\n')
+        self.write("meals.json", json.dumps([
+            {"name": "Toast", "category": "Breakfast", "ingredients": [{"name": "Pão", "quantity": 50},
+                                                                       {"name": "Ingredient 10", "quantity": 100}]},
+            {"name": "Unicorn Pie", "category": "Dessert", "ingredients": [{"name": "Unicorn", "quantity": 1}]}]))
+        self.write("test.json", "not even json")
+
+        progress = []
+        reports = import_catalog([self.data_dir], batch_size=10,
+                                 progress=lambda kind, path, report: progress.append((kind, dict(report))))
+
+        self.assertEqual(reports["ingredients"], {"created": 26, "updated": 0, "unchanged": 0, "skipped": 0})
+        self.assertEqual(reports["meals"], {"created": 1, "updated": 0, "unchanged": 0, "skipped": 1})
+        self.assertEqual([report["created"] for kind, report in progress if kind == "ingredients"], [10, 20, 25, 1])
+
+        toast = Meal.objects.get(name="Toast")
+        self.assertAlmostEqual(toast.calories, 265 / 2 + 10)
+        self.assertAlmostEqual(toast.carbs, 49 / 2)
+
+    def test_existing_entries_are_updated(self):
+        self.write("ingredients.json", '[{"name": "Bread", "calories": 200}]')
+        self.write("meals.json", '[{"name": "Toast", "category": "Breakfast", '
+                                 '"ingredients": [{"name": "Bread", "quantity": 50}]}]')
+        import_catalog([self.data_dir])
+
+        self.write("ingredients.json", '[{"name": "Bread", "calories": 300}, {"name": "Butter", "calories": 700}]')
+        self.write("meals.json", '[{"name": "Toast", "category": "Snacks", "ingredients": '
+                                 '[{"name": "Bread", "quantity": 50}, {"name": "Butter", "quantity": 10}]}]')
+        reports = import_catalog([self.data_dir])
+
+        self.assertEqual(reports["ingredients"], {"created": 1, "updated": 1, "unchanged": 0, "skipped": 0})
+        self.assertEqual(reports["meals"], {"created": 0, "updated": 1, "unchanged": 0, "skipped": 0})
+        self.assertEqual(Ingredient.objects.get(name="Bread").calories, 300)
+
+        toast = Meal.objects.get()
+        self.assertEqual(toast.category, "Snacks")
+        self.assertAlmostEqual(toast.calories, 150 + 70)
+        self.assertEqual(toast.quantity_set.count(), 2)
+
+        reports = import_catalog([self.data_dir])
+        self.assertEqual(reports["ingredients"], {"created": 0, "updated": 0, "unchanged": 2, "skipped": 0})
+        self.assertEqual(reports["meals"], {"created": 0, "updated": 0, "unchanged": 1, "skipped": 0})
+
+    def test_meals_created_meanwhile_keep_their_quantities(self):
+        self.write("ingredients.json", '[{"name": "Bread", "calories": 200}, {"name": "Butter", "calories": 700}]')
+        self.write("meals.json", '[{"name": "Toast", "category": "Breakfast", "ingredients": '
+                                 '[{"name": "Bread", "quantity": 50}, {"name": "Butter", "quantity": 10}]}]')
+
+        bulk_create = Meal.objects.bulk_create
+
+        def bulk_create_while_a_meal_is_created(meals, *args, **kwargs):
+            created = bulk_create(meals, *args, **kwargs)
+            Meal.objects.create(name="Soup", category="Lunch", calories=0, proteins=0, fat=0, carbs=0)
+            return created
+
+        with patch.object(Meal.objects, "bulk_create", bulk_create_while_a_meal_is_created):
+            import_catalog([self.data_dir])
+
+        self.assertEqual(Meal.objects.get(name="Toast").quantity_set.count(), 2)
+        self.assertFalse(Meal.objects.get(name="Soup").quantity_set.exists())
+
+    def test_meals_follow_updated_ingredients(self):
+        self.write("ingredients.json", '[{"name": "Bread", "calories": 200}, {"name": "Butter", "calories": 700}]')
+        self.write("meals.json", '[{"name": "Toast", "category": "Breakfast", "ingredients": '
+                                 '[{"name": "Bread", "quantity": 50}, {"name": "Butter", "quantity": 10}]}]')
+        import_catalog([self.data_dir])
+        os.remove(os.path.join(self.data_dir, "meals.json"))
+
+        self.write("ingredients.json", '[{"name": "Bread", "calories": 300}]')
+        # the batch of ingredients in its savepoint, then a single statement for the meals
+        with self.assertNumQueries(5):
+            import_catalog([self.data_dir])
+
+        self.assertAlmostEqual(Meal.objects.get().calories, 150 + 70)
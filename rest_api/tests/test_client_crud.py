@@ -1,6 +1,8 @@
 from datetime import date
 
 from django.contrib.auth.models import User, Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.status import (
     HTTP_200_OK,
     HTTP_201_CREATED,
@@ -69,6 +71,27 @@ class ClientUpdateTest(APITestCase):
         response = self.client.put("/clients/vr@ua.pt", {"height": 2})
         self.assertEqual(response.status_code, HTTP_200_OK)
 
+    def test_one_statement_per_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put("/clients/vr@ua.pt", {"email": "vasco@ua.pt", "last_name": "Almeida",
+                                                             "password": "secret", "phone_number": "912345678",
+                                                             "birth_date": "1990-01-02", "height": 1.8, "sex": "M"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        updates = [query["sql"].split()[1] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(sorted(updates), ['"auth_user"', '"rest_api_client"', '"rest_api_customuser"'])
+
+        client = Client.objects.select_related("user__auth_user").get()
+        self.assertEqual((client.height, client.sex, str(client.user.birth_date)), (1.8, "M", "1990-01-02"))
+        self.assertEqual((client.user.auth_user.username, client.user.auth_user.last_name), ("vasco@ua.pt", "Almeida"))
+        self.assertTrue(client.user.auth_user.check_password("secret"))
+
+    def test_invalid_update_changes_nothing(self):
+        response = self.client.put("/clients/vr@ua.pt", {"last_name": "Almeida", "height": 2, "weight_goal": "aaa"})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+        client = Client.objects.select_related("user__auth_user").get()
+        self.assertEqual((client.height, client.user.auth_user.last_name), (1.6, "Ramos"))
+
 
 class ClientDeleteTest(APITestCase):
     def setUp(self):
@@ -0,0 +1,253 @@
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from fitbit.exceptions import detect_and_raise_error
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED
+from rest_framework.test import APITestCase
+
+from rest_api.fitbit_cache import FitbitSeriesCache, fitbit_series
+from rest_api.fitbit_gateway import sessions
+from rest_api.fitbit_sync import get_clients_to_sync, sync_clients
+from rest_api.models import Client, FitbitActivity, FitbitSync
+from rest_api.tests.utils import RecordedFitbit, login
+
+
+def too_many_requests(*args, **kwargs):
+    detect_and_raise_error(Mock(status_code=429, headers={"Retry-After": "600"}, content=b'{"errors": []}'))
+
+
+def unauthorized(*args, **kwargs):
+    detect_and_raise_error(Mock(status_code=401, content=b'{"errors": [{"errorType": "invalid_token"}]}'))
+
+
+class FakeFitbit:
+    delay = 0.3
+    instances = 0
+    requests = []
+
+    def __init__(self, *args, **kwargs):
+        FakeFitbit.instances += 1
+
+    def time_series(self, resource, base_date="today", period=None, end_date=None):
+        time.sleep(self.delay)
+        FakeFitbit.requests.append((resource, base_date, end_date))
+
+        start, end = date.fromisoformat(base_date), date.fromisoformat(end_date)
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+        metric = resource.split("/")[-1]
+        if metric == "heart":
+            return {"activities-heart": [{"dateTime": str(day), "value": {"restingHeartRate": 61}} for day in days]}
+        return {f"activities-{metric}": [{"dateTime": str(day), "value": "1234"} for day in days]}
+
+    def activities_daily_goal(self):
+        time.sleep(self.delay)
+        return {"goals": {"caloriesOut": 2500, "steps": 10000, "distance": 8, "floors": 10}}
+
+
+@patch("rest_api.fitbit_gateway.fitbit.Fitbit", FakeFitbit)
+class FitbitGatewayTest(APITestCase):
+    def setUp(self):
+        sessions.clear()
+        fitbit_series.clear()
+        FakeFitbit.instances = 0
+        FakeFitbit.requests = []
+
+        response = self.client.post("/clients", {"email": "vr@ua.pt", "password": "pwd", "first_name": "Vasco",
+                                                 "last_name": "Ramos", "height": 180, "weight_goal": 75,
+                                                 "current_weight": 90, "sex": "M", "birth_date": "1990-03-04"})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        Client.objects.update(fitbit_access_token="access", fitbit_refresh_token="refresh")
+        login(self.client, "vr@ua.pt", "pwd")
+
+    def test_client_profile_calls_run_concurrently(self):
+        start = time.monotonic()
+        response = self.client.get("/clients/vr@ua.pt")
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        message = response.data["message"]
+        self.assertEqual(message["steps"], "1234")
+        self.assertEqual(message["distance"], "1234")
+        self.assertEqual(message["heart_rate"], 61)
+        self.assertLess(elapsed, 3 * FakeFitbit.delay)
+
+    def test_session_is_shared_per_client(self):
+        self.client.get("/clients/vr@ua.pt")
+        self.client.get("/health-stats/body/history/vr@ua.pt", {"metric": "steps", "period": "week"})
+        self.assertEqual(FakeFitbit.instances, 1)
+
+        # new tokens open a new session
+        Client.objects.update(fitbit_access_token="access2", fitbit_refresh_token="refresh2")
+        self.client.get("/clients/vr@ua.pt")
+        self.assertEqual(FakeFitbit.instances, 2)
+
+    def test_body_history_with_goal(self):
+        response = self.client.get("/health-stats/body/history/vr@ua.pt", {"metric": "steps", "period": "week"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["message"]["goal"], 10000)
+        history = response.data["message"]["history"]
+        self.assertEqual(len(history), 7)
+        self.assertEqual(history[-1], {"dateTime": str(date.today()), "value": "1234"})
+
+    @override_settings(FITBIT_GATEWAY={"TIMEOUT": 0.05})
+    def test_slow_fitbit_keeps_profile_and_tokens(self):
+        response = self.client.get("/clients/vr@ua.pt")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["message"]["steps"], "")
+        self.assertEqual(response.data["message"]["email"], "vr@ua.pt")
+        self.assertEqual(Client.objects.get().fitbit_refresh_token, "refresh")
+
+
+class FitbitSeriesCacheTest(APITestCase):
+    def setUp(self):
+        FakeFitbit.delay = 0
+        FakeFitbit.requests = []
+        self.addCleanup(setattr, FakeFitbit, "delay", 0.3)
+
+        self.api = FakeFitbit()
+        self.cache = FitbitSeriesCache(today_ttl=60)
+        self.today = date.today()
+
+    def test_only_missing_days_are_fetched(self):
+        week = self.cache.time_series(self.api, 1, "activities/steps", "1w")["activities-steps"]
+        self.assertEqual([entry["dateTime"] for entry in week],
+                         [str(self.today - timedelta(days=i)) for i in range(6, -1, -1)])
+
+        month = self.cache.time_series(self.api, 1, "activities/steps", "1m")["activities-steps"]
+        self.assertEqual(len(month), 30)
+        self.assertEqual(FakeFitbit.requests[-1], ("activities/steps", str(self.today - timedelta(days=29)),
+                                                   str(self.today - timedelta(days=7))))
+
+        self.cache.time_series(self.api, 1, "activities/steps", "1w")
+        self.assertEqual(len(FakeFitbit.requests), 2)
+        self.assertEqual(self.cache.stats()["hits"], 7 + 7)
+
+    def test_today_expires(self):
+        self.cache.today_ttl = 0
+        self.cache.time_series(self.api, 1, "activities/steps", "1w")
+        self.cache.time_series(self.api, 1, "activities/steps", "1w")
+        self.assertEqual(FakeFitbit.requests[-1], ("activities/steps", str(self.today), str(self.today)))
+
+    def test_recent_days_expire(self):
+        self.cache.recent_ttl = 0
+        self.cache.time_series(self.api, 1, "activities/steps", "1w")
+        self.cache.time_series(self.api, 1, "activities/steps", "1w")
+        # today is still fresh, and older days are kept
+        self.assertEqual(FakeFitbit.requests[-1], ("activities/steps", str(self.today - timedelta(days=3)),
+                                                   str(self.today - timedelta(days=1))))
+
+    def test_purge_client(self):
+        self.cache.time_series(self.api, 1, "activities/steps", "1w")
+        self.cache.time_series(self.api, 2, "activities/steps", "1w")
+
+        self.assertEqual(self.cache.purge(1), 7)
+        self.assertEqual(self.cache.stats()["size"], 7)
+
+
+class FitbitSyncTest(APITestCase):
+    def setUp(self):
+        sessions.clear()
+        self.api = RecordedFitbit()
+        patcher = patch("rest_api.fitbit_gateway.fitbit.Fitbit", lambda *args, **kwargs: self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        response = self.client.post("/clients", {"email": "vr@ua.pt", "password": "pwd", "first_name": "Vasco",
+                                                 "last_name": "Ramos", "height": 180, "weight_goal": 75,
+                                                 "current_weight": 90, "sex": "M", "birth_date": "1990-03-04"})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        Client.objects.update(fitbit_access_token="access", fitbit_refresh_token="refresh")
+        login(self.client, "vr@ua.pt", "pwd")
+
+        self.today = date.today()
+
+    def test_sync_command(self):
+        out = StringIO()
+        call_command("sync_fitbit", stdout=out)
+        self.assertIn("Synced 1 clients", out.getvalue())
+
+        # the recording holds two weeks of activity
+        self.assertEqual(FitbitActivity.objects.count(), 14)
+        today = FitbitActivity.objects.get(day=self.today)
+        self.assertEqual((today.steps, today.distance, today.calories, today.floors, today.resting_heart_rate),
+                         (3120, 2.23, 1980, 2, 59))
+        self.assertIsNone(FitbitActivity.objects.get(day=self.today - timedelta(days=8)).resting_heart_rate)
+        self.assertEqual(FitbitSync.objects.get().steps_goal, 10000)
+        self.assertEqual(self.api.calls[0], ("activities/steps", str(self.today - timedelta(days=89)),
+                                             str(self.today)))
+
+        # synced clients wait for the next interval, and are then only asked for the last synced day on
+        call_command("sync_fitbit", stdout=out)
+        self.assertEqual(len(self.api.calls), 6)
+        call_command("sync_fitbit", "--force", stdout=out)
+        self.assertEqual(self.api.calls[-2], ("activities/heart", str(self.today), str(self.today)))
+        self.assertEqual(FitbitActivity.objects.count(), 14)
+
+    def test_rate_limited_client_waits(self):
+        self.api.time_series = too_many_requests
+        report = sync_clients()
+        self.assertEqual(report["rate_limited"], 1)
+        self.assertGreater(FitbitSync.objects.get().retry_after, timezone.now())
+        self.assertFalse(get_clients_to_sync().exists())
+
+    def test_stats_read_local_activity(self):
+        sync_clients()
+        self.api.time_series = Mock(side_effect=AssertionError("fitbit should not be called"))
+
+        response = self.client.get("/health-stats/body/history/vr@ua.pt", {"metric": "floors", "period": "week"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["message"]["goal"], 10)
+        self.assertEqual([entry["value"] for entry in response.data["message"]["history"]],
+                         ["15", "13", "5", "11", "20", "8", "2"])
+
+        response = self.client.get("/health-stats/body/heart-rate/vr@ua.pt")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["message"]["avg_heart_rate"], round(sum([62, 61, 63, 60, 61, 62, 61, 60, 62,
+                                                                                63, 61, 60, 59]) / 13, 1))
+
+        response = self.client.get("/health-stats/my-life/vr@ua.pt")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_first_access_syncs_on_the_spot(self):
+        response = self.client.get("/health-stats/body/history/vr@ua.pt", {"metric": "heart", "period": "month"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        history = response.data["message"]["history"]
+        self.assertEqual(len(history), 30)
+        self.assertEqual(history[-1], {"dateTime": str(self.today), "value": 59})
+        self.assertEqual(history[0]["value"], 0)
+        self.assertTrue(FitbitSync.objects.filter(synced_at__isnull=False).exists())
+
+    def test_rate_limited_first_access_keeps_tokens(self):
+        self.api.time_series = Mock(side_effect=too_many_requests)
+
+        response = self.client.get("/health-stats/body/history/vr@ua.pt", {"metric": "steps", "period": "week"})
+        self.assertEqual(response.data["message"], "Fitbit is busy, please try again later.")
+        self.assertEqual(Client.objects.get().fitbit_refresh_token, "refresh")
+        self.assertGreater(FitbitSync.objects.get().retry_after, timezone.now())
+
+        # fitbit is not asked again until the retry time, the (empty) local activity is served meanwhile
+        for path in ["/health-stats/body/heart-rate/vr@ua.pt", "/health-stats/my-life/vr@ua.pt"]:
+            self.assertEqual(self.client.get(path).status_code, HTTP_200_OK)
+        self.assertEqual(self.api.time_series.call_count, 1)
+        self.assertEqual(Client.objects.get().fitbit_refresh_token, "refresh")
+
+    def test_unexpected_errors_keep_tokens(self):
+        self.api.activities_daily_goal = Mock(return_value={})
+
+        with self.assertLogs("rest_api.queries", "ERROR"):
+            response = self.client.get("/health-stats/my-life/vr@ua.pt")
+        self.assertEqual(response.data["message"], "Error while accessing fitbit information.")
+        self.assertEqual(Client.objects.get().fitbit_refresh_token, "refresh")
+
+    def test_revoked_device_is_disconnected(self):
+        self.api.time_series = unauthorized
+
+        response = self.client.get("/health-stats/body/heart-rate/vr@ua.pt")
+        self.assertEqual(response.data["message"], "Error while accessing fitbit information.")
+        self.assertIsNone(Client.objects.get().fitbit_refresh_token)
@@ -0,0 +1,274 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_201_CREATED,
+    HTTP_400_BAD_REQUEST,
+)
+from rest_framework.test import APITestCase
+
+from rest_api.food_log_cache import build_food_log_cache, get_food_log_key
+from rest_api.goal_cache import claim_daily_goals, forget_daily_goals, store_daily_goals
+from rest_api.models import Client, DailyNutritionSummary, Meal, MealHistory
+from rest_api.tests.utils import login
+from rest_api.utils import compute_daily_goals, get_daily_goals
+
+
+class FoodLogTestCase(APITestCase):
+    def setUp(self):
+        response = self.client.post("/clients", {"email": "vr@ua.pt", "password": "pwd", "first_name": "Vasco",
+                                                 "last_name": "Ramos", "height": 180, "weight_goal": 75,
+                                                 "current_weight": 90, "sex": "M", "birth_date": "1990-03-04"})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        login(self.client, "vr@ua.pt", "pwd")
+
+        self.today = date.today()
+        self.meal = Meal.objects.create(name="Pizza", category="Fast Food", calories=300, proteins=12, fat=10,
+                                        carbs=40)
+
+    def add_food_log(self, day, number_of_servings=1, type_of_meal="lunch"):
+        response = self.client.post("/food-logs", {"day": str(day), "type_of_meal": type_of_meal,
+                                                   "meal": self.meal.id, "number_of_servings": number_of_servings})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+
+
+class NutrientsStatsTest(FoodLogTestCase):
+    def test_nutrients_total_without_history(self):
+        response = self.client.get(f"/health-stats/nutrients/total/vr@ua.pt/{self.today}")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["message"], "The specified day has no history yet.")
+
+    def test_nutrients_total(self):
+        self.add_food_log(self.today)
+        self.add_food_log(self.today, number_of_servings=0.5, type_of_meal="dinner")
+
+        response = self.client.get(f"/health-stats/nutrients/total/vr@ua.pt/{self.today}")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        message = response.data["message"]
+        self.assertEqual(message["calories"]["total"], 450)
+        self.assertEqual(message["proteins"]["total"], 18)
+        self.assertEqual(message["fat"]["total"], 15)
+        self.assertEqual(message["carbs"]["total"], 60)
+        self.assertEqual(message["calories"]["left"], 450 - message["calories"]["goal"])
+
+    def test_nutrients_ratio(self):
+        self.add_food_log(self.today)
+
+        response = self.client.get(f"/health-stats/nutrients/ratio/vr@ua.pt/{self.today}")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        message = response.data["message"]
+        self.assertEqual(message["carbs"]["ratio"], round(4 * 40 / 300 * 100))
+        self.assertEqual(message["fat"]["ratio"], round(9 * 10 / 300 * 100))
+
+    def test_nutrients_history(self):
+        self.add_food_log(self.today)
+        self.add_food_log(self.today, number_of_servings=2, type_of_meal="dinner")
+        self.add_food_log(self.today - timedelta(days=3))
+
+        response = self.client.get("/health-stats/nutrients/history/vr@ua.pt", {"metric": "fat", "period": "week"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        history = response.data["message"]["history"]
+        self.assertEqual(len(history), 7)
+        self.assertEqual(history[-1], {"day": str(self.today), "value": 30})
+        self.assertEqual(history[-4], {"day": str(self.today - timedelta(days=3)), "value": 10})
+        self.assertEqual(sum(entry["value"] for entry in history), 40)
+
+    def test_nutrients_history_invalid_metric(self):
+        response = self.client.get("/health-stats/nutrients/history/vr@ua.pt", {"metric": "salt"})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+
+    def test_nutrients_history_all_metrics(self):
+        self.add_food_log(self.today)
+
+        response = self.client.get("/health-stats/nutrients/history/vr@ua.pt", {"metric": "all", "period": "month"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        message = response.data["message"]
+        self.assertEqual(set(message), {"calories", "carbs", "fat", "proteins"})
+        self.assertEqual(len(message["carbs"]["history"]), 30)
+        self.assertEqual(message["carbs"]["history"][-1], {"day": str(self.today), "value": 40})
+
+        single = self.client.get("/health-stats/nutrients/history/vr@ua.pt", {"metric": "carbs", "period": "month"})
+        self.assertEqual(single.data["message"], message["carbs"])
+
+    def test_nutrients_history_metric_list(self):
+        response = self.client.get("/health-stats/nutrients/history/vr@ua.pt",
+                                   {"metric": "fat,proteins", "period": "3-months"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(set(response.data["message"]), {"fat", "proteins"})
+        self.assertEqual(len(response.data["message"]["fat"]["history"]), 90)
+
+        response = self.client.get("/health-stats/nutrients/history/vr@ua.pt", {"metric": "fat,salt"})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+
+class DailyNutritionSummaryTest(FoodLogTestCase):
+    def summary(self, day):
+        return DailyNutritionSummary.objects.filter(day=day).values("calories", "lunch_calories",
+                                                                    "dinner_calories").first()
+
+    def test_summary_follows_food_log_writes(self):
+        self.add_food_log(self.today)
+        self.add_food_log(self.today, number_of_servings=2, type_of_meal="Dinner")
+        self.assertEqual(self.summary(self.today), {"calories": 900, "lunch_calories": 300, "dinner_calories": 600})
+
+        food_log = MealHistory.objects.get(type_of_meal="lunch")
+        yesterday = self.today - timedelta(days=1)
+        response = self.client.put(f"/food-logs/{food_log.id}", {"day": str(yesterday), "number_of_servings": 3})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(self.summary(self.today), {"calories": 600, "lunch_calories": 0, "dinner_calories": 600})
+        self.assertEqual(self.summary(yesterday), {"calories": 900, "lunch_calories": 900, "dinner_calories": 0})
+
+        response = self.client.delete(f"/food-logs/{food_log.id}")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertIsNone(self.summary(yesterday))
+
+    def test_food_log_totals(self):
+        self.add_food_log(self.today)
+        self.add_food_log(self.today, number_of_servings=0.5, type_of_meal="snack")
+
+        response = self.client.get(f"/food-logs/{self.today}")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        message = response.data["message"]
+        self.assertEqual(message["total_calories"], 450)
+        self.assertEqual(message["snack"]["total_calories"], 150)
+        self.assertEqual(len(message["lunch"]["meals"]), 1)
+        self.assertEqual(message["breakfast"], {"total_calories": 0, "meals": []})
+
+    def test_rebuild_command(self):
+        self.add_food_log(self.today)
+        self.add_food_log(self.today - timedelta(days=2))
+        DailyNutritionSummary.objects.all().delete()
+
+        call_command("rebuild_nutrition_summaries", stdout=StringIO())
+        self.assertEqual(DailyNutritionSummary.objects.count(), 2)
+        self.assertEqual(self.summary(self.today)["lunch_calories"], 300)
+
+
+class FoodLogDayTest(FoodLogTestCase):
+    def get_food_log(self, day):
+        response = self.client.get(f"/food-logs/{day}")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response.data["message"]
+
+    def test_cached_day_follows_food_log_writes(self):
+        self.assertEqual(self.get_food_log(self.today)["total_calories"], 0)
+
+        self.add_food_log(self.today)
+        message = self.get_food_log(self.today)
+        self.assertEqual(message["total_calories"], 300)
+        self.assertEqual(message["calories_left"], 300 - message["calories_goal"])
+
+        food_log = MealHistory.objects.get()
+        response = self.client.put(f"/food-logs/{food_log.id}", {"type_of_meal": "dinner", "number_of_servings": 2})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        message = self.get_food_log(self.today)
+        self.assertEqual(message["lunch"], {"total_calories": 0, "meals": []})
+        self.assertEqual(message["dinner"]["total_calories"], 600)
+
+        response = self.client.delete(f"/food-logs/{food_log.id}")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(self.get_food_log(self.today)["dinner"], {"total_calories": 0, "meals": []})
+
+    def test_food_log_update_is_one_statement(self):
+        self.add_food_log(self.today)
+        food_log = MealHistory.objects.get()
+        pasta = Meal.objects.create(name="Pasta", category="Italian", calories=500, proteins=20, fat=15, carbs=70)
+
+        for data, expected in [({"number_of_servings": 2, "type_of_meal": "dinner"}, (2, 600, 24)),
+                               ({"meal": pasta.id}, (2, 1000, 40)),
+                               ({"meal": self.meal.id, "number_of_servings": 0.5, "day": "2020-05-01"}, (0.5, 150, 6))]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.put(f"/food-logs/{food_log.id}", data)
+            self.assertEqual(response.status_code, HTTP_200_OK)
+
+            updates = [query for query in queries if query["sql"].startswith('UPDATE "rest_api_mealhistory"')]
+            self.assertEqual(len(updates), 1)
+            food_log.refresh_from_db()
+            self.assertEqual((food_log.number_of_servings, food_log.calories, food_log.proteins), expected)
+
+        self.assertEqual(str(food_log.day), "2020-05-01")
+        self.assertEqual(self.get_food_log("2020-05-01")["dinner"]["total_calories"], 150)
+        self.assertEqual(self.get_food_log(self.today)["total_calories"], 0)
+
+    def test_day_without_leading_zeros_shares_the_cached_day(self):
+        day = date(2020, 5, 1)
+        self.assertEqual(self.get_food_log("2020-5-1")["total_calories"], 0)
+
+        self.add_food_log(day)
+        self.assertEqual(self.get_food_log("2020-5-1")["total_calories"], 300)
+
+    def test_unmatched_type_of_meal_is_reported(self):
+        self.add_food_log(self.today)
+        MealHistory.objects.create(day=self.today, type_of_meal="brunch", client_id=MealHistory.objects.get().client_id,
+                                   meal=self.meal, number_of_servings=1, calories=300, proteins=12, fat=10, carbs=40)
+
+        message = self.get_food_log(self.today)
+        self.assertEqual(message["total_calories"], 600)
+        self.assertEqual(message["lunch"]["total_calories"], 300)
+        self.assertEqual([meal["type_of_meal"] for meal in message["unmatched"]], ["brunch"])
+
+    def test_food_log_queries_do_not_grow_with_its_rows(self):
+        for type_of_meal in ["breakfast", "lunch", "lunch", "dinner", "snack"]:
+            self.add_food_log(self.today, type_of_meal=type_of_meal)
+        self.get_food_log(self.today - timedelta(days=1))
+
+        # the client with its user and the food logs with their meals
+        with self.assertNumQueries(2):
+            message = self.get_food_log(self.today)
+        self.assertEqual(len(message["lunch"]["meals"]), 2)
+
+        # served from the cached day
+        with self.assertNumQueries(1):
+            self.get_food_log(self.today)
+
+    @override_settings(TOKEN_STORE={"SHARED_CACHE": "default"})
+    def test_days_are_not_cached_across_processes(self):
+        food_log_days = build_food_log_cache()
+        food_log_days.set(get_food_log_key(1, self.today), {"total_calories": 300})
+        self.assertIsNone(food_log_days.get(get_food_log_key(1, self.today)))
+
+
+class DailyGoalsTest(FoodLogTestCase):
+    def test_goals_are_computed_once_per_profile(self):
+        expected = compute_daily_goals(Client.objects.get())
+        self.assertEqual(get_daily_goals(Client.objects.get()), expected)
+
+        # neither the goals nor the user they read the birth date from are loaded again
+        client = Client.objects.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_daily_goals(client), expected)
+
+    def test_goals_of_a_stale_profile_are_not_kept(self):
+        # loaded by a request before the update, whose goals are asked for after it
+        stale = Client.objects.get()
+        self.client.put("/clients/vr@ua.pt", {"current_weight": 80})
+        self.assertEqual(get_daily_goals(stale), compute_daily_goals(Client.objects.get()))
+
+        # goals computed while a change was not committed yet are dropped when it is
+        claim = claim_daily_goals(stale.pk)
+        forget_daily_goals(stale.pk)
+        store_daily_goals(stale.pk, claim, compute_daily_goals(stale))
+        self.assertEqual(get_daily_goals(stale), compute_daily_goals(Client.objects.get()))
+
+    def test_goals_follow_client_updates(self):
+        calories_goal = self.client.get(f"/food-logs/{self.today}").data["message"]["calories_goal"]
+
+        for data, change in [({"current_weight": 80}, -100 * 1.55), ({"sex": "F"}, -166 * 1.55),
+                             ({"birth_date": "1980-03-04"}, -50 * 1.55)]:
+            response = self.client.put("/clients/vr@ua.pt", data)
+            self.assertEqual(response.status_code, HTTP_200_OK)
+
+            message = self.client.get(f"/food-logs/{self.today}").data["message"]
+            self.assertAlmostEqual(message["calories_goal"], calories_goal + change, delta=1)
+            self.assertEqual(get_daily_goals(Client.objects.get()), compute_daily_goals(Client.objects.get()))
+            calories_goal = message["calories_goal"]
+
+        response = self.client.put("/clients/vr@ua.pt", {"is_diabetic": True})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(get_daily_goals(Client.objects.get()), compute_daily_goals(Client.objects.get()))
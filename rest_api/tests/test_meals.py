@@ -0,0 +1,174 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST
+from rest_framework.test import APITestCase
+
+from rest_api.meal_recompute import recompute_meals
+from rest_api.models import Client, DailyNutritionSummary, Ingredient, Meal, MealHistory, Quantity
+from rest_api.serializers import (IngredientSerializer, MealHistorySerializer, MealSerializer, serialize_ingredient,
+                                  serialize_meal, serialize_meal_history)
+from rest_api.tests.utils import login
+from rest_api.utils import populate_nutrient_values
+
+
+class NewMealTest(APITestCase):
+    def setUp(self):
+        response = self.client.post("/clients", {"email": "vr@ua.pt", "password": "pwd", "first_name": "Vasco",
+                                                 "last_name": "Ramos", "height": 180, "weight_goal": 75,
+                                                 "current_weight": 90, "sex": "M", "birth_date": "1990-03-04"})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        login(self.client, "vr@ua.pt", "pwd")
+
+        self.ingredients = [Ingredient.objects.create(name=f"Ingredient {i}", calories=100 + i, proteins=10,
+                                                      fat=5, carbs=20) for i in range(10)]
+
+    def new_meal(self, ingredients, name="Salad"):
+        return self.client.post("/meals", {"name": name, "category": "Healthy", "ingredients": ingredients},
+                                format="json")
+
+    def test_nutrients_are_computed(self):
+        response = self.new_meal([{"id": self.ingredients[0].id, "quantity": 200},
+                                  {"name": "Ingredient 3", "quantity": 50}])
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+        meal = Meal.objects.get(name="Salad")
+        self.assertAlmostEqual(meal.calories, 2 * 100 + 0.5 * 103)
+        self.assertAlmostEqual(meal.proteins, 25)
+        self.assertAlmostEqual(meal.fat, 12.5)
+        self.assertAlmostEqual(meal.carbs, 50)
+        self.assertEqual(set(meal.quantity_set.values_list("ingredient__name", "quantity")),
+                         {("Ingredient 0", 200), ("Ingredient 3", 50)})
+
+    def test_queries_do_not_grow_with_ingredients(self):
+        self.client.get("/meals")
+
+        with CaptureQueriesContext(connection) as two_ingredients:
+            self.new_meal([{"id": ingredient.id, "quantity": 100} for ingredient in self.ingredients[:2]])
+        with CaptureQueriesContext(connection) as ten_ingredients:
+            self.new_meal([{"id": ingredient.id, "quantity": 100} for ingredient in self.ingredients])
+
+        self.assertEqual(len(two_ingredients), len(ten_ingredients))
+        self.assertEqual(Quantity.objects.count(), 12)
+
+    def test_unknown_ingredient(self):
+        response = self.new_meal([{"id": self.ingredients[0].id, "quantity": 100}, {"name": "Unicorn", "quantity": 1}])
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["message"], "Ingredient does not exist!")
+        self.assertFalse(Meal.objects.exists())
+        self.assertFalse(Quantity.objects.exists())
+
+    def test_compiled_serializers_render_the_same(self):
+        self.new_meal([{"id": self.ingredients[0].id, "quantity": 150}])
+        meal = Meal.objects.get(name="Salad")
+        food_log = MealHistory.objects.create(day="2020-05-01", type_of_meal="lunch", meal=meal, number_of_servings=2,
+                                              calories=1, proteins=2.5, fat=0, carbs=1e-05, client=Client.objects.get())
+        renderer = JSONRenderer()
+
+        for serializer_class, serialize, instance in [(MealSerializer, serialize_meal, meal),
+                                                      (IngredientSerializer, serialize_ingredient, self.ingredients[1]),
+                                                      (MealHistorySerializer, serialize_meal_history, food_log)]:
+            self.assertEqual(renderer.render(serialize(instance)), renderer.render(serializer_class(instance).data))
+
+
+class IngredientRecomputeTest(APITestCase):
+    def setUp(self):
+        response = self.client.post("/clients", {"email": "vr@ua.pt", "password": "pwd", "first_name": "Vasco",
+                                                 "last_name": "Ramos", "height": 180, "weight_goal": 75,
+                                                 "current_weight": 90, "sex": "M", "birth_date": "1990-03-04"})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        login(self.client, "vr@ua.pt", "pwd")
+
+        self.ingredients = [Ingredient.objects.create(name=f"Ingredient {i}", calories=100 + i, proteins=10,
+                                                      fat=5, carbs=20) for i in range(3)]
+        self.new_meal([{"id": self.ingredients[0].id, "quantity": 200}, {"id": self.ingredients[1].id, "quantity": 50}])
+        self.new_meal([{"id": self.ingredients[0].id, "quantity": 100}], name="Soup")
+        self.new_meal([{"id": self.ingredients[2].id, "quantity": 100}], name="Bread")
+
+        response = self.client.post("/food-logs", {"day": "2020-05-01", "type_of_meal": "lunch",
+                                                   "meal": Meal.objects.get(name="Soup").id, "number_of_servings": 2})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+
+    def new_meal(self, ingredients, name="Salad"):
+        response = self.client.post("/meals", {"name": name, "category": "Healthy", "ingredients": ingredients},
+                                    format="json")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def nutrients(self, name):
+        return Meal.objects.filter(name=name).values("calories", "proteins", "fat", "carbs").get()
+
+    def test_meals_follow_ingredient_edits(self):
+        response = self.client.put(f"/ingredients/{self.ingredients[0].id}", {"calories": 300, "fat": 1})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+        self.assertEqual(self.nutrients("Salad"), {"calories": 2 * 300 + 0.5 * 101, "proteins": 25, "fat": 4.5,
+                                                   "carbs": 50})
+        self.assertEqual(self.nutrients("Soup"), {"calories": 300, "proteins": 10, "fat": 1, "carbs": 20})
+        self.assertEqual(self.nutrients("Bread")["calories"], 102)
+
+        # food logs keep the values of the meal when it was eaten
+        self.assertEqual(MealHistory.objects.get().calories, 200)
+
+    @override_settings(MEAL_RECOMPUTE={"PROPAGATE_TO_FOOD_LOGS": True})
+    def test_food_logs_follow_ingredient_edits_when_propagated(self):
+        response = self.client.put(f"/ingredients/{self.ingredients[0].id}", {"calories": 300})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+        self.assertEqual(MealHistory.objects.get().calories, 600)
+        self.assertEqual(DailyNutritionSummary.objects.get().lunch_calories, 600)
+
+    def test_ingredient_edit_is_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f"/ingredients/{self.ingredients[2].id}", {"name": "Rye", "calories": 250,
+                                                                                   "proteins": 8, "carbs": 48})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        updates = [query for query in queries if query["sql"].startswith('UPDATE "rest_api_ingredient"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Ingredient.objects.filter(name="Rye").values("calories", "proteins", "fat", "carbs").get(),
+                         {"calories": 250, "proteins": 8, "fat": 5, "carbs": 48})
+
+        response = self.client.put(f"/ingredients/{self.ingredients[2].id}", {"name": "Barley", "fat": "a lot"})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertTrue(Ingredient.objects.filter(name="Rye").exists())
+
+    def test_renames_do_not_recompute(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f"/ingredients/{self.ingredients[0].id}", {"name": "Carrot"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertFalse([query for query in queries if "quantity" in query["sql"]])
+
+    def test_meals_are_recomputed_in_batches(self):
+        Ingredient.objects.filter(id=self.ingredients[0].id).update(proteins=0)
+        meal_ids = list(Meal.objects.order_by("id").values_list("id", flat=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(recompute_meals(meal_ids, batch_size=2), (2, 0))
+        self.assertEqual(len([query for query in queries if query["sql"].startswith("UPDATE")]), 2)
+        self.assertEqual(self.nutrients("Salad")["proteins"], 5)
+
+    @override_settings(MEAL_RECOMPUTE={"SYNC_LIMIT": 1})
+    def test_many_meals_are_recomputed_after_the_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.put(f"/ingredients/{self.ingredients[0].id}", {"calories": 300})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(self.nutrients("Soup")["calories"], 100)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_populate_nutrient_values(self):
+        salad = Meal.objects.get(name="Salad")
+        Quantity.objects.create(meal=salad, ingredient=self.ingredients[2], quantity=10)
+
+        # adding the new quantity of one meal
+        with self.assertNumQueries(1):
+            populate_nutrient_values(salad, self.ingredients[2], 10)
+        self.assertAlmostEqual(self.nutrients("Salad")["calories"], 2 * 100 + 0.5 * 101 + 0.1 * 102)
+
+        # summing the quantities of many meals, given as ids or as a queryset
+        Ingredient.objects.update(carbs=0)
+        meal_ids = list(Meal.objects.values_list("id", flat=True))
+        with self.assertNumQueries(1):
+            populate_nutrient_values(meal_ids)
+        with self.assertNumQueries(1):
+            populate_nutrient_values(Meal.objects.filter(name="Soup"))
+        self.assertEqual({meal["carbs"] for meal in Meal.objects.values("carbs")}, {0})
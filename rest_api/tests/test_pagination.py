@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.test import APITestCase
+
+from rest_api.models import Client, ExpoToken, Ingredient
+from rest_api.seeding import SYNTHETIC_PASSWORD, generate_fixtures, seed_database
+from rest_api.tests.utils import login
+
+
+class PaginationTest(APITestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(PHOTO_STORE={"ROOT": root, "THUMBNAIL_SIZES": {}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # 45 clients split among 2 doctors of a single hospital, 45 ingredients and meals
+        seed_database(generate_fixtures(45))
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response.data["message"]
+
+    def get_all(self, path, **params):
+        page = self.get(path, **params)
+        items = page["results"]
+        while page["next"]:
+            page = self.get(path, cursor=page["next"], **params)
+            items += page["results"]
+        return items
+
+    def test_unpaginated_by_default(self):
+        login(self.client, "client0@load.test", SYNTHETIC_PASSWORD)
+        self.assertEqual(len(self.get("/ingredients")), 45)
+
+        with override_settings(PAGINATION={"DEFAULT_LIMIT": 10}):
+            page = self.get("/ingredients")
+        self.assertEqual(len(page["results"]), 10)
+        self.assertIsNotNone(page["next"])
+
+    def test_cursor_walks_every_entry(self):
+        login(self.client, "client0@load.test", SYNTHETIC_PASSWORD)
+
+        ingredients = self.get_all("/ingredients", limit=7)
+        self.assertEqual([ingredient["id"] for ingredient in ingredients],
+                         list(Ingredient.objects.order_by("id").values_list("id", flat=True)))
+        self.assertEqual(ingredients, self.get("/ingredients"))
+
+        self.assertEqual(len(self.get_all("/meals", limit=20)), 45)
+
+    def test_fields(self):
+        login(self.client, "doctor0@load.test", SYNTHETIC_PASSWORD)
+
+        patients = self.get_all("/doctor-clients", limit=5, fields="email,photo")
+        self.assertEqual(len(patients), 23)
+        self.assertEqual(set(patients[0]), {"email", "photo"})
+        self.assertTrue(patients[0]["photo"].startswith("/photos/"))
+
+        full = self.get("/doctor-clients")
+        self.assertEqual([patient["email"] for patient in full], [patient["email"] for patient in patients])
+        self.assertEqual(full[0]["name"], self.get("/doctor-clients", fields="name")[0]["name"])
+
+        # the projection is read in a single query, whatever the page size
+        with CaptureQueriesContext(connection) as queries:
+            self.get("/doctor-clients", limit=20, fields="id,name,email,phone_number,height")
+        self.assertEqual(len([query for query in queries if "rest_api_client" in query["sql"]]), 1)
+
+        response = self.client.get("/doctor-clients", {"fields": "email,password"})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_hospital_doctors_and_expo_tokens(self):
+        login(self.client, "admin0@load.test", SYNTHETIC_PASSWORD)
+        doctors = self.get("/hospital-doctors", limit=1, fields="email")
+        self.assertEqual(doctors["results"], [{"email": "doctor0@load.test"}])
+        self.assertEqual(self.get("/hospital-doctors", cursor=doctors["next"], fields="email")["results"],
+                         [{"email": "doctor1@load.test"}])
+
+        client = Client.objects.get(user__auth_user__username="client0@load.test")
+        ExpoToken.objects.bulk_create([ExpoToken(client=client, token=f"token-{i}") for i in range(5)])
+        login(self.client, "client0@load.test", SYNTHETIC_PASSWORD)
+        self.assertEqual(self.get_all("/expo-tokens", limit=2), [f"token-{i}" for i in range(5)])
+
+    def test_invalid_params(self):
+        login(self.client, "client0@load.test", SYNTHETIC_PASSWORD)
+        for params in [{"limit": 0}, {"limit": "a"}, {"cursor": "nope"}, {"fields": "secret"}]:
+            response = self.client.get("/ingredients", params)
+            self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+        # the reason is given without python's wording
+        response = self.client.get("/ingredients", {"limit": "abc"})
+        self.assertEqual(response.data["message"], "Invalid limit.")
@@ -0,0 +1,155 @@
+import base64
+import importlib
+import io
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import override_settings
+from PIL import Image
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_201_CREATED,
+    HTTP_206_PARTIAL_CONTENT,
+    HTTP_304_NOT_MODIFIED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_403_FORBIDDEN,
+    HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+)
+from rest_framework.test import APITestCase
+
+from rest_api import constants
+from rest_api.models import CustomUser
+from rest_api.photo_store import get_default_photo_hash, get_photo_store
+from rest_api.tests.utils import login
+
+
+photo_migration = importlib.import_module("rest_api.migrations.0013_customuser_photo_hash")
+
+
+def build_photo(color="red", size=(400, 300)):
+    data = io.BytesIO()
+    Image.new("RGB", size, color).save(data, format="JPEG")
+    return data.getvalue()
+
+
+class PhotoTest(APITestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(PHOTO_STORE={"ROOT": root, "THUMBNAIL_SIZES": {"small": 64}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.photo = build_photo()
+        response = self.client.post("/clients", {"email": "vr@ua.pt", "password": "pwd", "first_name": "Vasco",
+                                                 "last_name": "Ramos", "height": 180, "weight_goal": 75,
+                                                 "current_weight": 90, "sex": "M", "birth_date": "1990-03-04",
+                                                 "photo": base64.b64encode(self.photo).decode()})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        login(self.client, "vr@ua.pt", "pwd")
+
+        self.photo_hash = CustomUser.objects.get().photo_hash
+
+    def test_listing_carries_photo_url(self):
+        response = self.client.get("/clients/vr@ua.pt")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["message"]["photo"], f"/photos/{self.photo_hash}")
+
+        response = self.client.get(f"/photos/{self.photo_hash}")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.content, self.photo)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+
+    def test_client_photo_etag(self):
+        response = self.client.get("/client-photo/vr@ua.pt")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.content, self.photo)
+        self.assertEqual(response["ETag"], f'"{self.photo_hash}"')
+
+        response = self.client.get("/client-photo/vr@ua.pt", HTTP_IF_NONE_MATCH=f'"{self.photo_hash}"')
+        self.assertEqual(response.status_code, HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+        response = self.client.get("/client-photo/vr@ua.pt", HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_client_photo_range(self):
+        response = self.client.get("/client-photo/vr@ua.pt", HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response.content, self.photo[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.photo)}")
+
+        response = self.client.get("/client-photo/vr@ua.pt", HTTP_RANGE="bytes=-5")
+        self.assertEqual(response.content, self.photo[-5:])
+
+        response = self.client.get("/client-photo/vr@ua.pt", HTTP_RANGE=f"bytes={len(self.photo)}-")
+        self.assertEqual(response.status_code, HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_thumbnail(self):
+        response = self.client.get("/client-photo/vr@ua.pt", {"size": "small"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, (64, 48))
+        self.assertEqual(response["ETag"], f'"{self.photo_hash}.small"')
+
+    def test_same_photo_is_stored_once(self):
+        store = get_photo_store()
+        self.assertEqual(store.put(self.photo), self.photo_hash)
+
+        response = self.client.put("/clients/vr@ua.pt", {"photo": base64.b64encode(build_photo("blue")).decode()})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertNotEqual(CustomUser.objects.get().photo_hash, self.photo_hash)
+        self.assertTrue(store.exists(self.photo_hash))
+
+    def test_invalid_photo(self):
+        response = self.client.post("/clients", {"email": "ana@ua.pt", "password": "pwd", "first_name": "Ana",
+                                                 "last_name": "Silva", "height": 170, "weight_goal": 60,
+                                                 "current_weight": 65, "sex": "F", "birth_date": "1992-01-01",
+                                                 "photo": base64.b64encode(b"not an image").decode()})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_other_client_photo_is_forbidden(self):
+        self.client.credentials()
+        self.client.post("/clients", {"email": "ana@ua.pt", "password": "pwd", "first_name": "Ana",
+                                      "last_name": "Silva", "height": 170, "weight_goal": 60,
+                                      "current_weight": 65, "sex": "F", "birth_date": "1992-01-01"})
+        login(self.client, "ana@ua.pt", "pwd")
+
+        response = self.client.get("/client-photo/vr@ua.pt")
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+
+    def test_default_photo_is_shared(self):
+        for email in ["ana@ua.pt", "rui@ua.pt"]:
+            response = self.client.post("/clients", {"email": email, "password": "pwd", "first_name": "Ana",
+                                                     "last_name": "Silva", "height": 170, "weight_goal": 60,
+                                                     "current_weight": 65, "sex": "F", "birth_date": "1992-01-01"})
+            self.assertEqual(response.status_code, HTTP_201_CREATED)
+
+        default_hashes = CustomUser.objects.exclude(photo_hash=self.photo_hash).values_list("photo_hash", flat=True)
+        self.assertEqual(set(default_hashes), {get_default_photo_hash()})
+        self.assertEqual(get_photo_store().read(get_default_photo_hash()),
+                         base64.b64decode(constants.DEFAULT_USER_IMAGE))
+
+    def test_migration_keeps_undecodable_photos(self):
+        root = get_photo_store().root
+        bomb = build_photo(size=(2, 2))
+
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 1):
+            for photo in [base64.b64encode(b"not an image").decode(), "not even base64", base64.b64encode(bomb)]:
+                photo_hash = photo_migration.put_photo(root, photo_migration.decode_photo(photo))
+                self.assertTrue(get_photo_store().exists(photo_hash))
+                self.assertFalse(get_photo_store().exists(photo_hash, "small"))
+
+        self.assertTrue(get_photo_store().exists(photo_migration.put_photo(root, self.photo), "small"))
+
+        # photos without thumbnails are sent whole
+        CustomUser.objects.update(photo_hash=photo_hash)
+        response = self.client.get("/client-photo/vr@ua.pt", {"size": "small"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.content, bomb)
+
+    def test_removed_photo_falls_back_to_the_default(self):
+        response = self.client.put("/clients/vr@ua.pt", {"photo": ""})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(CustomUser.objects.get().photo_hash, get_default_photo_hash())
+        self.assertEqual(self.client.get("/client-photo/vr@ua.pt").status_code, HTTP_200_OK)
@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.status import HTTP_200_OK
+from rest_framework.test import APITestCase
+
+from rest_api.models import Client, DailyNutritionSummary, FitbitActivity
+from rest_api.seeding import SYNTHETIC_PASSWORD, generate_fixtures, seed_database
+from rest_api.tests.utils import login
+from rest_api.utils import get_my_life_stats
+
+
+class QueryCountTest(APITestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(PHOTO_STORE={"ROOT": root, "THUMBNAIL_SIZES": {}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        seed_database(generate_fixtures(45))
+
+    def assertQueryCount(self, email, path, expected):
+        login(self.client, email, SYNTHETIC_PASSWORD)
+        # the first request also resolves the token
+        self.client.get(path)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(len(queries), expected, [query["sql"] for query in queries])
+        return response.data["message"]
+
+    def test_lists(self):
+        patients = self.assertQueryCount("doctor0@load.test", "/doctor-clients", 2)
+        self.assertEqual(len(patients), 23)
+        self.assertEqual(patients[0]["name"], "Client 0")
+
+        doctors = self.assertQueryCount("admin0@load.test", "/hospital-doctors", 2)
+        self.assertEqual([doctor["email"] for doctor in doctors], ["doctor0@load.test", "doctor1@load.test"])
+
+    def test_profiles(self):
+        client = self.assertQueryCount("client0@load.test", "/clients/client0@load.test", 1)
+        self.assertEqual(client["email"], "client0@load.test")
+
+        doctor = self.assertQueryCount("client0@load.test", "/doctor-patient-association", 1)
+        self.assertEqual(doctor["email"], "doctor0@load.test")
+
+        self.assertQueryCount("doctor0@load.test", "/doctors/doctor0@load.test", 1)
+        self.assertQueryCount("admin0@load.test", "/admins/admin0@load.test", 1)
+
+    def test_patients_my_life_stats(self):
+        patients = list(Client.objects.filter(doctor__user__auth_user__username="doctor0@load.test").order_by("pk"))
+        today = date.today()
+        DailyNutritionSummary.objects.bulk_create(
+            [DailyNutritionSummary(client=client, day=today - timedelta(days=days), calories=1500 + 37.5 * i + days)
+             for i, client in enumerate(patients) for days in range(0, 15, i % 3 + 1)])
+
+        # the first patients have fitbit, with activity on some days only
+        for i, client in enumerate(patients[:5]):
+            client.fitbit_access_token, client.fitbit_refresh_token = "access", "refresh"
+            client.save()
+            FitbitActivity.objects.bulk_create([FitbitActivity(client=client, day=today - timedelta(days=days),
+                                                               calories=2000 + 50 * i) for days in range(i, 14, 2)])
+
+        # the doctor, the page of patients, their rollups and the fitbit activity
+        stats = self.assertQueryCount("doctor0@load.test", "/doctor-clients/my-life", 4)
+
+        self.assertEqual([entry.pop("email") for entry in stats], [client.user.auth_user.email for client in patients])
+        self.assertEqual(stats, [get_my_life_stats(client, with_fitbit=i < 5) for i, client in enumerate(patients)])
+
+        page = self.assertQueryCount("doctor0@load.test", "/doctor-clients/my-life?limit=10", 4)
+        self.assertEqual(len(page["results"]), 10)
+        self.assertIsNotNone(page["next"])
@@ -0,0 +1,94 @@
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST
+from rest_framework.test import APITestCase
+
+from rest_api.catalog_search import get_similarity, get_trigrams
+from rest_api.models import Client, Ingredient, Meal
+from rest_api.pagination import encode_cursor
+from rest_api.tests.utils import login
+
+NAMES = ["Cheese", "Cheeseburger", "Mozzarella Cheese", "Chestnut", "Cherry Tomato", "Goat Cheese", "Bread",
+         "Cheddar"]
+
+
+class CatalogSearchTest(APITestCase):
+    def setUp(self):
+        for email in ["vr@ua.pt", "ana@ua.pt"]:
+            response = self.client.post("/clients", {"email": email, "password": "pwd", "first_name": "Vasco",
+                                                     "last_name": "Ramos", "height": 180, "weight_goal": 75,
+                                                     "current_weight": 90, "sex": "M", "birth_date": "1990-03-04"})
+            self.assertEqual(response.status_code, HTTP_201_CREATED)
+        login(self.client, "vr@ua.pt", "pwd")
+
+        for name in NAMES:
+            Ingredient.objects.create(name=name, calories=100)
+
+    def search(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response.data["message"]
+
+    def test_trigram_similarity(self):
+        self.assertEqual(get_trigrams("Cat"), {"  c", " ca", "cat", "at "})
+        self.assertAlmostEqual(get_similarity(get_trigrams("word"), get_trigrams("two words")), 4 / 11)
+
+    def test_ranking(self):
+        results = self.search("/ingredients/search", q="cheese")["results"]
+        self.assertEqual([result["name"] for result in results],
+                         ["Cheese", "Cheeseburger", "Goat Cheese", "Mozzarella Cheese"])
+
+        results = self.search("/ingredients/search", q="mozarela")["results"]
+        self.assertEqual([result["name"] for result in results], ["Mozzarella Cheese"])
+
+    def test_pagination(self):
+        names = [result["name"] for result in self.search("/ingredients/search", q="che", limit=100)["results"]]
+        self.assertEqual(len(names), 7)
+
+        page = self.search("/ingredients/search", q="che", limit=3)
+        cursor_names = [result["name"] for result in page["results"]]
+        while page["next"]:
+            page = self.search("/ingredients/search", q="che", limit=3, cursor=page["next"])
+            cursor_names += [result["name"] for result in page["results"]]
+        self.assertEqual(cursor_names, names)
+
+        page = self.search("/ingredients/search", q="che", limit=2, offset=4)
+        self.assertEqual([result["name"] for result in page["results"]], names[4:6])
+
+    def test_index_follows_catalog_changes(self):
+        self.assertEqual(self.search("/ingredients/search", q="brie")["results"], [])
+
+        Ingredient.objects.create(name="Brie", calories=330)
+        self.assertEqual(len(self.search("/ingredients/search", q="brie")["results"]), 1)
+
+        bread = Ingredient.objects.get(name="Bread")
+        response = self.client.put(f"/ingredients/{bread.id}", {"name": "Brioche"})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(len(self.search("/ingredients/search", q="bri")["results"]), 2)
+
+    def test_meals(self):
+        cheese = Ingredient.objects.get(name="Cheese")
+        Meal.objects.create(name="Cheese Toast", category="Breakfast")
+        Meal.objects.create(name="Pizza", category="Fast Food")
+        Meal.objects.create(name="Secret Toast", category="Snacks",
+                            client=Client.objects.get(user__auth_user__username="ana@ua.pt"))
+        response = self.client.post("/meals", {"name": "My Toast", "category": "Snacks",
+                                               "ingredients": [{"id": cheese.id, "quantity": 30}]}, format="json")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+        results = self.search("/meals/search", q="toast")["results"]
+        self.assertEqual([result["name"] for result in results], ["My Toast", "Cheese Toast"])
+
+        results = self.search("/meals/search", q="fast")["results"]
+        self.assertEqual([result["name"] for result in results], ["Pizza"])
+
+    def test_invalid_params(self):
+        # a list cursor is not a search cursor
+        list_cursor = encode_cursor({"after": 3})
+        for params in [{}, {"q": "che", "limit": 0}, {"q": "che", "offset": "a"}, {"q": "che", "cursor": "nope"},
+                       {"q": "che", "cursor": list_cursor}]:
+            response = self.client.get("/ingredients/search", params)
+            self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+        # the reason is given without python's wording
+        for params in [{"q": "che", "limit": "x"}, {"q": "che", "offset": "x"}]:
+            response = self.client.get("/ingredients/search", params)
+            self.assertEqual(response.data["message"], "Invalid limit or offset.")
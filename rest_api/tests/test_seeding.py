@@ -0,0 +1,68 @@
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.status import HTTP_200_OK
+from rest_framework.test import APITestCase
+
+from rest_api.models import Client, Doctor, HospitalAdmin, Ingredient, Meal, Quantity
+from rest_api.seeding import SYNTHETIC_PASSWORD, generate_fixtures, load_fixtures, seed_database
+from rest_api.tests.utils import create_user_and_login, login
+
+
+class SeedingTest(APITestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(PHOTO_STORE={"ROOT": root, "THUMBNAIL_SIZES": {}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_reload_db(self):
+        create_user_and_login(self.client, "admin", "django", "django@ua.pt", "pwd")
+
+        response = self.client.get("/reload-db")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+        fixtures = load_fixtures()
+        self.assertEqual(HospitalAdmin.objects.count(), len(fixtures["admins"]))
+        self.assertEqual(Client.objects.count(), len(fixtures["clients"]))
+        self.assertEqual(Doctor.objects.count(), len(fixtures["doctors"]))
+        self.assertEqual(Ingredient.objects.count(), len(list(fixtures["ingredients"])))
+        self.assertEqual(Meal.objects.count(), len(list(fixtures["meals"])))
+        self.assertFalse(User.objects.filter(username="django").exists())
+
+        pizza = Meal.objects.get(name="Pizza")
+        self.assertEqual(pizza.quantity_set.count(), 8)
+        self.assertAlmostEqual(pizza.calories, sum(quantity.quantity * quantity.ingredient.calories / 100
+                                                   for quantity in pizza.quantity_set.all()))
+
+        self.assertEqual(Client.objects.get(user__auth_user__username="vasco.almeida@gmail.com").doctor.pk,
+                         User.objects.get(username="andre.almeida@gmail.com").pk)
+
+        self.client.credentials()
+        login(self.client, "vasco.almeida@gmail.com", "olaola")
+        response = self.client.get("/clients/vasco.almeida@gmail.com")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_scale(self):
+        fixtures = generate_fixtures(200, seed=1)
+        self.assertEqual(fixtures, generate_fixtures(200, seed=1))
+
+        report = seed_database(fixtures)
+        self.assertEqual(report, {"users": 211, "ingredients": 200, "meals": 200, "skipped_meals": 0})
+        self.assertEqual(Client.objects.filter(doctor__isnull=False).count(), 200)
+        self.assertEqual(Quantity.objects.count(), sum(len(meal["ingredients"]) for meal in fixtures["meals"]))
+
+        login(self.client, "client7@load.test", SYNTHETIC_PASSWORD)
+        response = self.client.get("/clients/client7@load.test")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_meal_with_unknown_ingredient_is_skipped(self):
+        fixtures = generate_fixtures(20)
+        fixtures["meals"][0]["ingredients"].append({"name": "Unicorn", "quantity": 1})
+
+        report = seed_database(fixtures)
+        self.assertEqual(report["skipped_meals"], 1)
+        self.assertEqual(Meal.objects.count(), 19)
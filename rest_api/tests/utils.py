@@ -1,5 +1,14 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 from django.contrib.auth.models import User, Group
 
+from rest_api.fitbit_cache import PERIOD_DAYS
 from rest_api.models import HospitalAdmin
 
 
@@ -22,3 +31,87 @@ def create_user_and_login(client, role, username, email, password, hospital="Hos
         admins_group, created = Group.objects.get_or_create(name="admins_group")
         admins_group.user_set.add(auth_user)
     login(client, username, password)
+
+
+def parse_day(day):
+    return date.today() if day == "today" else datetime.strptime(str(day), "%Y-%m-%d").date()
+
+
+class RecordedFitbit:
+    """
+    Offline stand-in for fitbit.Fitbit that replays responses recorded from the fitbit API.
+    The recorded days are moved so that the last one is today, and every call is kept in `calls`.
+    """
+
+    def __init__(self, *args, recording="fitbit.json", **kwargs):
+        with open(os.path.join(os.path.dirname(__file__), "recordings", recording)) as recording_file:
+            self.responses = json.load(recording_file)
+        self.calls = []
+
+        last_day = max(entry["dateTime"] for entry in self.responses["activities/steps"]["activities-steps"])
+        self.offset = date.today() - parse_day(last_day)
+
+    def time_series(self, resource, base_date="today", period=None, end_date=None):
+        self.calls.append((resource, base_date, period or end_date))
+
+        if end_date is None:
+            end = parse_day(base_date)
+            start = end - timedelta(days=PERIOD_DAYS[period] - 1)
+        else:
+            start, end = parse_day(base_date), parse_day(end_date)
+
+        series_key, entries = next(iter(self.responses[resource].items()))
+        series = []
+        for entry in entries:
+            day = parse_day(entry["dateTime"]) + self.offset
+            if start <= day <= end:
+                series.append({**entry, "dateTime": str(day)})
+
+        return {series_key: series}
+
+    def activities_daily_goal(self):
+        self.calls.append(("activities/goals/daily", None, None))
+        return self.responses["activities/goals/daily"]
+
+
+class OpenFoodFactsStub:
+    """
+    Local HTTP server answering like the Open Food Facts product API (/<country>/api/v0/product/<barcode>.json)
+    from the products dict, after delay seconds. Every barcode asked for is kept in `requests`.
+    """
+
+    def __init__(self, products, delay=0):
+        self.products = products
+        self.delay = delay
+        self.requests = []
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                barcode = re.search(r"/api/v0/product/(\w+)\.json$", self.path).group(1)
+                stub.requests.append(barcode)
+                time.sleep(stub.delay)
+
+                product = stub.products.get(barcode)
+                body = {"status": 1, "product": product} if product is not None else \
+                    {"status": 0, "status_verbose": "product not found"}
+
+                self.send_response(200 if product is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_url = f"http://127.0.0.1:{self.server.server_port}/%s"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
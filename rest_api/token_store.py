@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_api.cache import LRUCache
+
+DEFAULT_TOKEN_STORE = {
+    "LOCAL_SIZE": 10000,
+    "LOCAL_TTL": 5 * 60,
+    "SHARED_CACHE": None,
+    "SHARED_LOCAL_TTL": 1,
+}
+
+
+class TokenStore:
+    """
+    Resolved principals keyed by token key. A per-process LRU tier sits in front of an
+    optional shared tier, which is any Django cache (Redis, Memcached or local memory).
+    Deletions only reach the local tier of the current process, so with a shared tier the local one
+    should be kept short lived.
+    """
+
+    def __init__(self, local_size=10000, local_ttl=None, shared=None, shared_ttl=None, prefix="token-store"):
+        self.local = LRUCache(max_size=local_size, ttl=local_ttl)
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.prefix = prefix
+
+    def token_key(self, key):
+        return f"{self.prefix}:token:{key}"
+
+    def get(self, key):
+        principal = self.local.get(key)
+        if principal is None and self.shared is not None:
+            principal = self.shared.get(self.token_key(key))
+            if principal is not None:
+                self.local.set(key, principal)
+
+        return principal
+
+    def set(self, key, principal):
+        self.local.set(key, principal)
+
+        if self.shared is not None:
+            self.shared.set(self.token_key(key), principal, timeout=self.shared_ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+
+        if self.shared is not None:
+            self.shared.delete(self.token_key(key))
+
+    def delete_user(self, user_id, keys=()):
+        """
+        Drops the principals of the user from the local tier, and the ones of the given token keys from the
+        shared tier, which is keyed by token only.
+        """
+        deleted = self.local.delete_where(lambda key, principal: principal.user.pk == user_id)
+
+        if self.shared is not None and keys:
+            self.shared.delete_many([self.token_key(key) for key in keys])
+            deleted += len(keys)
+
+        return deleted
+
+    def clear(self):
+        # the shared tier may hold other data, so only this process' tier is wiped
+        self.local.clear()
+
+    def stats(self):
+        return self.local.stats()
+
+
+def get_token_store_settings():
+    return {**DEFAULT_TOKEN_STORE, **getattr(settings, "TOKEN_STORE", {})}
+
+
+def build_token_store():
+    options = get_token_store_settings()
+    shared = caches[options["SHARED_CACHE"]] if options["SHARED_CACHE"] else None
+
+    # other processes can not reach this local tier when a token is revoked, so it only absorbs bursts
+    local_ttl = options["SHARED_LOCAL_TTL"] if shared is not None else options["LOCAL_TTL"]
+
+    return TokenStore(local_size=options["LOCAL_SIZE"], local_ttl=local_ttl, shared=shared,
+                      shared_ttl=settings.TOKEN_EXPIRED_AFTER_SECONDS)
@@ -17,6 +17,10 @@ urlpatterns = [
     url("^clients/(?P<email>.+)", client_rud, name="client-rud"),
     url("^client-photo/(?P<email>.+)", client_photo, name="client-photo"),
     path("doctor-clients", doctor_get_all_patients, name="doctor-clients"),
+    path("doctor-clients/my-life", doctor_patients_my_life_stats, name="doctor-clients-my-life"),
+
+    # Photos
+    url("^photos/(?P<photo_hash>[0-9a-f]{64})$", photo, name="photo"),
 
     # Doctors
     path("doctors", new_doctor, name="new-doctor"),
@@ -28,10 +32,12 @@ urlpatterns = [
 
     # Ingredients
     path("ingredients", ingredients, name="new-ingredient"),
+    path("ingredients/search", ingredients_search, name="ingredients-search"),
     path("ingredients/<int:ingredient_id>", ingredient_rud, name="ingredient-rud"),
 
     # Meals
     path("meals", meals, name="new-meal"),
+    path("meals/search", meals_search, name="meals-search"),
 
     # Doctor patient association
     path("doctor-patient-association", doctor_patient_association_cd, name="doctor-patient-association-cd"),
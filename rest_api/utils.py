@@ -1,12 +1,22 @@
+import logging
 from datetime import datetime, date, timedelta
 
 import requests
 from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Q, QuerySet, Subquery, Sum
+from django.http import HttpResponse
 from rest_framework.authtoken.models import Token
 
-from rest_api.models import Doctor, HospitalAdmin, Client, MealHistory
-from rest_api.serializers import MealHistorySerializer
+from rest_api.food_log_cache import food_log_days, forget_food_log_day
+from rest_api.goal_cache import claim_daily_goals, daily_goals, get_goal_key, store_daily_goals
+from rest_api.models import (Doctor, HospitalAdmin, Client, MealHistory, DailyNutritionSummary, FitbitActivity,
+                             FitbitSync, Ingredient, Meal, Quantity)
+from rest_api.photo_store import get_content_type, get_photo_store
+from rest_api.principal import get_principal, get_user_role
+from rest_api.serializers import serialize_meal_history
+
+logger = logging.getLogger(__name__)
 
 API_URL = "https://%s.openfoodfacts.org"
 
@@ -18,6 +28,14 @@ FAT_RATIO = 0.3
 CARBS_RATIO = 0.5
 PROTEINS_RATIO = 0.2
 
+NUTRIENTS = ["calories", "carbs", "fat", "proteins"]
+
+TYPES_OF_MEAL = ["breakfast", "lunch", "dinner", "snack"]
+
+SUMMARY_FIELDS = NUTRIENTS + [f"{type_of_meal}_calories" for type_of_meal in TYPES_OF_MEAL]
+
+FITBIT_ACTIVITY_FIELDS = ["steps", "distance", "calories", "floors", "resting_heart_rate"]
+
 HEART_RATE_CHART = {
     "M": {"18-25": {"49-61": "Excellent", "62-65": "Good", "66-73": "Average", "74-81": "Fair", "82": "Poor"},
           "26-35": {"49-61": "Excellent", "62-65": "Good", "66-74": "Average", "75-81": "Fair", "82": "Poor"},
@@ -34,32 +52,21 @@ HEART_RATE_CHART = {
 
 
 def get_role(username, request=None):
-    role = None
-    try:
-        if username is None:
-            username = request.user.username
-
-        if User.objects.get(username=username).is_superuser:
-            role = "django-admin"
-        elif User.objects.get(username=username).groups.all()[0].name in ["admins_group"]:
-            role = "admin"
-        elif User.objects.get(username=username).groups.all()[0].name in ["clients_group"]:
-            role = "client"
-        elif User.objects.get(username=username).groups.all()[0].name in ["doctors_group"]:
-            role = "doctor"
+    if username is None:
+        username = request.user.username
 
+    try:
+        user = User.objects.get(username=username)
     except User.DoesNotExist:
-        role = None
+        return None
 
-    return role
+    return get_user_role(user)
 
 
 def who_am_i(request):
-    token = Token.objects.get(user=request.user).key
-    username = request.user.username
-    role = get_role(username)
+    principal = get_principal(request)
 
-    return token, username, role
+    return principal.key, principal.username, principal.role
 
 
 def verify_authorization(role, group):
@@ -77,45 +84,145 @@ def is_doctor_admin(doctor_username, admin_username):
 
 
 def is_client_doctor(doctor_username, client_username):
-    if not get_role(client_username) == "client":
-        return False
+    return Client.objects.filter(user__auth_user__username=client_username,
+                                 doctor__user__auth_user__username=doctor_username).exists()
+
+
+# the fields present in data, cleaned by the model fields, which raise ValidationError for invalid values
+def get_field_values(model, data, fields):
+    return {field: model._meta.get_field(field).clean(data.get(field), None) for field in fields if field in data}
 
-    doctor = Doctor.objects.get(user__auth_user__username=doctor_username)
-    client = Client.objects.get(user__auth_user__username=client_username)
-    return client.doctor == doctor
 
+# partial update of the rows of queryset: the fields present in data and the given values, in a single UPDATE
+def update_fields(queryset, data, fields, **values):
+    values.update(get_field_values(queryset.model, data, fields))
+    if values:
+        queryset.update(**values)
 
-# populate meal nutrient values with values from ingredient passed or ingredients queried
+    return values
+
+
+# meals given as a meal, a queryset of meals or meal ids
+def get_meals_queryset(meals):
+    if isinstance(meals, Meal):
+        return Meal.objects.filter(pk=meals.pk)
+    if isinstance(meals, QuerySet):
+        return meals
+
+    return Meal.objects.filter(pk__in=list(meals))
+
+
+# populate meal nutrient values with values from ingredient passed, or ingredients queried, in a single UPDATE
 def populate_nutrient_values(meal, ingredient=None, quantity=None):
-    # if already have ingredient and quantity, use those
+    meals = get_meals_queryset(meal)
+
+    # if already have ingredient and quantity, add theirs
     if ingredient is not None and quantity is not None:
-        old_meal = meal[0]
-        new_calories = old_meal.calories + quantity * ingredient.calories / 100
-        meal.update(calories=new_calories)
-        new_proteins = old_meal.proteins + quantity * ingredient.proteins / 100
-        meal.update(proteins=new_proteins)
-        new_fat = old_meal.fat + quantity * ingredient.fat / 100
-        meal.update(fat=new_fat)
-        new_carbs = old_meal.carbs + quantity * ingredient.carbs / 100
-        meal.update(carbs=new_carbs)
-    # else query
+        meals.update(**{nutrient: F(nutrient) + quantity * getattr(ingredient, nutrient) / 100
+                         for nutrient in NUTRIENTS})
+    # else sum all the quantities of the meals
     else:
-        entries = meal.quantity_set.all()
-        meal.update(calories=sum(entry.quantity * entry.ingredient.calories / 100 for entry in entries))
-        meal.update(proteins=sum(entry.quantity * entry.ingredient.proteins / 100 for entry in entries))
-        meal.update(fat=sum(entry.quantity * entry.ingredient.fat / 100 for entry in entries))
-        meal.update(carbs=sum(entry.quantity * entry.ingredient.carbs / 100 for entry in entries))
+        recompute_meal_nutrients(meals)
+
+
+# ingredients of a meal request, each {"id" or "name", "quantity"}, resolved with a single query
+def resolve_meal_ingredients(ingredients):
+    ids = [entry["id"] for entry in ingredients if "id" in entry]
+    names = [entry["name"] for entry in ingredients if "id" not in entry and "name" in entry]
+
+    by_id, by_name = {}, {}
+    for ingredient in Ingredient.objects.filter(Q(id__in=ids) | Q(name__in=names)).order_by("id"):
+        by_id[ingredient.id] = ingredient
+        by_name.setdefault(ingredient.name, ingredient)
+
+    resolved = []
+    for entry in ingredients:
+        if "id" in entry:
+            ingredient = by_id.get(int(entry["id"]))
+        else:
+            ingredient = by_name.get(entry.get("name"))
+
+        if ingredient is None:
+            raise Ingredient.DoesNotExist()
+        resolved.append((ingredient, float(entry["quantity"])))
+
+    return resolved
+
+
+# nutrient values of a meal from its (ingredient, quantity in grams) pairs, ingredients holding values per 100g
+def get_meal_nutrients(resolved):
+    return {nutrient: sum(quantity * getattr(ingredient, nutrient) / 100 for ingredient, quantity in resolved)
+            for nutrient in NUTRIENTS}
+
+
+# the meal, its quantities and its nutrient values are written at once, nutrients being summed in memory
+def create_meal(name, category, client, ingredients):
+    resolved = resolve_meal_ingredients(ingredients)
+    nutrients = get_meal_nutrients(resolved)
+
+    with transaction.atomic():
+        meal = Meal.objects.create(name=name, category=category, client=client, **nutrients)
+        Quantity.objects.bulk_create([Quantity(meal=meal, ingredient=ingredient, quantity=quantity)
+                                      for ingredient, quantity in resolved])
+
+    return meal
+
+
+# nutrient values of food logs whose meal or number of servings change, as expressions over the rows they are
+# written to, the unchanged one being read from the row
+def get_food_log_nutrients(meal=None, number_of_servings=None):
+    servings = F("number_of_servings") if number_of_servings is None else number_of_servings
+
+    values = {}
+    for nutrient in NUTRIENTS:
+        meal_value = getattr(meal, nutrient) if meal is not None else \
+            Subquery(Meal.objects.filter(pk=OuterRef("meal_id")).values(nutrient))
+        values[nutrient] = servings * meal_value
+
+    return values
+
+
+def get_table_names(*models):
+    return [connection.ops.quote_name(model._meta.db_table) for model in models]
 
 
-def populate_nutrient_values_meal_history(meal_history, meal=None, number_of_servings=None):
-    if meal is None:
-        meal = meal_history[0].meal
-    if number_of_servings is None:
-        number_of_servings = meal_history[0].number_of_servings
-    meal_history.update(calories=number_of_servings * meal.calories)
-    meal_history.update(proteins=number_of_servings * meal.proteins)
-    meal_history.update(carbs=number_of_servings * meal.carbs)
-    meal_history.update(fat=number_of_servings * meal.fat)
+# the nutrient values of the meals (a queryset or meal ids, all meals when None), summed from their quantities in
+# one UPDATE ... FROM (PostgreSQL, SQLite 3.33+); only the meals whose values change are written, the ones without
+# quantities are left as they are
+def recompute_meal_nutrients(meals=None):
+    if meals is not None and not isinstance(meals, QuerySet) and not meals:
+        return 0
+
+    condition, params = "", []
+    if meals is not None:
+        subquery, params = get_meals_queryset(meals).order_by().values("pk").query.sql_with_params()
+        condition = f"WHERE q.meal_id IN ({subquery})"
+
+    meal, quantity, ingredient = get_table_names(Meal, Quantity, Ingredient)
+    totals = ", ".join(f"SUM(q.quantity * i.{nutrient} / 100) AS {nutrient}" for nutrient in NUTRIENTS)
+    sql = (f"UPDATE {meal} SET {', '.join(f'{nutrient} = totals.{nutrient}' for nutrient in NUTRIENTS)} "
+           f"FROM (SELECT q.meal_id, {totals} FROM {quantity} q INNER JOIN {ingredient} i ON i.id = q.ingredient_id "
+           f"{condition} GROUP BY q.meal_id) AS totals WHERE {meal}.id = totals.meal_id "
+           f"AND ({' OR '.join(f'{meal}.{nutrient} <> totals.{nutrient}' for nutrient in NUTRIENTS)})")
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(params))
+        return cursor.rowcount
+
+
+# the nutrient values of the food logs of the meals, their servings times the current values of the meal
+def recompute_food_log_nutrients(meal_ids):
+    if not meal_ids:
+        return 0
+
+    meal_history, meal = get_table_names(MealHistory, Meal)
+    sql = (f"UPDATE {meal_history} SET "
+           f"{', '.join(f'{nutrient} = {meal_history}.number_of_servings * m.{nutrient}' for nutrient in NUTRIENTS)} "
+           f"FROM {meal} m WHERE m.id = {meal_history}.meal_id AND m.id IN ({', '.join(['%s'] * len(meal_ids))})")
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(meal_ids))
+        return cursor.rowcount
 
 
 def is_valid_date(date, date_pattern):
@@ -129,22 +236,76 @@ def is_valid_date(date, date_pattern):
     return ret_val
 
 
-def get_total_nutrients(meal_history):
-    total_calories = round(sum(entry.calories for entry in meal_history))
-    total_carbs = round(sum(entry.carbs for entry in meal_history))
-    total_fat = round(sum(entry.fat for entry in meal_history))
-    total_proteins = round(sum(entry.proteins for entry in meal_history))
+# aliased, since an aggregate can not share the name of a field another aggregate reads
+def get_summary_aggregates():
+    aggregates = {f"total_{nutrient}": Sum(nutrient) for nutrient in NUTRIENTS}
+    for type_of_meal in TYPES_OF_MEAL:
+        aggregates[f"total_{type_of_meal}_calories"] = Sum("calories", filter=Q(type_of_meal__iexact=type_of_meal))
 
-    nutrients_info = {
-        "calories": {"total": total_calories},
-        "carbs": {"total": total_carbs},
-        "fat": {"total": total_fat},
-        "proteins": {"total": total_proteins},
-    }
+    return aggregates
+
+
+# recompute the rollup row of one client's day from its food logs, must run after every food log write,
+# in its transaction
+def refresh_daily_summary(client_id, day):
+    # concurrent writes of the client wait here, so each one aggregates the food logs the others committed
+    list(Client.objects.select_for_update().filter(pk=client_id).values_list("pk", flat=True))
+
+    totals = MealHistory.objects.filter(client_id=client_id, day=day).aggregate(entries=Count("id"),
+                                                                               **get_summary_aggregates())
+
+    if not totals["entries"]:
+        DailyNutritionSummary.objects.filter(client_id=client_id, day=day).delete()
+        forget_food_log_day(client_id, day)
+        return None
+
+    values = {field: totals[f"total_{field}"] or 0 for field in SUMMARY_FIELDS}
+    summary, _ = DailyNutritionSummary.objects.update_or_create(client_id=client_id, day=day, defaults=values)
+    forget_food_log_day(client_id, day)
+
+    return summary
+
+
+def rebuild_daily_summaries(clients=None):
+    meal_history = MealHistory.objects.all()
+    summaries = DailyNutritionSummary.objects.all()
+    if clients is not None:
+        meal_history = meal_history.filter(client__in=clients)
+        summaries = summaries.filter(client__in=clients)
+
+    history_per_day = meal_history.values("client_id", "day").annotate(**get_summary_aggregates()).order_by()
+
+    with transaction.atomic():
+        summaries.delete()
+        created = DailyNutritionSummary.objects.bulk_create(
+            [DailyNutritionSummary(client_id=entry["client_id"], day=entry["day"],
+                                   **{field: entry[f"total_{field}"] or 0 for field in SUMMARY_FIELDS})
+             for entry in history_per_day.iterator()],
+            batch_size=1000)
+
+    food_log_days.clear()
+    return len(created)
+
+
+# returns None when there is no history, so callers do not need a separate exists() query
+def get_total_nutrients(client, day):
+    summary = DailyNutritionSummary.objects.filter(client=client, day=day).values(*NUTRIENTS).first()
+
+    if summary is None:
+        return None
+
+    nutrients_info = {nutrient: {"total": round(summary[nutrient])} for nutrient in NUTRIENTS}
 
     return nutrients_info
 
 
+# every nutrient per day of the interval ]start_date, end_date], read from the daily rollup
+def get_nutrients_per_day(client, start_date, end_date):
+    summaries = DailyNutritionSummary.objects.filter(client=client, day__gt=start_date, day__lte=end_date)
+
+    return {entry["day"]: entry for entry in summaries.values("day", *NUTRIENTS).order_by("day")}
+
+
 def get_client_age(birth_date):
     today = date.today()
 
@@ -153,7 +314,7 @@ def get_client_age(birth_date):
     return age
 
 
-def get_calories_daily_goal(client):
+def compute_calories_daily_goal(client):
     sex = client.sex
     weight = client.current_weight
     weight_goal = client.weight_goal
@@ -177,7 +338,7 @@ def get_calories_daily_goal(client):
 
 
 #TODO: improve this...
-def get_daily_goals(client):
+def compute_daily_goals(client):
     if client.is_diabetic and client.has_high_colesterol:
         carbs_ratio = CARBS_RATIO
         fat_ratio = FAT_RATIO
@@ -195,7 +356,7 @@ def get_daily_goals(client):
         fat_ratio = FAT_RATIO
         proteins_ratio = PROTEINS_RATIO
 
-    calories_goal = get_calories_daily_goal(client)
+    calories_goal = compute_calories_daily_goal(client)
     carbs_goal = round(carbs_ratio * calories_goal / CARBS_IMPORTANCE)
     fat_goal = round(fat_ratio * calories_goal / FAT_IMPORTANCE)
     protein_goal = round(proteins_ratio * calories_goal / PROTEINS_IMPORTANCE)
@@ -203,6 +364,36 @@ def get_daily_goals(client):
     return {"calories": calories_goal, "carbs": carbs_goal, "fat": fat_goal, "proteins": protein_goal}
 
 
+# cached per client and day, so client.user (for the age) is only loaded when the goals are computed;
+# update_client and the profile signals forget them
+def get_daily_goals(client):
+    goals = daily_goals.get(get_goal_key(client.pk))
+    if not isinstance(goals, dict):
+        # the profile is read again after the claim, the given client may have been loaded before a change
+        claim = claim_daily_goals(client.pk)
+        goals = compute_daily_goals(Client.objects.select_related("user").get(pk=client.pk))
+        store_daily_goals(client.pk, claim, goals)
+
+    return dict(goals)
+
+
+def get_clients_daily_goals(clients):
+    # like get_daily_goals, with the profiles of every client whose goals are not cached read in one query
+    goals = {client.pk: daily_goals.get(get_goal_key(client.pk)) for client in clients}
+    claims = {client_id: claim_daily_goals(client_id) for client_id, value in goals.items()
+              if not isinstance(value, dict)}
+
+    for client in Client.objects.select_related("user").filter(pk__in=claims):
+        goals[client.pk] = compute_daily_goals(client)
+        store_daily_goals(client.pk, claims[client.pk], goals[client.pk])
+
+    return {client_id: dict(value) for client_id, value in goals.items()}
+
+
+def get_calories_daily_goal(client):
+    return get_daily_goals(client)["calories"]
+
+
 def get_nutrients_info(client, info_dict):
     total_calories = info_dict["calories"]["total"]
     total_carbs = CARBS_IMPORTANCE * info_dict["carbs"]["total"]
@@ -256,6 +447,11 @@ def get_nutrients_left_values(client, info_dict):
 
 
 def get_nutrient_history(client, metric, period):
+    return get_nutrients_history_values(client, [metric], period)[metric]
+
+
+# history of several metrics for a period, all served by the same rollup query
+def get_nutrients_history_values(client, metrics, period):
     end_date = date.today()
     num_days = 0
     if period == "week":
@@ -267,80 +463,87 @@ def get_nutrient_history(client, metric, period):
 
     start_date = end_date - timedelta(days=num_days)
 
-    history = MealHistory.objects.filter(client=client, day__gt=start_date, day__lte=end_date).values_list("day")
+    history_per_day = get_nutrients_per_day(client, start_date, end_date)
+    days = [start_date + timedelta(days=x) for x in range(1, num_days + 1)]
 
-    if metric == "calories":
-        history_per_day = history.annotate(Sum("calories"))
-    elif metric == "fat":
-        history_per_day = history.annotate(Sum("fat"))
-    elif metric == "carbs":
-        history_per_day = history.annotate(Sum("carbs"))
-    elif metric == "proteins":
-        history_per_day = history.annotate(Sum("proteins"))
+    calories_goal = get_calories_daily_goal(client)
+    goals = {
+        "calories": calories_goal,
+        "fat": calories_goal * FAT_RATIO / FAT_IMPORTANCE,
+        "carbs": calories_goal * CARBS_RATIO / CARBS_IMPORTANCE,
+        "proteins": calories_goal * PROTEINS_RATIO / PROTEINS_IMPORTANCE,
+    }
 
-    total_history = [{"day": str(start_date + timedelta(days=x)), "value": 0} for x in range(1, num_days + 1)]
-    day_array = [entry["day"] for entry in total_history]
+    nutrients_history = {}
+    for metric in metrics:
+        total_history = [{"day": str(day), "value": history_per_day[day][metric] if day in history_per_day else 0}
+                         for day in days]
+        nutrients_history[metric] = {"goal": round(goals[metric]), "history": total_history}
 
-    for entry in history_per_day:
-        day, value = str(entry[0]), entry[1]
-        empty_history_idx = day_array.index(day)
-        total_history[empty_history_idx] = {"day": day, "value": value}
+    return nutrients_history
 
-    calories_goal = get_calories_daily_goal(client)
-    goal = None
-    if metric == "calories":
-        goal = calories_goal
-    elif metric == "fat":
-        goal = calories_goal * FAT_RATIO / FAT_IMPORTANCE
-    elif metric == "carbs":
-        goal = calories_goal * CARBS_RATIO / CARBS_IMPORTANCE
-    elif metric == "proteins":
-        goal = calories_goal * PROTEINS_RATIO / PROTEINS_IMPORTANCE
 
-    return {"goal": round(goal), "history": total_history}
+# one pass over the day's food logs (fetched with select_related("meal")), bucketing and summing per type of meal;
+# the total still counts the food logs whose type matches none, which are reported apart
+def group_meals(meal_history):
+    data = {type_of_meal: {"total_calories": 0, "meals": []} for type_of_meal in TYPES_OF_MEAL}
+    total_calories = 0
+    unmatched = []
 
+    for meal in meal_history:
+        total_calories += meal.calories
+        group = data.get(meal.type_of_meal.lower())
+        if group is None:
+            unmatched.append(serialize_meal_history(meal))
+            continue
 
-def group_meals(meal_history, client):
-    types_of_meal = ["breakfast", "lunch", "dinner", "snack"]
+        group["meals"].append(serialize_meal_history(meal))
+        group["total_calories"] += meal.calories
 
-    total_calories = round(sum(meal.calories for meal in meal_history))
-    calories_goal = get_calories_daily_goal(client)
-    calories_left = total_calories - calories_goal
-    data = {"total_calories": total_calories, "calories_goal": calories_goal, "calories_left": calories_left}
+    if unmatched:
+        logger.warning("Food logs %s match no type of meal", [meal["id"] for meal in unmatched])
 
-    for type_of_meal in types_of_meal:
-        meals = [MealHistorySerializer(meal).data for meal in meal_history if
-                 meal.type_of_meal.lower() == type_of_meal.lower()]
-        data[type_of_meal] = {"total_calories": round(sum(entry["calories"] for entry in meals)), "meals": meals}
+    for type_of_meal in TYPES_OF_MEAL:
+        data[type_of_meal]["total_calories"] = round(data[type_of_meal]["total_calories"])
 
-    return data
+    return {"total_calories": round(total_calories), **data, "unmatched": unmatched}
 
 
-def get_body_history_values(api, metric, period):
-    if period == "week":
-        period = "1w"
-    elif period == "month":
-        period = "1m"
+def get_body_history_values(client, metric, period):
+    num_days = 7
+    if period == "month":
+        num_days = 30
     elif period == "3-months":
-        period = "3m"
+        num_days = 3 * 30
 
-    response = api.time_series(f"activities/{metric}", period=period)[f"activities-{metric}"]
+    end_date = date.today()
+    start_date = end_date - timedelta(days=num_days - 1)
+    activity_per_day = get_fitbit_activity_per_day(client, start_date, end_date)
+    days = [start_date + timedelta(days=x) for x in range(num_days)]
 
+    # same values fitbit answers with: numbers as text, and the resting heart rate or 0
     if metric == "heart":
-        response = [{"dateTime": e["dateTime"],
-                     "value": e["value"]["restingHeartRate"] if "restingHeartRate" in e["value"] else 0} for e in
-                    response]
+        response = [{"dateTime": str(day), "value": activity_per_day.get(day, {}).get("resting_heart_rate") or 0}
+                    for day in days]
+    else:
+        response = [{"dateTime": str(day), "value": str(activity_per_day.get(day, {}).get(metric, 0))}
+                    for day in days]
 
     history = {"metric": metric, "history": response}
 
     if metric in ["steps", "distance", "calories", "floors"]:
-        goals = api.activities_daily_goal()["goals"]
-        history["goal"] = goals["caloriesOut"] if metric == "calories" else goals[str(metric)]
+        history["goal"] = FitbitSync.objects.filter(client=client).values_list(f"{metric}_goal", flat=True).first()
 
     return history
 
 
-def get_client_heart_rate_chart(client, api):
+# fitbit activity synced into the local table, by day
+def get_fitbit_activity_per_day(client, start_date, end_date):
+    activity = FitbitActivity.objects.filter(client=client, day__range=(start_date, end_date))
+    return {entry.pop("day"): entry for entry in activity.values("day", *FITBIT_ACTIVITY_FIELDS)}
+
+
+def get_client_heart_rate_chart(client):
     sex = client.sex
     age = get_client_age(client.user.birth_date)
 
@@ -363,8 +566,10 @@ def get_client_heart_rate_chart(client, api):
 
     message["scale"] = heart_rate_chart
 
-    response = api.time_series("activities/heart", period="1m")["activities-heart"]
-    heart_rate_history = [e["value"]["restingHeartRate"] for e in response if "restingHeartRate" in e["value"]]
+    end_date = date.today()
+    activity = FitbitActivity.objects.filter(client=client, day__range=(end_date - timedelta(days=29), end_date),
+                                             resting_heart_rate__isnull=False)
+    heart_rate_history = list(activity.values_list("resting_heart_rate", flat=True))
     history_len = len(heart_rate_history)
     avg_heart_rate = sum(heart_rate_history) / history_len if history_len != 0 else 60
     message["avg_heart_rate"] = round(avg_heart_rate, 1)
@@ -389,26 +594,34 @@ def get_client_heart_rate_chart(client, api):
     return message
 
 
-def get_my_life_stats(client, api=None):
-    # current week
+def get_my_life_weeks():
+    # current week, then previous week
     current_end_date = date.today()
     current_start_date = current_end_date - timedelta(days=6)
 
-    # previous week
     previous_end_date = date.today() - timedelta(days=7)
     previous_start_date = previous_end_date - timedelta(days=6)
 
-    if api is None:
-        current_week_my_life, current_week_my_life_label = get_my_life_value_nutrients_only(current_start_date,
-                                                                                            current_end_date, client)
-        previous_week_my_life, previous_week_my_life_label = get_my_life_value_nutrients_only(previous_start_date,
-                                                                                              previous_end_date, client)
+    return (current_start_date, current_end_date), (previous_start_date, previous_end_date)
+
+
+def get_my_life_stats(client, with_fitbit=False):
+    (current_start_date, current_end_date), (previous_start_date, previous_end_date) = get_my_life_weeks()
+
+    if not with_fitbit:
+        current_week = get_my_life_value_nutrients_only(current_start_date, current_end_date, client)
+        previous_week = get_my_life_value_nutrients_only(previous_start_date, previous_end_date, client)
 
     else:
-        current_week_my_life, current_week_my_life_label = get_my_life_value_fitbit(current_start_date,
-                                                                                    current_end_date, client, api)
-        previous_week_my_life, previous_week_my_life_label = get_my_life_value_fitbit(previous_start_date,
-                                                                                      previous_end_date, client, api)
+        current_week = get_my_life_value_fitbit(current_start_date, current_end_date, client)
+        previous_week = get_my_life_value_fitbit(previous_start_date, previous_end_date, client)
+
+    return build_my_life_stats(client, current_week, previous_week)
+
+
+def build_my_life_stats(client, current_week, previous_week):
+    current_week_my_life, current_week_my_life_label = current_week
+    previous_week_my_life, previous_week_my_life_label = previous_week
 
     if current_week_my_life == 0:
         current_week_my_life = 0.1
@@ -428,42 +641,90 @@ def get_my_life_stats(client, api=None):
 
 
 def get_my_life_value_nutrients_only(start_date, end_date, client):
-    calories_goal = get_calories_daily_goal(client)
+    history_per_day = get_nutrients_per_day(client, start_date, end_date)
+    calories_history = [round(entry["calories"]) for entry in history_per_day.values()]
 
-    history = MealHistory.objects.filter(client=client, day__gt=start_date, day__lte=end_date).values_list("day")
-    calories_history = [round(entry[1]) for entry in history.annotate(Sum("calories"))]
-    total_week_calories = sum(calories_history)
-    total_week_calories_goal = calories_goal * len(calories_history)
+    return get_my_life_value(client, get_calories_daily_goal(client), calories_history)
 
-    difference = total_week_calories - total_week_calories_goal
-    diff_ratio = round(difference / total_week_calories_goal * 100) if total_week_calories_goal != 0 else 100
 
-    my_life_metric, label = evaluate_difference_ratio(client, diff_ratio)
+def get_my_life_value_fitbit(start_date, end_date, client):
+    fitbit_calories = [entry["calories"] for entry in get_fitbit_activity_per_day(client, start_date,
+                                                                                  end_date).values()]
 
-    return round(my_life_metric, 1), label
+    history_per_day = get_nutrients_per_day(client, start_date, end_date)
+    calories_history = [round(entry["calories"]) for entry in history_per_day.values()]
 
+    return get_my_life_value(client, get_calories_daily_goal(client), calories_history, fitbit_calories)
 
-def get_my_life_value_fitbit(start_date, end_date, client, api):
-    calories_goal = get_calories_daily_goal(client)
-    total_week_calories_goal = 7 * calories_goal
 
-    fitbit_history = api.time_series("activities/calories", base_date=str(end_date), period="1w")[
-        "activities-calories"]
-    fitbit_calories = [int(entry["value"]) for entry in fitbit_history]
-    total_week_fitbit_calories = sum(fitbit_calories) + (7 - len(fitbit_calories)) * calories_goal
+# calories_history holds the rounded calories of the week's days with food logs, fitbit_calories
+# the calories burnt on its days with fitbit activity, or None for the clients without fitbit
+def get_my_life_value(client, calories_goal, calories_history, fitbit_calories=None):
+    if fitbit_calories is None:
+        total_week_calories = sum(calories_history)
+        total_week_calories_goal = calories_goal * len(calories_history)
 
-    history = MealHistory.objects.filter(client=client, day__gt=start_date, day__lte=end_date).values_list("day")
-    calories_history = [round(entry[1]) for entry in history.annotate(Sum("calories"))]
-    total_week_calories = sum(calories_history) + (7 - len(calories_history)) * calories_goal
+        difference = total_week_calories - total_week_calories_goal
+        diff_ratio = round(difference / total_week_calories_goal * 100) if total_week_calories_goal != 0 else 100
+
+    else:
+        total_week_calories_goal = 7 * calories_goal
+        total_week_fitbit_calories = sum(fitbit_calories) + (7 - len(fitbit_calories)) * calories_goal
+        total_week_calories = sum(calories_history) + (7 - len(calories_history)) * calories_goal
 
-    difference = total_week_calories - total_week_fitbit_calories
-    diff_ratio = round(difference / total_week_calories_goal * 100)
+        difference = total_week_calories - total_week_fitbit_calories
+        diff_ratio = round(difference / total_week_calories_goal * 100)
 
     my_life_metric, label = evaluate_difference_ratio(client, diff_ratio)
 
     return round(my_life_metric, 1), label
 
 
+def get_patients_my_life_stats(clients):
+    """
+    My Life stats of many clients at once, from one query over their daily rollups of both weeks and one over
+    the fitbit activity of the ones with fitbit (plus one over the profiles of the clients whose goals are not
+    cached). That activity is read as synced by the sync_fitbit worker, fitbit itself is never called.
+    Same values as get_my_life_stats, in the order of clients.
+    """
+    (current_start_date, current_end_date), (previous_start_date, previous_end_date) = get_my_life_weeks()
+    fitbit_client_ids = {client.pk for client in clients
+                         if client.fitbit_access_token is not None and client.fitbit_refresh_token is not None}
+
+    calories_per_day = {}
+    for client_id, day, calories in DailyNutritionSummary.objects.filter(
+            client__in=clients, day__gt=previous_start_date, day__lte=current_end_date) \
+            .values_list("client_id", "day", "calories"):
+        calories_per_day.setdefault(client_id, []).append((day, round(calories)))
+
+    fitbit_calories_per_day = {}
+    if fitbit_client_ids:
+        for client_id, day, calories in FitbitActivity.objects.filter(
+                client__in=fitbit_client_ids, day__range=(previous_start_date, current_end_date)) \
+                .values_list("client_id", "day", "calories"):
+            fitbit_calories_per_day.setdefault(client_id, []).append((day, calories))
+
+    goals = get_clients_daily_goals(clients)
+
+    stats = []
+    for client in clients:
+        calories_goal = goals[client.pk]["calories"]
+        days = calories_per_day.get(client.pk, [])
+        fitbit_days = fitbit_calories_per_day.get(client.pk, []) if client.pk in fitbit_client_ids else None
+
+        # the rollups are read over ]start_date, end_date], the fitbit activity over [start_date, end_date]
+        weeks = []
+        for start_date, end_date in [(current_start_date, current_end_date), (previous_start_date, previous_end_date)]:
+            calories_history = [calories for day, calories in days if start_date < day <= end_date]
+            fitbit_calories = [calories for day, calories in fitbit_days if start_date <= day <= end_date] \
+                if fitbit_days is not None else None
+            weeks.append(get_my_life_value(client, calories_goal, calories_history, fitbit_calories))
+
+        stats.append(build_my_life_stats(client, *weeks))
+
+    return stats
+
+
 def evaluate_difference_ratio(client, diff_ratio):
     mult_factor = 1 if client.weight_goal > client.current_weight else -1
     diff_ratio *= mult_factor
@@ -530,45 +791,83 @@ def process_meal_history_insert(client, inserted_item):
     return alerts
 
 
-def get_product(barcode, locale="world"):
-    url = build_url(geography=locale, parameters=barcode)
-    return fetch(url)
+# bytes of a stored photo (or of one of its thumbnails), honouring If-None-Match and single byte ranges
+def photo_response(request, photo_hash, size=None, cache_control="private, max-age=31536000, immutable"):
+    store = get_photo_store()
+    # photos kept as they were, without thumbnails, are sent whole
+    if size not in store.thumbnail_sizes or photo_hash and not store.exists(photo_hash, size):
+        size = None
+
+    if not photo_hash or not store.exists(photo_hash, size):
+        return HttpResponse(status=404)
+
+    etag = f'"{photo_hash}.{size}"' if size else f'"{photo_hash}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH", "")
+    if etag in if_none_match.split(", ") or if_none_match == "*":
+        return build_http_response(b"", 304, headers)
+
+    data = store.read(photo_hash, size)
+    headers["Content-Type"] = get_content_type(data)
+
+    # several ranges at once are not worth it for photos, the whole photo is sent instead
+    byte_range = request.META.get("HTTP_RANGE")
+    if byte_range is None or "," in byte_range:
+        return build_http_response(data, 200, headers)
+
+    byte_range = parse_byte_range(byte_range, len(data))
+    if byte_range is None:
+        headers["Content-Range"] = f"bytes */{len(data)}"
+        return build_http_response(b"", 416, headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return build_http_response(data[start:end + 1], 206, headers)
+
 
+def build_http_response(data, status, headers):
+    response = HttpResponse(data, status=status, content_type=headers.pop("Content-Type", None))
+    for header, value in headers.items():
+        response[header] = value
+    return response
 
-def build_url(geography="world", parameters=None):
-    geo_url = API_URL % geography
+
+# (first, last) byte of a "bytes=first-last", "bytes=first-" or "bytes=-suffix" range, None when unsatisfiable
+def parse_byte_range(header, length):
+    unit, _, byte_range = header.partition("=")
+    if unit.strip() != "bytes":
+        return None
+
+    first, _, last = byte_range.strip().partition("-")
+    try:
+        if first == "":
+            start, end = max(length - int(last), 0), length - 1
+        else:
+            start, end = int(first), min(int(last), length - 1) if last else length - 1
+    except ValueError:
+        return None
+
+    if start > end or start >= length:
+        return None
+
+    return start, end
+
+
+def get_product(barcode, locale="world", api_url=API_URL, timeout=None):
+    url = build_url(geography=locale, parameters=barcode, api_url=api_url)
+    return fetch(url, timeout=timeout)
+
+
+def build_url(geography="world", parameters=None, api_url=API_URL):
+    geo_url = api_url % geography
     base_url = "/".join([geo_url, "api", "v0", "product", parameters])
     return base_url
 
 
-def fetch(path, json_file=True):
+def fetch(path, json_file=True, timeout=None):
     if json_file:
         path = "%s.json" % path
 
-    response = requests.get(path)
+    response = requests.get(path, timeout=timeout)
     return response.json()
-
-def load_from_files(data_dir):
-    ingredients = []
-    meals = []
-
-    import sys, os, json
-
-    cur_dir = os.path.abspath(os.path.dirname(__file__))
-    path = os.path.join(cur_dir, data_dir)
-
-    for f in os.listdir(path):
-        if not 'json' in f or 'test' in f:
-            continue
-        file_path = os.path.join(path, f)
-        with open(file_path, 'r', encoding='us-ascii') as ff:
-            content = ff.read()
-            contents_json = json.loads(content)
-            if 'ingredients' in f:
-                for ingredient in contents_json:
-                    ingredients.append(ingredient)
-            elif 'meals' in f:
-                for meal in contents_json:
-                    meals.append(meal)
-    
-    return meals, ingredients
@@ -39,14 +39,15 @@ def login(request):
     is_expired, token = token_expire_handler(token)
     user_serialized = UserSerializer(user)
 
-    return Response({"role": get_role(user.username), "data": user_serialized.data, "token": token.key},
+    return Response({"role": get_user_role(user), "data": user_serialized.data, "token": token.key},
                     status=HTTP_200_OK)
 
 
 @csrf_exempt
 @api_view(["GET"])
 def logout(request):
-    auth_token = request.META["HTTP_AUTHORIZATION"].split()[1]
+    # the key the request was authenticated with, which replaced the one sent if that one had expired
+    auth_token, _, _ = who_am_i(request)
     try:
         Token.objects.get(key=auth_token).delete()
     except Token.DoesNotExist:
@@ -282,10 +283,20 @@ def client_photo(request, email):
         state, message = queries.get_client_photo(email)
         state, status = ("Success", HTTP_200_OK) if state else ("Error", HTTP_400_BAD_REQUEST)
 
+    # the photo of a client can change, so it is revalidated against its etag on every use
+    if state == "Success":
+        return photo_response(request, message, request.GET.get("size"), cache_control="private, no-cache")
+
     return Response({"role": role, "username": username, "state": state, "message": message, "token": token},
                     status=status)
 
 
+@api_view(["GET"])
+def photo(request, photo_hash):
+    # photos are content-addressed, the same url always holds the same bytes
+    return photo_response(request, photo_hash, request.GET.get("size"))
+
+
 @swagger_auto_schema(method="post", request_body=doc.DoctorSerializer)
 @api_view(["POST"])
 def new_doctor(request):
@@ -495,7 +506,23 @@ def doctor_get_all_patients(request):
     status = HTTP_403_FORBIDDEN
 
     if verify_authorization(role, "doctor"):
-        state, message = queries.doctor_get_all_patients(username)
+        state, message = queries.doctor_get_all_patients(username, request.query_params)
+        status = HTTP_200_OK if state else HTTP_400_BAD_REQUEST
+
+    return Response({"role": role, "state": state, "message": message, "token": token}, status=status)
+
+
+@api_view(["GET"])
+def doctor_patients_my_life_stats(request):
+    token, username, role = who_am_i(request)
+
+    # default possibility
+    state = "Error"
+    message = "You don't have permissions to access this information."
+    status = HTTP_403_FORBIDDEN
+
+    if verify_authorization(role, "doctor"):
+        state, message = queries.doctor_get_patients_my_life_stats(username, request.query_params)
         status = HTTP_200_OK if state else HTTP_400_BAD_REQUEST
 
     return Response({"role": role, "state": state, "message": message, "token": token}, status=status)
@@ -649,7 +676,22 @@ def get_ingredients(request):
     status = HTTP_403_FORBIDDEN
 
     if verify_authorization(role, "client"):
-        state, message = queries.get_ingredients()
+        state, message = queries.get_ingredients(request.query_params)
+        state, status = ("Success", HTTP_200_OK) if state else ("Error", HTTP_400_BAD_REQUEST)
+
+    return Response({"role": role, "state": state, "message": message, "token": token}, status=status)
+
+
+@api_view(["GET"])
+def ingredients_search(request):
+    token, username, role = who_am_i(request)
+
+    state = "Error"
+    message = "You don't have permissions to search the ingredients."
+    status = HTTP_403_FORBIDDEN
+
+    if verify_authorization(role, "client"):
+        state, message = queries.search_ingredients(request.query_params)
         state, status = ("Success", HTTP_200_OK) if state else ("Error", HTTP_400_BAD_REQUEST)
 
     return Response({"role": role, "state": state, "message": message, "token": token}, status=status)
@@ -728,7 +770,22 @@ def get_meals(request):
     status = HTTP_403_FORBIDDEN
 
     if verify_authorization(role, "client"):
-        state, message = queries.get_meals(username)
+        state, message = queries.get_meals(username, request.query_params)
+        state, status = ("Success", HTTP_200_OK) if state else ("Error", HTTP_400_BAD_REQUEST)
+
+    return Response({"role": role, "state": state, "message": message, "token": token}, status=status)
+
+
+@api_view(["GET"])
+def meals_search(request):
+    token, username, role = who_am_i(request)
+
+    state = "Error"
+    message = "You don't have permissions to search the meals."
+    status = HTTP_403_FORBIDDEN
+
+    if verify_authorization(role, "client"):
+        state, message = queries.search_meals(request.query_params, username)
         state, status = ("Success", HTTP_200_OK) if state else ("Error", HTTP_400_BAD_REQUEST)
 
     return Response({"role": role, "state": state, "message": message, "token": token}, status=status)
@@ -744,7 +801,7 @@ def list_hospital_doctors(request):
     status = HTTP_403_FORBIDDEN
 
     if verify_authorization(role, "admin"):
-        state, message = queries.get_hospital_doctors(username)
+        state, message = queries.get_hospital_doctors(username, request.query_params)
         state, status = ("Success", HTTP_200_OK) if state else ("Error", HTTP_400_BAD_REQUEST)
 
     return Response({"role": role, "state": state, "message": message, "token": token}, status=status)
@@ -994,7 +1051,7 @@ def get_client_expo_tokens(request):
     status = HTTP_403_FORBIDDEN
 
     if verify_authorization(role, "client"):
-        state, message = queries.get_client_expo_tokens(username)
+        state, message = queries.get_client_expo_tokens(username, request.query_params)
         state, status = ("Success", HTTP_200_OK) if state else ("Error", HTTP_400_BAD_REQUEST)
 
     return Response({"role": role, "state": state, "message": message, "token": token}, status=status)